@@ -0,0 +1,62 @@
+"""
+WebSocket frame encodings.
+
+Events are serialized once as JSON, which is what the replay log and the
+event bus carry. Connections that negotiate `?encoding=msgpack` receive the
+same frames re-encoded as MessagePack in binary messages. A frame is
+converted once whatever the number of connections it goes to.
+
+The heartbeat frames ("ping", "pong") are plain text in every encoding.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Optional, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+CONTROL_FRAMES = ("ping", "pong")
+
+# A frame as written to the socket: text for JSON, bytes for MessagePack
+Frame = Union[str, bytes]
+
+
+def negotiate(requested: Optional[str]) -> Optional[str]:
+    """
+    Encoding for a connection that asked for `requested` (default JSON).
+    MessagePack falls back to JSON text when msgpack is not installed, which
+    clients tell apart by the message type. Returns None for unknown
+    encodings.
+    """
+    if requested in (None, "", JSON):
+        return JSON
+    if requested == MSGPACK:
+        return MSGPACK if msgpack is not None else JSON
+    return None
+
+
+def encode(payload: Any, encoding: str = JSON) -> Frame:
+    """Serialize a payload. Values that are not natively supported become str."""
+    if encoding == MSGPACK:
+        return msgpack.packb(payload, default=str)
+    return json.dumps(payload, default=str)
+
+
+def transcode(frame: str, encoding: str) -> Frame:
+    """Convert a JSON frame to `encoding`."""
+    if encoding == JSON or frame in CONTROL_FRAMES:
+        return frame
+    return _to_msgpack(frame)
+
+
+# Broadcasts hand the same frame to every connection in turn, so only the
+# most recent frames need to be remembered
+@lru_cache(maxsize=64)
+def _to_msgpack(frame: str) -> bytes:
+    return msgpack.packb(json.loads(frame))
@@ -95,6 +95,16 @@ class Settings(BaseSettings):
         json_schema_extra={"env": "REDIS_URL"},
     )
 
+    # WebSocket Configuration
+    ws_max_connections: int = Field(
+        default=5000, ge=1, description="Maximum WebSocket connections per replica"
+    )
+    ws_max_handshakes: int = Field(
+        default=100,
+        ge=1,
+        description="Maximum WebSocket connection attempts handled at once",
+    )
+
     # CORS Configuration
     cors_origins: str = Field(
         default="http://localhost,http://localhost:3000",
@@ -157,4 +167,12 @@ except Exception as e:
         "  - RATE_PERIOD: Rate limit period in seconds (default: 60)", file=sys.stderr
     )
     print("  - CORS_ORIGINS: Comma-separated allowed origins", file=sys.stderr)
+    print(
+        "  - WS_MAX_CONNECTIONS: WebSocket connections per replica (default: 5000)",
+        file=sys.stderr,
+    )
+    print(
+        "  - WS_MAX_HANDSHAKES: Concurrent WebSocket handshakes (default: 100)",
+        file=sys.stderr,
+    )
     raise
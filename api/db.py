@@ -4,9 +4,10 @@ Uses Motor (async MongoDB driver) with configurable pool settings.
 """
 
 import logging
+from datetime import datetime, timedelta, timezone
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pymongo import ASCENDING, DESCENDING
-from typing import Optional
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from typing import Any, Awaitable, Callable, Optional
 from config import settings
 
 logger = logging.getLogger("valohub")
@@ -14,6 +15,7 @@ logger = logging.getLogger("valohub")
 # Global client and database references
 _client: Optional[AsyncIOMotorClient] = None
 _db: Optional[AsyncIOMotorDatabase] = None
+_transactions_supported: Optional[bool] = None
 
 
 def get_client() -> AsyncIOMotorClient:
@@ -82,6 +84,52 @@ async def init_indexes() -> None:
     await db.leaderboards.create_index("rank_group", unique=True, background=True)
     logger.info("Created indexes for leaderboards collection")
 
+    # Leaderboard entries collection indexes (one document per player per group)
+    await db.leaderboard_entries.create_index(
+        [("rank_group", ASCENDING), ("discord_id", ASCENDING)],
+        unique=True,
+        background=True,
+    )
+    for field in ("points", "winrate", "matches_played", "streak"):
+        await db.leaderboard_entries.create_index(
+            [
+                ("rank_group", ASCENDING),
+                (field, DESCENDING),
+                ("discord_id", ASCENDING),
+            ],
+            background=True,
+        )
+    logger.info("Created indexes for leaderboard_entries collection")
+
+    # Points ledger indexes: at most one active row per (match, player)
+    await db.points_ledger.create_index(
+        [("match_id", ASCENDING), ("discord_id", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"active": True},
+        background=True,
+    )
+    await db.points_ledger.create_index(
+        [("match_id", ASCENDING), ("active", ASCENDING)], background=True
+    )
+    logger.info("Created indexes for points_ledger collection")
+
+    # Sanctions: one active ban/timeout per player, timeouts expire via TTL
+    await db.sanctions.create_index(
+        [("discord_id", ASCENDING), ("type", ASCENDING)],
+        unique=True,
+        background=True,
+    )
+    await db.sanctions.create_index(
+        "expires_at",
+        expireAfterSeconds=0,
+        partialFilterExpression={"type": "timeout"},
+        background=True,
+    )
+    await db.sanctions.create_index(
+        [("type", ASCENDING), ("created_at", DESCENDING)], background=True
+    )
+    logger.info("Created indexes for sanctions collection")
+
     # Queues collection indexes
     await db.queues.create_index("rank_group", unique=True, background=True)
     logger.info("Created indexes for queues collection")
@@ -90,16 +138,195 @@ async def init_indexes() -> None:
     await db.preferences.create_index("discord_id", unique=True, background=True)
     logger.info("Created indexes for preferences collection")
 
+    # Bot messages collection indexes
+    await db.bot_messages.create_index(
+        [("guild_id", ASCENDING), ("role", ASCENDING)], unique=True, background=True
+    )
+    logger.info("Created indexes for bot_messages collection")
+
     logger.info("All database indexes created successfully")
 
 
+async def migrate_leaderboard_entries() -> None:
+    """
+    Move players embedded in legacy `leaderboards` documents into the
+    `leaderboard_entries` collection. Safe to run on every startup: entries
+    that already exist are never overwritten and migrated arrays are removed.
+    """
+    db = get_db()
+    cursor = db.leaderboards.find({"players.0": {"$exists": True}})
+    async for doc in cursor:
+        rank_group = doc["rank_group"]
+        operations = []
+        for player in doc.get("players", []):
+            entry = _legacy_entry(player)
+            entry["rank_group"] = rank_group
+            entry["last_updated"] = doc.get("last_updated")
+            operations.append(
+                UpdateOne(
+                    {"rank_group": rank_group, "discord_id": entry["discord_id"]},
+                    {"$setOnInsert": entry},
+                    upsert=True,
+                )
+            )
+        if operations:
+            await db.leaderboard_entries.bulk_write(operations, ordered=False)
+        await db.leaderboards.update_one(
+            {"_id": doc["_id"]}, {"$unset": {"players": ""}}
+        )
+        logger.info(f"Migrated {len(operations)} leaderboard entries for {rank_group}")
+
+
+def _legacy_entry(player: dict) -> dict:
+    """Normalize an embedded leaderboard entry (older rows may lack `wins`)."""
+    matches_played = player.get("matches_played", 0)
+    winrate = player.get("winrate", 0.0)
+    wins = player.get("wins")
+    if wins is None:
+        wins = round(matches_played * winrate / 100)
+    return {
+        "discord_id": player["discord_id"],
+        "rank": player.get("rank", "Unranked"),
+        "points": player.get("points", 1000),
+        "matches_played": matches_played,
+        "wins": wins,
+        "winrate": winrate,
+        "streak": player.get("streak", 0),
+    }
+
+
+async def migrate_sanctions() -> None:
+    """
+    Create sanctions for ban/timeout admin logs written before the sanctions
+    collection existed. Each migrated log is linked through `sanction_id`
+    (None for expired timeouts), so it is only ever migrated once.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    migrated = 0
+    cursor = db.admin_logs.find(
+        {
+            "action": {"$in": ["ban", "timeout"]},
+            "target_discord_id": {"$ne": None},
+            "sanction_id": {"$exists": False},
+        }
+    ).sort("timestamp", ASCENDING)
+    async for log in cursor:
+        created_at = log.get("timestamp") or now
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        expires_at = None
+        if log["action"] == "timeout":
+            expires_at = created_at + timedelta(
+                minutes=log.get("duration_minutes") or 0
+            )
+
+        sanction_id = None
+        if expires_at is None or expires_at > now:
+            sanction = await db.sanctions.find_one_and_update(
+                {"discord_id": log["target_discord_id"], "type": log["action"]},
+                {
+                    "$set": {
+                        "reason": log.get("reason"),
+                        "admin_discord_id": log.get("admin_discord_id"),
+                        "duration_minutes": log.get("duration_minutes"),
+                        "created_at": created_at,
+                        "expires_at": expires_at,
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            sanction_id = sanction["_id"]
+            migrated += 1
+        await db.admin_logs.update_one(
+            {"_id": log["_id"]}, {"$set": {"sanction_id": sanction_id}}
+        )
+    if migrated:
+        logger.info(f"Migrated {migrated} sanctions from admin_logs")
+
+
+async def next_sequence(name: str, session=None) -> int:
+    """Atomically increment and return the named counter in `counters`."""
+    db = get_db()
+    doc = await db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    return doc["seq"]
+
+
+async def seed_match_counter() -> None:
+    """
+    Seed the match_id counter from existing matches. Only scans the matches
+    collection when the counter does not exist yet; `$max` keeps the counter
+    from ever moving backwards.
+    """
+    db = get_db()
+    if await db.counters.find_one({"_id": "match_id"}):
+        return
+    highest_num = 0
+    async for doc in db.matches.find({}, {"match_id": 1}):
+        match_id = doc.get("match_id", "")
+        if match_id.startswith("match_"):
+            try:
+                highest_num = max(highest_num, int(match_id.split("_")[1]))
+            except (IndexError, ValueError):
+                continue
+    await db.counters.update_one(
+        {"_id": "match_id"}, {"$max": {"seq": highest_num}}, upsert=True
+    )
+    logger.info(f"Seeded match_id counter at {highest_num}")
+
+
+async def supports_transactions() -> bool:
+    """
+    Check whether the deployment supports multi-document transactions.
+    Transactions require a replica set or a sharded cluster; the standalone
+    MongoDB used by docker-compose does not support them.
+    """
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await get_client().admin.command("hello")
+            _transactions_supported = bool(
+                hello.get("setName") or hello.get("msg") == "isdbgrid"
+            )
+        except Exception as e:
+            logger.error(f"Failed to detect MongoDB topology: {e}")
+            return False
+        if not _transactions_supported:
+            logger.warning(
+                "MongoDB is running standalone; multi-document transactions are disabled"
+            )
+    return _transactions_supported
+
+
+async def run_transaction(callback: Callable[[Any], Awaitable[Any]]) -> Any:
+    """
+    Run `callback(session)` inside a transaction, retrying transient errors.
+
+    On deployments without transaction support the callback runs with
+    `session=None`, so callers must keep their writes safe on their own
+    (e.g. by claiming documents with a compare-and-set first).
+    """
+    if not await supports_transactions():
+        return await callback(None)
+    async with await get_client().start_session() as session:
+        return await session.with_transaction(callback)
+
+
 async def close_db() -> None:
     """Close the database connection. Should be called on application shutdown."""
-    global _client, _db
+    global _client, _db, _transactions_supported
     if _client is not None:
         _client.close()
         _client = None
         _db = None
+        _transactions_supported = None
         logger.info("MongoDB connection closed")
 
 
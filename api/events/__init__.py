@@ -6,18 +6,24 @@ from events.types import (
     EventOrigin,
     BaseEvent,
     QueueUpdateEvent,
+    QueuePoppedEvent,
     MatchCreatedEvent,
     MatchUpdatedEvent,
     MatchResultEvent,
+    MatchSettledEvent,
     LeaderboardUpdateEvent,
     PlayerUpdatedEvent,
 )
 
+from events.bus import EventBus, event_bus
+
 from events.broadcast import (
     broadcast_queue_update,
+    broadcast_queue_popped,
     broadcast_match_created,
     broadcast_match_updated,
     broadcast_match_result,
+    broadcast_match_settled,
     broadcast_leaderboard_update,
     broadcast_player_updated,
 )
@@ -28,16 +34,23 @@ __all__ = [
     # Event types
     "BaseEvent",
     "QueueUpdateEvent",
+    "QueuePoppedEvent",
     "MatchCreatedEvent",
     "MatchUpdatedEvent",
     "MatchResultEvent",
+    "MatchSettledEvent",
     "LeaderboardUpdateEvent",
     "PlayerUpdatedEvent",
+    # Cross-replica event bus
+    "EventBus",
+    "event_bus",
     # Broadcast functions
     "broadcast_queue_update",
+    "broadcast_queue_popped",
     "broadcast_match_created",
     "broadcast_match_updated",
     "broadcast_match_result",
+    "broadcast_match_settled",
     "broadcast_leaderboard_update",
     "broadcast_player_updated",
 ]
@@ -3,16 +3,20 @@ Broadcasting utility functions for WebSocket events.
 These functions create typed events and broadcast them to connected clients.
 """
 
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 import logging
 
-from websocket import manager
+from models.queue import QueueEntry
+
+from events.bus import event_bus
 from events.types import (
     EventOrigin,
     QueueUpdateEvent,
+    QueuePoppedEvent,
     MatchCreatedEvent,
     MatchUpdatedEvent,
     MatchResultEvent,
+    MatchSettledEvent,
     LeaderboardUpdateEvent,
     PlayerUpdatedEvent,
 )
@@ -23,8 +27,11 @@ logger = logging.getLogger("valohub")
 async def broadcast_queue_update(
     rank_group: str,
     action: str,
+    version: int,
     discord_id: Optional[str] = None,
-    players: Optional[List[str]] = None,
+    added: Optional[List[QueueEntry]] = None,
+    removed: Optional[List[str]] = None,
+    snapshot: Optional[List[QueueEntry]] = None,
     queue_count: int = 0,
     origin: EventOrigin = "frontend",
     origin_id: Optional[str] = None,
@@ -34,9 +41,12 @@ async def broadcast_queue_update(
 
     Args:
         rank_group: The rank group of the queue (iron-plat, dia-asc, imm-radiant)
-        action: The action that occurred (joined, left, cleared)
+        action: The action that occurred (joined, left, cleared, replaced)
+        version: Queue version after the change
         discord_id: Discord ID of the player (if applicable)
-        players: List of player discord IDs currently in queue
+        added: Entries appended to the queue
+        removed: Discord IDs removed from the queue
+        snapshot: Whole queue, instead of a delta
         queue_count: Current number of players in queue
         origin: Source that triggered this event (bot or frontend)
         origin_id: Discord ID of the user who triggered this event
@@ -46,11 +56,60 @@ async def broadcast_queue_update(
         action=action,
         discord_id=discord_id,
         queue_count=queue_count,
-        players=players or [],
+        version=version,
+        added=added or [],
+        removed=removed or [],
+        snapshot=snapshot,
         origin=origin,
         origin_id=origin_id,
     )
-    await _broadcast_event(event.model_dump(), rank_group)
+    await _broadcast_event(event.model_dump(), [f"queue:{rank_group}"])
+
+
+async def broadcast_queue_popped(
+    rank_group: str,
+    match_id: str,
+    matched_players: List[str],
+    captain_red: str,
+    captain_blue: str,
+    version: int,
+    added: Optional[List[QueueEntry]] = None,
+    queue_count: int = 0,
+    origin: EventOrigin = "frontend",
+    origin_id: Optional[str] = None,
+) -> None:
+    """
+    Broadcast queue popped event. Replaces the queue update and match created
+    events for the join that fills a queue.
+
+    Args:
+        rank_group: The rank group of the queue
+        match_id: Identifier of the created match
+        matched_players: Discord IDs of the players taken into the match
+        captain_red: Discord ID of red team captain
+        captain_blue: Discord ID of blue team captain
+        version: Queue version after the pop
+        added: Entry of the player whose join filled the queue
+        queue_count: Number of players left in queue
+        origin: Source that triggered this event (bot or frontend)
+        origin_id: Discord ID of the user who triggered this event
+    """
+    event = QueuePoppedEvent(
+        rank_group=rank_group,
+        match_id=match_id,
+        matched_players=matched_players,
+        captain_red=captain_red,
+        captain_blue=captain_blue,
+        queue_count=queue_count,
+        version=version,
+        added=added or [],
+        removed=matched_players,
+        origin=origin,
+        origin_id=origin_id,
+    )
+    await _broadcast_event(
+        event.model_dump(), [f"queue:{rank_group}", f"matches:{rank_group}"]
+    )
 
 
 async def broadcast_match_created(
@@ -86,7 +145,9 @@ async def broadcast_match_created(
         origin=origin,
         origin_id=origin_id,
     )
-    await _broadcast_event(event.model_dump(), rank_group)
+    await _broadcast_event(
+        event.model_dump(), [f"matches:{rank_group}", f"match:{match_id}"]
+    )
 
 
 async def broadcast_match_updated(
@@ -104,7 +165,7 @@ async def broadcast_match_updated(
         match_id: Unique match identifier
         update_type: Type of update (teams, captains, draft, score, cancelled)
         data: Update data payload
-        rank_group: Optional rank group to filter recipients
+        rank_group: Rank group of the match, for the matches:<rank_group> topic
         origin: Source that triggered this event (bot or frontend)
         origin_id: Discord ID of the user who triggered this event
     """
@@ -115,7 +176,7 @@ async def broadcast_match_updated(
         origin=origin,
         origin_id=origin_id,
     )
-    await _broadcast_event(event.model_dump(), rank_group)
+    await _broadcast_event(event.model_dump(), _match_topics(match_id, rank_group))
 
 
 async def broadcast_match_result(
@@ -135,7 +196,7 @@ async def broadcast_match_result(
         result: Match result (red, blue, cancelled)
         red_score: Red team score
         blue_score: Blue team score
-        rank_group: Optional rank group to filter recipients
+        rank_group: Rank group of the match, for the matches:<rank_group> topic
         origin: Source that triggered this event (bot or frontend)
         origin_id: Discord ID of the user who triggered this event
     """
@@ -147,7 +208,52 @@ async def broadcast_match_result(
         origin=origin,
         origin_id=origin_id,
     )
-    await _broadcast_event(event.model_dump(), rank_group)
+    await _broadcast_event(event.model_dump(), _match_topics(match_id, rank_group))
+
+
+async def broadcast_match_settled(
+    match_id: str,
+    rank_group: str,
+    result: str,
+    red_score: int,
+    blue_score: int,
+    points_changes: Dict[str, int],
+    top_players: List[dict],
+    origin: EventOrigin = "frontend",
+    origin_id: Optional[str] = None,
+) -> None:
+    """
+    Broadcast match settled event.
+
+    Replaces the separate match_result and leaderboard_update events that a
+    settlement used to produce.
+
+    Args:
+        match_id: Unique match identifier
+        rank_group: The rank group of the match
+        result: Winning team (red, blue)
+        red_score: Red team score
+        blue_score: Blue team score
+        points_changes: Points change per player discord ID
+        top_players: Top leaderboard entries after settlement
+        origin: Source that triggered this event (bot or frontend)
+        origin_id: Discord ID of the user who triggered this event
+    """
+    event = MatchSettledEvent(
+        match_id=match_id,
+        rank_group=rank_group,
+        result=result,
+        red_score=red_score,
+        blue_score=blue_score,
+        points_changes=points_changes,
+        top_players=top_players,
+        origin=origin,
+        origin_id=origin_id,
+    )
+    await _broadcast_event(
+        event.model_dump(),
+        _match_topics(match_id, rank_group) + [f"leaderboard:{rank_group}"],
+    )
 
 
 async def broadcast_leaderboard_update(
@@ -171,7 +277,7 @@ async def broadcast_leaderboard_update(
         origin=origin,
         origin_id=origin_id,
     )
-    await _broadcast_event(event.model_dump(), rank_group)
+    await _broadcast_event(event.model_dump(), [f"leaderboard:{rank_group}"])
 
 
 async def broadcast_player_updated(
@@ -198,20 +304,28 @@ async def broadcast_player_updated(
         origin=origin,
         origin_id=origin_id,
     )
-    await _broadcast_event(event.model_dump())
+    await _broadcast_event(event.model_dump(), [f"player:{discord_id}"])
+
+
+def _match_topics(match_id: str, rank_group: Optional[str]) -> List[str]:
+    topics = [f"match:{match_id}"]
+    if rank_group:
+        topics.append(f"matches:{rank_group}")
+    return topics
 
 
-async def _broadcast_event(event: dict, rank_group: Optional[str] = None) -> None:
+async def _broadcast_event(event: dict, topics: List[str]) -> None:
     """
-    Helper to broadcast event without blocking.
+    Helper to broadcast event without blocking: the event is only queued
+    for each connection and for the event bus publisher.
     Logs failures but doesn't raise.
 
     Args:
         event: Event dictionary to broadcast
-        rank_group: Optional rank group to filter recipients
+        topics: Topics whose subscribers receive the event
     """
     try:
-        await manager.broadcast(event, rank_group)
+        await event_bus.publish(event, topics)
         logger.debug(
             f"Broadcast event: {event.get('type')} (origin: {event.get('origin')})"
         )
@@ -0,0 +1,155 @@
+"""
+Cross-replica event bus.
+
+Every broadcast is queued for this replica's WebSocket connections
+directly and published once to a Redis channel by a background publisher. Each replica subscribes to
+that channel and fans the events of the other replicas out to its own
+connections, so clients see every event whichever replica they are
+connected to.
+
+The same channel carries state notifications for the in-process
+registries (active matches, sanctions). Handlers registered with
+`on_notify` apply the writes made by other replicas.
+
+Without Redis the bus is a plain in-process loopback, which is exact for
+single-replica deployments.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from codec import encode
+from rate_limit import get_redis_client
+from events.replay import get_replay_log
+from websocket import coalesce_key, manager
+
+logger = logging.getLogger("valohub")
+
+CHANNEL = "valohub:events"
+
+# Delay before resubscribing after the Redis connection drops
+RECONNECT_DELAY_SECONDS = 5
+
+# Messages waiting to be published before new ones are dropped
+MAX_OUTGOING = 10000
+
+NotifyHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class EventBus:
+    """Publishes events locally and to the other API replicas."""
+
+    def __init__(self):
+        self.replica_id = uuid.uuid4().hex
+        self._handlers: Dict[str, NotifyHandler] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._publisher: Optional[asyncio.Task] = None
+        self._outgoing: Optional[asyncio.Queue] = None
+
+    def on_notify(self, kind: str):
+        """Decorator registering the handler for remote `kind` notifications."""
+
+        def decorator(handler: NotifyHandler) -> NotifyHandler:
+            self._handlers[kind] = handler
+            return handler
+
+        return decorator
+
+    async def publish(self, event: dict, topics: List[str]) -> None:
+        """
+        Stamp a WebSocket event with its sequence numbers and broadcast it to
+        its topics on every replica.
+        """
+        log = await get_replay_log()
+        event = {k: v for k, v in event.items() if k != "seq"}
+        frame = await log.append(encode(event), topics)
+        key = coalesce_key(event)
+        manager.broadcast_frame(frame, topics, key)
+        await self._send(
+            {"kind": "event", "topics": topics, "frame": frame, "key": key}
+        )
+
+    async def notify(self, kind: str, payload: Dict[str, Any]) -> None:
+        """Tell the other replicas about a state change applied locally."""
+        await self._send({"kind": kind, "payload": payload})
+
+    async def _send(self, message: dict) -> None:
+        # Publishing happens on the publisher task, off the request path
+        if self._outgoing is None:
+            return
+        message["replica"] = self.replica_id
+        try:
+            self._outgoing.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.error(f"Event bus backlog full, dropped {message['kind']}")
+
+    async def _publish_loop(self) -> None:
+        while True:
+            message = await self._outgoing.get()
+            redis = await get_redis_client()
+            if redis is None:
+                continue
+            try:
+                await redis.publish(CHANNEL, json.dumps(message, default=str))
+            except Exception as e:
+                logger.error(f"Failed to publish {message['kind']} to event bus: {e}")
+
+    async def _dispatch(self, message: dict) -> None:
+        if message.get("replica") == self.replica_id:
+            return
+        kind = message.get("kind")
+        if kind == "event":
+            key = message.get("key")
+            manager.broadcast_frame(
+                message["frame"], message.get("topics", []), tuple(key) if key else None
+            )
+            return
+        handler = self._handlers.get(kind)
+        if handler:
+            await handler(message.get("payload", {}))
+
+    async def _listen(self) -> None:
+        while True:
+            redis = await get_redis_client()
+            if redis is None:
+                return
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                logger.info(f"Event bus subscribed as replica {self.replica_id}")
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        await self._dispatch(json.loads(message["data"]))
+                    except Exception as e:
+                        logger.error(f"Failed to handle event bus message: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event bus subscription lost: {e}")
+            finally:
+                await pubsub.close()
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def start(self) -> None:
+        """Start listening to the other replicas. Called on startup."""
+        if await get_redis_client() is None:
+            logger.info("Redis not available, event bus is local only")
+            return
+        self._outgoing = asyncio.Queue(maxsize=MAX_OUTGOING)
+        self._publisher = asyncio.create_task(self._publish_loop())
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        for task in (self._listener, self._publisher):
+            if task is not None:
+                task.cancel()
+        self._listener = self._publisher = self._outgoing = None
+
+
+# Global event bus instance
+event_bus = EventBus()
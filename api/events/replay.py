@@ -0,0 +1,173 @@
+"""
+Event sequence numbers and replay buffers.
+
+Every broadcast event is stamped with a sequence number per topic, plus one
+on the "*" topic that spans all events, in a `seq` field:
+
+    {"type": "queue_update", ..., "seq": {"queue:dia-asc": 42, "*": 9001}}
+
+The most recent frames of each topic are kept in a bounded ring buffer.
+A reconnecting client passes the last sequence numbers it saw
+(`?since=queue:dia-asc=42,*=9001`) and receives only the events it missed,
+or a `resync_required` frame for topics whose gap has already been evicted.
+
+Uses Redis (counters and capped lists) when available so that numbering is
+shared by all API replicas. Falls back to in-process counters and deques
+otherwise.
+"""
+
+import json
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from rate_limit import get_redis_client
+
+logger = logging.getLogger("valohub")
+
+# Topic spanning every event; what the bot follows
+ALL_TOPIC = "*"
+
+# Frames kept per topic, and for the all-events topic
+RING_SIZE = 256
+ALL_RING_SIZE = 2048
+
+# In-process: topics tracked before the least recently used is dropped
+MAX_MEMORY_TOPICS = 1000
+
+# Redis: topic counters and rings expire after a day without events
+REDIS_TTL_SECONDS = 86400
+
+# Sequence numbers a client missed, as (all-events seq, frame) pairs;
+# None when the gap is no longer buffered
+Replay = Optional[List[Tuple[int, str]]]
+
+
+def _ring_size(topic: str) -> int:
+    return ALL_RING_SIZE if topic == ALL_TOPIC else RING_SIZE
+
+
+def _with_seq(event_json: str, seqs: Dict[str, int]) -> str:
+    """Add the seq field to a serialized event object."""
+    return f'{event_json[:-1]}, "seq": {json.dumps(seqs)}}}'
+
+
+def _all_seq(frame: str) -> int:
+    return json.loads(frame)["seq"][ALL_TOPIC]
+
+
+def parse_since(value: Optional[str]) -> Dict[str, int]:
+    """Parse `topic=seq,topic=seq`; malformed pairs are ignored."""
+    since: Dict[str, int] = {}
+    for pair in (value or "").split(","):
+        topic, _, seq = pair.rpartition("=")
+        if topic and seq.isdigit():
+            since[topic] = int(seq)
+    return since
+
+
+class MemoryReplayLog:
+    """Per-topic counters and ring buffers in process memory."""
+
+    def __init__(self):
+        self._topics: "OrderedDict[str, Tuple[int, Deque[str]]]" = OrderedDict()
+
+    async def append(self, event_json: str, topics: Iterable[str]) -> str:
+        topics = [*topics, ALL_TOPIC]
+        seqs = {}
+        for topic in topics:
+            seq, _ = self._topics.get(topic, (0, None))
+            seqs[topic] = seq + 1
+        frame = _with_seq(event_json, seqs)
+        for topic in topics:
+            _, ring = self._topics.pop(topic, (0, None))
+            if ring is None:
+                ring = deque(maxlen=_ring_size(topic))
+            ring.append(frame)
+            self._topics[topic] = (seqs[topic], ring)
+        while len(self._topics) > MAX_MEMORY_TOPICS:
+            self._topics.popitem(last=False)
+        return frame
+
+    async def since(self, topic: str, seq: int) -> Replay:
+        current, ring = self._topics.get(topic, (0, ()))
+        return _gap(topic, seq, current, list(ring))
+
+
+# KEYS: seq key and ring key per topic, ARGV[1]: event JSON,
+# ARGV[2..]: ring size per topic, last: TTL. Returns the stamped frame.
+_APPEND_SCRIPT = """
+local n = #KEYS / 2
+local ttl = tonumber(ARGV[#ARGV])
+local parts = {}
+for i = 1, n do
+    local seq = redis.call('INCR', KEYS[2 * i - 1])
+    local topic = string.sub(KEYS[2 * i - 1], string.len('events:seq:') + 1)
+    parts[i] = cjson.encode(topic) .. ': ' .. seq
+end
+local event = ARGV[1]
+local frame = string.sub(event, 1, -2) .. ', "seq": {' .. table.concat(parts, ', ') .. '}}'
+for i = 1, n do
+    local ring = KEYS[2 * i]
+    redis.call('LPUSH', ring, frame)
+    redis.call('LTRIM', ring, 0, tonumber(ARGV[i + 1]) - 1)
+    redis.call('EXPIRE', ring, ttl)
+    redis.call('EXPIRE', KEYS[2 * i - 1], ttl)
+end
+return frame
+"""
+
+
+class RedisReplayLog:
+    """Per-topic counters and capped lists in Redis, shared by all replicas."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._append_script = redis.register_script(_APPEND_SCRIPT)
+
+    async def append(self, event_json: str, topics: Iterable[str]) -> str:
+        topics = [*topics, ALL_TOPIC]
+        keys = []
+        for topic in topics:
+            keys += [f"events:seq:{topic}", f"events:log:{topic}"]
+        sizes = [_ring_size(topic) for topic in topics]
+        return await self._append_script(
+            keys=keys, args=[event_json, *sizes, REDIS_TTL_SECONDS]
+        )
+
+    async def since(self, topic: str, seq: int) -> Replay:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.get(f"events:seq:{topic}")
+        pipe.lrange(f"events:log:{topic}", 0, -1)
+        current, ring = await pipe.execute()
+        return _gap(topic, seq, int(current or 0), list(reversed(ring)))
+
+
+def _gap(topic: str, seq: int, current: int, ring: List[str]) -> Replay:
+    """Frames of `topic` after `seq`, given the ring ordered oldest first."""
+    if seq == current:
+        return []
+    if seq > current:
+        # Counter was reset (Redis expiry or API restart without Redis)
+        return None
+    missed = ring[-(current - seq) :] if current - seq <= len(ring) else None
+    if missed is None:
+        return None
+    return [(_all_seq(frame), frame) for frame in missed]
+
+
+_replay_log = None
+
+
+async def get_replay_log():
+    """Get the replay log, preferring the shared Redis backend."""
+    global _replay_log
+    if _replay_log is None:
+        redis = await get_redis_client()
+        if redis is not None:
+            _replay_log = RedisReplayLog(redis)
+            logger.info("Using Redis event replay log")
+        else:
+            _replay_log = MemoryReplayLog()
+            logger.info("Using in-memory event replay log")
+    return _replay_log
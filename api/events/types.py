@@ -6,6 +6,9 @@ from pydantic import BaseModel, Field
 from typing import Optional, List, Literal, Dict, Any
 from datetime import datetime, timezone
 
+from codec import JSON, Frame, encode as encode_payload
+from models.queue import QueueEntry
+
 # Origin types for event deduplication
 EventOrigin = Literal["bot", "frontend"]
 
@@ -26,22 +29,66 @@ class BaseEvent(BaseModel):
         None,
         description="Discord ID of the user who triggered this event",
     )
+    seq: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Sequence number per topic, stamped when broadcast",
+    )
+
+    def encode(self, encoding: str = JSON) -> Frame:
+        """Serialize the event as a WebSocket frame ("json" or "msgpack")."""
+        return encode_payload(self.model_dump(), encoding)
 
 
 class QueueUpdateEvent(BaseEvent):
-    """Event for queue changes."""
+    """
+    Event for queue changes. Carries the change as a delta on the previous
+    queue version (`added`, then `removed`), or the whole queue in
+    `snapshot` for replacements. A client that missed a version fetches the
+    queue instead of applying the delta.
+    """
 
     type: Literal["queue_update"] = "queue_update"
     rank_group: str = Field(..., description="The rank group of the queue")
-    action: Literal["joined", "left", "cleared"] = Field(
+    action: Literal["joined", "left", "cleared", "replaced"] = Field(
         ..., description="The action that occurred"
     )
     discord_id: Optional[str] = Field(
         None, description="Discord ID of the player (if applicable)"
     )
     queue_count: int = Field(..., description="Current number of players in queue")
-    players: List[str] = Field(
-        default_factory=list, description="List of player discord IDs in queue"
+    version: int = Field(..., description="Queue version after this change")
+    added: List[QueueEntry] = Field(
+        default_factory=list, description="Entries appended to the queue"
+    )
+    removed: List[str] = Field(
+        default_factory=list, description="Discord IDs removed from the queue"
+    )
+    snapshot: Optional[List[QueueEntry]] = Field(
+        None, description="Whole queue, for changes that are not deltas"
+    )
+
+
+class QueuePoppedEvent(BaseEvent):
+    """
+    Event for a full queue popped into a new match. The queue delta is the
+    joining player added and the matched players removed.
+    """
+
+    type: Literal["queue_popped"] = "queue_popped"
+    rank_group: str = Field(..., description="The rank group of the queue")
+    match_id: str = Field(..., description="Identifier of the created match")
+    matched_players: List[str] = Field(
+        ..., description="Discord IDs of the players taken into the match"
+    )
+    captain_red: str = Field(..., description="Discord ID of red team captain")
+    captain_blue: str = Field(..., description="Discord ID of blue team captain")
+    queue_count: int = Field(..., description="Number of players left in queue")
+    version: int = Field(..., description="Queue version after the pop")
+    added: List[QueueEntry] = Field(
+        default_factory=list, description="Entries appended to the queue"
+    )
+    removed: List[str] = Field(
+        default_factory=list, description="Discord IDs removed from the queue"
     )
 
 
@@ -80,6 +127,23 @@ class MatchResultEvent(BaseEvent):
     blue_score: Optional[int] = Field(None, description="Blue team score")
 
 
+class MatchSettledEvent(BaseEvent):
+    """Event for a settled match: result, point changes and new standings."""
+
+    type: Literal["match_settled"] = "match_settled"
+    match_id: str = Field(..., description="Unique match identifier")
+    rank_group: str = Field(..., description="The rank group of the match")
+    result: Literal["red", "blue"] = Field(..., description="Winning team")
+    red_score: int = Field(..., description="Red team score")
+    blue_score: int = Field(..., description="Blue team score")
+    points_changes: Dict[str, int] = Field(
+        default_factory=dict, description="Points change per player discord ID"
+    )
+    top_players: List[Dict[str, Any]] = Field(
+        default_factory=list, description="Top leaderboard entries after settlement"
+    )
+
+
 class LeaderboardUpdateEvent(BaseEvent):
     """Event for leaderboard changes."""
 
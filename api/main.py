@@ -14,8 +14,23 @@ from pydantic import ValidationError
 from config import settings
 
 # Import modules
-from db import get_db, init_indexes, close_db, check_connection
+from db import (
+    get_db,
+    init_indexes,
+    migrate_leaderboard_entries,
+    seed_match_counter,
+    migrate_sanctions,
+    close_db,
+    check_connection,
+)
 from rate_limit import check_rate_limit, get_rate_limit_remaining, close_redis
+from rank_index import init_rank_index
+from queue_engine import init_queue_engine, close_queue_engine
+from match_registry import init_match_registry
+from sanctions import load_sanctions, refresh_sanctions_loop
+from events.bus import event_bus
+from websocket import manager as ws_manager
+from models.updates import VALID_RANK_GROUPS
 from logging_config import setup_logging, get_logger
 from exceptions import (
     ValoHubException,
@@ -42,6 +57,50 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to initialize database indexes: {e}")
 
+    # Move legacy embedded leaderboard arrays into leaderboard_entries
+    try:
+        await migrate_leaderboard_entries()
+    except Exception as e:
+        logger.error(f"Failed to migrate leaderboard entries: {e}")
+
+    # Make sure the match_id counter starts above existing matches
+    try:
+        await seed_match_counter()
+    except Exception as e:
+        logger.error(f"Failed to seed match counter: {e}")
+
+    # Load unresolved matches into the active match registry
+    try:
+        await init_match_registry(get_db())
+    except Exception as e:
+        logger.error(f"Failed to load active match registry: {e}")
+
+    # Load active bans/timeouts, migrating legacy admin_logs sanctions first
+    try:
+        await migrate_sanctions()
+        await load_sanctions(get_db())
+    except Exception as e:
+        logger.error(f"Failed to load sanctions: {e}")
+    sanctions_task = asyncio.create_task(refresh_sanctions_loop(get_db()))
+
+    # Fan out events and registry writes from the other API replicas
+    try:
+        await event_bus.start()
+    except Exception as e:
+        logger.error(f"Failed to start event bus: {e}")
+
+    # Seed Redis queues from MongoDB when the Redis queue engine is in use
+    try:
+        await init_queue_engine(VALID_RANK_GROUPS)
+    except Exception as e:
+        logger.error(f"Failed to initialize queue engine: {e}")
+
+    # Build the in-memory/Redis rank index from leaderboard_entries
+    try:
+        await init_rank_index(get_db(), VALID_RANK_GROUPS)
+    except Exception as e:
+        logger.error(f"Failed to build rank index: {e}")
+
     # Verify database connection
     if await check_connection():
         logger.info("Database connection verified")
@@ -55,6 +114,16 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down ValoDiscordHub API...")
 
+    sanctions_task.cancel()
+    await event_bus.stop()
+    await ws_manager.stop()
+
+    # Write pending queue changes back to MongoDB
+    try:
+        await close_queue_engine()
+    except Exception as e:
+        logger.error(f"Failed to flush queues: {e}")
+
     # Close database connection
     await close_db()
 
@@ -186,6 +255,7 @@ from routes.queue import router as queue_router
 from routes.preferences import router as preferences_router
 from routes.stats import router as stats_router
 from routes.history import router as history_router
+from routes.bot_messages import router as bot_messages_router
 from auth import router as auth_router
 from websocket import router as websocket_router
 
@@ -197,5 +267,6 @@ app.include_router(queue_router)
 app.include_router(preferences_router)
 app.include_router(stats_router)
 app.include_router(history_router)
+app.include_router(bot_messages_router)
 app.include_router(auth_router)
 app.include_router(websocket_router)
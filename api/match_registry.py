@@ -0,0 +1,86 @@
+"""
+In-process registry of unresolved matches.
+
+Keeps every match without a result keyed by match_id and by player
+discord_id, so "is this player in a match" is a dictionary lookup instead of
+a `$or` query over players_red/players_blue. Loaded from MongoDB on startup
+and updated by every match write (create, patch, settle, revert). Writes
+are announced on the event bus so every API replica stays in sync.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from events.bus import event_bus
+from models.match import Match
+
+logger = logging.getLogger("valohub")
+
+
+class ActiveMatchRegistry:
+    """Unresolved matches indexed by match_id and by player discord_id."""
+
+    def __init__(self):
+        self._matches: Dict[str, Match] = {}
+        self._by_player: Dict[str, str] = {}
+
+    def load(self, matches: List[Match]) -> None:
+        """Replace the registry contents."""
+        self._matches.clear()
+        self._by_player.clear()
+        for match in matches:
+            self.update(match)
+
+    def update(self, match: Match) -> None:
+        """Record the latest state of a match; resolved matches are dropped."""
+        self.discard(match.match_id)
+        if match.result is not None:
+            return
+        self._matches[match.match_id] = match
+        for discord_id in match.players_red + match.players_blue:
+            self._by_player[discord_id] = match.match_id
+
+    def discard(self, match_id: str) -> None:
+        match = self._matches.pop(match_id, None)
+        if not match:
+            return
+        for discord_id in match.players_red + match.players_blue:
+            if self._by_player.get(discord_id) == match_id:
+                del self._by_player[discord_id]
+
+    def get(self, match_id: str) -> Optional[Match]:
+        return self._matches.get(match_id)
+
+    def match_for_player(self, discord_id: str) -> Optional[Match]:
+        match_id = self._by_player.get(discord_id)
+        return self._matches.get(match_id) if match_id else None
+
+    def is_player_in_match(self, discord_id: str) -> bool:
+        return discord_id in self._by_player
+
+    def all(self) -> List[Match]:
+        return list(self._matches.values())
+
+
+# Global registry instance
+active_matches = ActiveMatchRegistry()
+
+
+async def init_match_registry(db: AsyncIOMotorDatabase) -> None:
+    """Load unresolved matches into the registry. Called on startup."""
+    matches = [Match(**doc) async for doc in db.matches.find({"result": None})]
+    active_matches.load(matches)
+    logger.info(f"Active match registry loaded ({len(matches)} matches)")
+
+
+async def record_match(match: Match) -> None:
+    """Record a match write here and on the other API replicas."""
+    active_matches.update(match)
+    await event_bus.notify("match", match.model_dump(mode="json", exclude={"duration"}))
+
+
+@event_bus.on_notify("match")
+async def _apply_remote_match(payload: dict) -> None:
+    active_matches.update(Match(**payload))
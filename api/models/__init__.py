@@ -20,6 +20,7 @@ from shared.models import (
     LeaderboardEntry,
     AdminLog,
     UserPreferences,
+    BotMessage,
 )
 
 __all__ = [
@@ -31,4 +32,5 @@ __all__ = [
     "LeaderboardEntry",
     "AdminLog",
     "UserPreferences",
+    "BotMessage",
 ]
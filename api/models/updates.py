@@ -4,7 +4,7 @@ These models define what fields can be updated and their constraints.
 All fields are optional since PATCH allows partial updates.
 """
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Optional, List, Literal
 from datetime import datetime
 
@@ -186,3 +186,80 @@ class AdminLogCreate(BaseModel):
             if not v.isdigit():
                 raise ValueError("Discord ID must contain only digits")
         return v
+
+
+class LeaderboardEntryDelta(BaseModel):
+    """Per-player increments for PATCH /leaderboard/{rank_group}/entries"""
+
+    discord_id: str = Field(..., description="Discord ID of the player")
+    points: int = Field(default=0, description="Points to add (negative to subtract)")
+    matches_played: int = Field(default=0, description="Matches played to add")
+    wins: int = Field(default=0, description="Wins to add")
+    streak: Optional[Literal["win", "loss", "undo_win", "undo_loss", "restore"]] = (
+        Field(default=None, description="Streak transition to apply")
+    )
+    streak_before: Optional[int] = Field(
+        default=None, description="Streak to restore (streak='restore' only)"
+    )
+    streak_after: Optional[int] = Field(
+        default=None,
+        description="Restore only while the streak still equals this value",
+    )
+    rank: Optional[str] = Field(
+        default=None,
+        description="Rank to store on the entry (defaults to the player's rank)",
+    )
+
+
+class LeaderboardDeltaBatch(BaseModel):
+    """Body of PATCH /leaderboard/{rank_group}/entries"""
+
+    entries: List[LeaderboardEntryDelta] = Field(..., min_length=1, max_length=50)
+
+
+class MatchSettle(BaseModel):
+    """Body of POST /matches/{match_id}/settle"""
+
+    red_score: int = Field(..., ge=0, le=99, description="Red team score")
+    blue_score: int = Field(..., ge=0, le=99, description="Blue team score")
+
+    force: bool = Field(
+        default=False,
+        description="Re-settle a match that already has a result (admin correction)",
+    )
+
+    @model_validator(mode="after")
+    def validate_not_draw(self) -> "MatchSettle":
+        if self.red_score == self.blue_score:
+            raise ValueError("A match cannot end in a draw")
+        return self
+
+    @property
+    def winner(self) -> Literal["red", "blue"]:
+        return "red" if self.red_score > self.blue_score else "blue"
+
+
+class MatchCreate(BaseModel):
+    """Body of POST /matches/. The match_id is allocated server-side if omitted."""
+
+    match_id: Optional[str] = Field(
+        default=None, max_length=50, description="Explicit match ID (optional)"
+    )
+    players_red: List[str] = Field(default_factory=list, max_length=5)
+    players_blue: List[str] = Field(default_factory=list, max_length=5)
+    captain_red: str = Field(..., description="Red team captain discord ID")
+    captain_blue: str = Field(..., description="Blue team captain discord ID")
+    lobby_master: str = Field(..., description="Lobby master discord ID")
+    rank_group: Literal["iron-plat", "dia-asc", "imm-radiant"] = Field(
+        ..., description="Rank group of the match"
+    )
+
+
+class BotMessageUpdate(BaseModel):
+    """Body of PUT /bot-messages/{guild_id}/{role}"""
+
+    channel_id: str = Field(..., max_length=32, description="Channel of the message")
+    message_id: str = Field(..., max_length=32, description="Discord message ID")
+    digest: Optional[str] = Field(
+        default=None, max_length=64, description="Hash of the rendered content"
+    )
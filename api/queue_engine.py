@@ -0,0 +1,443 @@
+"""
+Queue storage engines.
+
+Both engines expose the same operations, and each one is atomic per rank
+group and bumps the queue's version, so that clients can apply queue events
+as deltas and notice the ones they missed:
+
+- join: add a player unless already queued or full. The join that fills
+  the queue pops the first QUEUE_SIZE players in the same step. A queue left
+  at QUEUE_SIZE players by a requeue pops on the next join.
+- leave, replace, clear
+- requeue: put popped players back at the front, e.g. when creating their
+  match failed. The latest joiners are dropped if that overfills the queue
+- snapshot: the players and the version they are at
+
+With Redis available, queues are sorted sets keyed `queue:{rank_group}`
+(member discord_id, score join time in ms) with their version in
+`queue:{rank_group}:version`. Lua scripts keep them
+consistent across API replicas. MongoDB is then a write-behind copy: changed
+rank groups are flushed shortly after each operation and on shutdown, and
+Redis is seeded from it on first start. Without Redis the `queues`
+collection is the only store and every operation is a single atomic update.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument
+
+from db import get_db
+from models.queue import QueueEntry
+from rate_limit import get_redis_client
+
+logger = logging.getLogger("valohub")
+
+# Players per match; the join that reaches this pops the queue
+QUEUE_SIZE = 10
+
+# Delay before changed queues are written back to MongoDB
+PERSIST_DELAY_SECONDS = 0.5
+
+# Join outcomes
+JOINED = "joined"
+POPPED = "popped"
+ALREADY_QUEUED = "already_queued"
+FULL = "full"
+
+# (outcome, players left in queue, popped players, queue version)
+JoinResult = Tuple[str, List[QueueEntry], List[QueueEntry], int]
+
+# (players, queue version)
+Snapshot = Tuple[List[QueueEntry], int]
+
+
+class MongoQueueEngine:
+    """Queues stored directly in the `queues` collection."""
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _join_pipeline(entry: QueueEntry) -> list:
+        return [
+            {
+                "$set": {
+                    "players": {
+                        "$concatArrays": [
+                            {"$ifNull": ["$players", []]},
+                            {"$literal": [entry.dict()]},
+                        ]
+                    },
+                    "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                }
+            },
+            {
+                "$set": {
+                    "players": {
+                        "$cond": [
+                            {"$gte": [{"$size": "$players"}, QUEUE_SIZE]},
+                            {"$slice": ["$players", QUEUE_SIZE, QUEUE_SIZE]},
+                            "$players",
+                        ]
+                    }
+                }
+            },
+        ]
+
+    @staticmethod
+    def _snapshot(doc: Optional[dict]) -> Snapshot:
+        doc = doc or {}
+        players = [QueueEntry(**p) for p in doc.get("players", [])]
+        return players, doc.get("version", 0)
+
+    async def get(self, rank_group: str) -> List[QueueEntry]:
+        players, _ = await self.snapshot(rank_group)
+        return players
+
+    async def snapshot(self, rank_group: str) -> Snapshot:
+        return self._snapshot(await self.db.queues.find_one({"rank_group": rank_group}))
+
+    async def join(self, rank_group: str, entry: QueueEntry) -> JoinResult:
+        # Only matches when the player is not queued and the queue holds at
+        # most QUEUE_SIZE players. Returns the document as it was before the
+        # join.
+        query = {
+            "rank_group": rank_group,
+            "players.discord_id": {"$ne": entry.discord_id},
+            f"players.{QUEUE_SIZE}": {"$exists": False},
+        }
+        before = await self.db.queues.find_one_and_update(
+            query, self._join_pipeline(entry), return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            doc = await self.db.queues.find_one({"rank_group": rank_group})
+            if doc is None:
+                # First join into this rank group
+                await self.db.queues.update_one(
+                    {"rank_group": rank_group},
+                    {"$setOnInsert": {"players": [], "version": 0}},
+                    upsert=True,
+                )
+                return await self.join(rank_group, entry)
+            players, version = self._snapshot(doc)
+            if any(p.discord_id == entry.discord_id for p in players):
+                return ALREADY_QUEUED, players, [], version
+            return FULL, players, [], version
+
+        players, version = self._snapshot(before)
+        players.append(entry)
+        if len(players) < QUEUE_SIZE:
+            return JOINED, players, [], version + 1
+        return POPPED, players[QUEUE_SIZE:], players[:QUEUE_SIZE], version + 1
+
+    async def leave(
+        self, rank_group: str, discord_id: str
+    ) -> Tuple[bool, List[QueueEntry], int]:
+        # Only matches, and bumps the version, when the player is queued
+        after = await self.db.queues.find_one_and_update(
+            {"rank_group": rank_group, "players.discord_id": discord_id},
+            {
+                "$pull": {"players": {"discord_id": discord_id}},
+                "$inc": {"version": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if after is None:
+            return (False, *await self.snapshot(rank_group))
+        return (True, *self._snapshot(after))
+
+    async def replace(self, rank_group: str, players: List[QueueEntry]) -> Snapshot:
+        after = await self.db.queues.find_one_and_update(
+            {"rank_group": rank_group},
+            {"$set": {"players": [p.dict() for p in players]}, "$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return self._snapshot(after)
+
+    async def clear(self, rank_group: str) -> int:
+        _, version = await self.replace(rank_group, [])
+        return version
+
+    async def requeue(self, rank_group: str, players: List[QueueEntry]) -> Snapshot:
+        ids = [p.discord_id for p in players]
+        after = await self.db.queues.find_one_and_update(
+            {"rank_group": rank_group},
+            [
+                {
+                    "$set": {
+                        # Requeued players first, then those who joined since
+                        # the pop, cut back to a full queue
+                        "players": {
+                            "$slice": [
+                                {
+                                    "$concatArrays": [
+                                        {"$literal": [p.dict() for p in players]},
+                                        {
+                                            "$filter": {
+                                                "input": {"$ifNull": ["$players", []]},
+                                                "as": "p",
+                                                "cond": {
+                                                    "$not": [
+                                                        {"$in": ["$$p.discord_id", ids]}
+                                                    ]
+                                                },
+                                            }
+                                        },
+                                    ]
+                                },
+                                QUEUE_SIZE,
+                            ]
+                        },
+                        "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                    }
+                }
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return self._snapshot(after)
+
+    async def close(self) -> None:
+        pass
+
+
+# KEYS[1] queue, KEYS[2] version, ARGV discord_id, join time, queue size.
+# Returns {outcome, popped, players, version}; players are flat member/score
+# lists.
+_JOIN_SCRIPT = """
+local key = KEYS[1]
+local size = tonumber(ARGV[3])
+local version = tonumber(redis.call('GET', KEYS[2]) or 0)
+if redis.call('ZSCORE', key, ARGV[1]) then
+    return {'already_queued', {}, redis.call('ZRANGE', key, 0, -1, 'WITHSCORES'), version}
+end
+if redis.call('ZCARD', key) > size then
+    return {'full', {}, redis.call('ZRANGE', key, 0, -1, 'WITHSCORES'), version}
+end
+redis.call('ZADD', key, ARGV[2], ARGV[1])
+version = redis.call('INCR', KEYS[2])
+if redis.call('ZCARD', key) < size then
+    return {'joined', {}, redis.call('ZRANGE', key, 0, -1, 'WITHSCORES'), version}
+end
+local popped = redis.call('ZPOPMIN', key, size)
+return {'popped', popped, redis.call('ZRANGE', key, 0, -1, 'WITHSCORES'), version}
+"""
+
+# KEYS[1] queue, KEYS[2] version, ARGV discord_id.
+# Returns {removed, players, version}.
+_LEAVE_SCRIPT = """
+local removed = redis.call('ZREM', KEYS[1], ARGV[1])
+local version
+if removed == 1 then
+    version = redis.call('INCR', KEYS[2])
+else
+    version = tonumber(redis.call('GET', KEYS[2]) or 0)
+end
+return {removed, redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES'), version}
+"""
+
+# KEYS[1] queue, KEYS[2] version, ARGV queue size then member/score pairs.
+# Returns {players, version}.
+_REQUEUE_SCRIPT = """
+local size = tonumber(ARGV[1])
+for i = 2, #ARGV, 2 do
+    redis.call('ZADD', KEYS[1], ARGV[i + 1], ARGV[i])
+end
+local extra = redis.call('ZCARD', KEYS[1]) - size
+if extra > 0 then
+    redis.call('ZPOPMAX', KEYS[1], extra)
+end
+local version = redis.call('INCR', KEYS[2])
+return {redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES'), version}
+"""
+
+
+def _to_score(entry: QueueEntry) -> int:
+    joined_at = entry.joined_at
+    if joined_at.tzinfo is None:
+        joined_at = joined_at.replace(tzinfo=timezone.utc)
+    return int(joined_at.timestamp() * 1000)
+
+
+def _to_entries(flat: list) -> List[QueueEntry]:
+    return [
+        QueueEntry(
+            discord_id=flat[i],
+            joined_at=datetime.fromtimestamp(float(flat[i + 1]) / 1000, timezone.utc),
+        )
+        for i in range(0, len(flat), 2)
+    ]
+
+
+class RedisQueueEngine:
+    """Queues stored in Redis sorted sets, written back to MongoDB."""
+
+    def __init__(self, redis, db):
+        self.redis = redis
+        self.db = db
+        self._join_script = redis.register_script(_JOIN_SCRIPT)
+        self._leave_script = redis.register_script(_LEAVE_SCRIPT)
+        self._requeue_script = redis.register_script(_REQUEUE_SCRIPT)
+        self._dirty: Set[str] = set()
+        self._flusher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(rank_group: str) -> str:
+        return f"queue:{rank_group}"
+
+    @staticmethod
+    def _version_key(rank_group: str) -> str:
+        return f"queue:{rank_group}:version"
+
+    async def get(self, rank_group: str) -> List[QueueEntry]:
+        players, _ = await self.snapshot(rank_group)
+        return players
+
+    async def snapshot(self, rank_group: str) -> Snapshot:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zrange(self._key(rank_group), 0, -1, withscores=True)
+        pipe.get(self._version_key(rank_group))
+        flat, version = await pipe.execute()
+        players = [
+            QueueEntry(
+                discord_id=member,
+                joined_at=datetime.fromtimestamp(score / 1000, timezone.utc),
+            )
+            for member, score in flat
+        ]
+        return players, int(version or 0)
+
+    async def join(self, rank_group: str, entry: QueueEntry) -> JoinResult:
+        outcome, popped, players, version = await self._join_script(
+            keys=[self._key(rank_group), self._version_key(rank_group)],
+            args=[entry.discord_id, _to_score(entry), QUEUE_SIZE],
+        )
+        if outcome in (JOINED, POPPED):
+            self._mark_dirty(rank_group)
+        return outcome, _to_entries(players), _to_entries(popped), version
+
+    async def leave(
+        self, rank_group: str, discord_id: str
+    ) -> Tuple[bool, List[QueueEntry], int]:
+        removed, players, version = await self._leave_script(
+            keys=[self._key(rank_group), self._version_key(rank_group)],
+            args=[discord_id],
+        )
+        if removed:
+            self._mark_dirty(rank_group)
+        return bool(removed), _to_entries(players), version
+
+    async def _write(self, rank_group: str, replace: bool, players) -> int:
+        """Add players (after emptying the queue with `replace`), bump the version."""
+        key = self._key(rank_group)
+        pipe = self.redis.pipeline(transaction=True)
+        if replace:
+            pipe.delete(key)
+        if players:
+            pipe.zadd(key, {p.discord_id: _to_score(p) for p in players})
+        pipe.incr(self._version_key(rank_group))
+        results = await pipe.execute()
+        self._mark_dirty(rank_group)
+        return results[-1]
+
+    async def replace(self, rank_group: str, players: List[QueueEntry]) -> Snapshot:
+        await self._write(rank_group, True, players)
+        return await self.snapshot(rank_group)
+
+    async def clear(self, rank_group: str) -> int:
+        return await self._write(rank_group, True, [])
+
+    async def requeue(self, rank_group: str, players: List[QueueEntry]) -> Snapshot:
+        # Original join times put them back at the front, so trimming the
+        # highest scores drops the latest joiners
+        args = [QUEUE_SIZE]
+        for p in players:
+            args += [p.discord_id, _to_score(p)]
+        flat, version = await self._requeue_script(
+            keys=[self._key(rank_group), self._version_key(rank_group)], args=args
+        )
+        self._mark_dirty(rank_group)
+        return _to_entries(flat), version
+
+    async def seed(self, rank_group: str) -> None:
+        """Load a queue from MongoDB unless Redis already holds it."""
+        if not await self.redis.set(f"{self._key(rank_group)}:seeded", 1, nx=True):
+            return
+        doc = await self.db.queues.find_one({"rank_group": rank_group})
+        players, version = MongoQueueEngine._snapshot(doc)
+        if players:
+            await self.redis.zadd(
+                self._key(rank_group), {p.discord_id: _to_score(p) for p in players}
+            )
+        await self.redis.set(self._version_key(rank_group), version, nx=True)
+        logger.info(f"Seeded Redis queue {rank_group} ({len(players)} players)")
+
+    def _mark_dirty(self, rank_group: str) -> None:
+        self._dirty.add(rank_group)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(PERSIST_DELAY_SECONDS)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write every changed queue back to MongoDB."""
+        dirty, self._dirty = self._dirty, set()
+        for rank_group in dirty:
+            try:
+                players, version = await self.snapshot(rank_group)
+                await self.db.queues.update_one(
+                    {"rank_group": rank_group},
+                    {
+                        "$set": {
+                            "players": [p.dict() for p in players],
+                            "version": version,
+                        }
+                    },
+                    upsert=True,
+                )
+            except Exception as e:
+                logger.error(f"Failed to persist queue {rank_group}: {e}")
+                self._dirty.add(rank_group)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await self.flush()
+
+
+_queue_engine = None
+
+
+async def get_queue_engine():
+    """Get the queue engine, preferring the shared Redis backend."""
+    global _queue_engine
+    if _queue_engine is None:
+        redis = await get_redis_client()
+        if redis is not None:
+            _queue_engine = RedisQueueEngine(redis, get_db())
+            logger.info("Using Redis queue engine")
+        else:
+            _queue_engine = MongoQueueEngine(get_db())
+            logger.info("Using MongoDB queue engine")
+    return _queue_engine
+
+
+async def init_queue_engine(rank_groups: Iterable[str]) -> None:
+    """Seed the Redis queues from MongoDB. Called on startup."""
+    engine = await get_queue_engine()
+    if isinstance(engine, RedisQueueEngine):
+        for rank_group in rank_groups:
+            await engine.seed(rank_group)
+
+
+async def close_queue_engine() -> None:
+    """Flush pending queue writes. Called on shutdown."""
+    if _queue_engine is not None:
+        await _queue_engine.close()
@@ -0,0 +1,243 @@
+"""
+Order-statistic rank index for leaderboards.
+
+Answers "rank of player X", "players at ranks [a, b)" and "rank of score s"
+in logarithmic time for every leaderboard sort key. The index holds every
+entry; banned players are skipped by the leaderboard routes using the ranks
+of the (few) banned players. The index is built once
+from `leaderboard_entries` on startup and then kept up to date incrementally
+by every leaderboard write.
+
+Uses Redis sorted sets when Redis is available so that all API replicas share
+one index. Falls back to an in-process sorted list otherwise, which is exact
+for single-replica deployments.
+
+Ordering matches the (rank_group, <key> desc, discord_id asc) Mongo indexes:
+higher scores first, ties broken by ascending discord_id. Both backends store
+the negated score so that the natural ascending order is the ranking order.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from rate_limit import get_redis_client
+
+logger = logging.getLogger("valohub")
+
+SORT_KEYS = ("points", "winrate", "matches_played", "streak")
+
+
+class MemoryRankIndex:
+    """In-process rank index backed by one SortedList per (rank_group, key)."""
+
+    def __init__(self):
+        self._lists: Dict[Tuple[str, str], SortedList] = {}
+        self._scores: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def _get(self, rank_group: str, key: str) -> Tuple[SortedList, Dict[str, float]]:
+        index_key = (rank_group, key)
+        if index_key not in self._lists:
+            self._lists[index_key] = SortedList()
+            self._scores[index_key] = {}
+        return self._lists[index_key], self._scores[index_key]
+
+    async def claim_build(self, rank_group: str) -> bool:
+        return True
+
+    async def release_build(self, rank_group: str) -> None:
+        pass
+
+    async def rebuild(self, rank_group: str, entries: List[dict]) -> None:
+        for key in SORT_KEYS:
+            scores = {e["discord_id"]: e.get(key, 0) for e in entries}
+            self._lists[(rank_group, key)] = SortedList(
+                (-score, discord_id) for discord_id, score in scores.items()
+            )
+            self._scores[(rank_group, key)] = scores
+
+    async def update(self, rank_group: str, entries: Iterable[dict]) -> None:
+        entries = list(entries)
+        for key in SORT_KEYS:
+            ordered, scores = self._get(rank_group, key)
+            for entry in entries:
+                discord_id = entry["discord_id"]
+                score = entry.get(key, 0)
+                previous = scores.get(discord_id)
+                if previous is not None:
+                    ordered.discard((-previous, discord_id))
+                ordered.add((-score, discord_id))
+                scores[discord_id] = score
+
+    async def remove(self, rank_group: str, discord_ids: Iterable[str]) -> None:
+        discord_ids = list(discord_ids)
+        for key in SORT_KEYS:
+            ordered, scores = self._get(rank_group, key)
+            for discord_id in discord_ids:
+                previous = scores.pop(discord_id, None)
+                if previous is not None:
+                    ordered.discard((-previous, discord_id))
+
+    async def rank_of(
+        self, rank_group: str, discord_id: str, key: str = "points"
+    ) -> Optional[int]:
+        ordered, scores = self._get(rank_group, key)
+        score = scores.get(discord_id)
+        if score is None:
+            return None
+        return ordered.index((-score, discord_id))
+
+    async def ranks_of(
+        self, rank_group: str, discord_ids: Iterable[str], key: str = "points"
+    ) -> List[int]:
+        ordered, scores = self._get(rank_group, key)
+        return sorted(
+            ordered.index((-scores[discord_id], discord_id))
+            for discord_id in discord_ids
+            if discord_id in scores
+        )
+
+    async def ids_in_range(
+        self, rank_group: str, start: int, stop: int, key: str = "points"
+    ) -> List[str]:
+        ordered, _ = self._get(rank_group, key)
+        return [discord_id for _, discord_id in ordered.islice(start, stop)]
+
+    async def count_ahead_of_score(
+        self, rank_group: str, score: float, key: str = "points"
+    ) -> int:
+        ordered, _ = self._get(rank_group, key)
+        # Entries with a strictly higher score sort before (-score, "")
+        return ordered.bisect_left((-score, ""))
+
+    async def count(self, rank_group: str, key: str = "points") -> int:
+        ordered, _ = self._get(rank_group, key)
+        return len(ordered)
+
+
+class RedisRankIndex:
+    """Rank index backed by one Redis sorted set per (rank_group, key)."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def _key(rank_group: str, key: str) -> str:
+        return f"rank:{rank_group}:{key}"
+
+    async def claim_build(self, rank_group: str) -> bool:
+        """
+        Whether this replica should build the shared index of a rank group.
+        Only the first replica to start after Redis lost the index does.
+        """
+        return bool(await self.redis.set(f"rank:{rank_group}:built", 1, nx=True))
+
+    async def release_build(self, rank_group: str) -> None:
+        await self.redis.delete(f"rank:{rank_group}:built")
+
+    async def rebuild(self, rank_group: str, entries: List[dict]) -> None:
+        if not entries:
+            return
+        # Added in place and only for members not indexed yet, so writes the
+        # other replicas make while the entries are read are kept
+        pipe = self.redis.pipeline(transaction=True)
+        for key in SORT_KEYS:
+            pipe.zadd(
+                self._key(rank_group, key),
+                {e["discord_id"]: -e.get(key, 0) for e in entries},
+                nx=True,
+            )
+        await pipe.execute()
+
+    async def update(self, rank_group: str, entries: Iterable[dict]) -> None:
+        entries = list(entries)
+        if not entries:
+            return
+        pipe = self.redis.pipeline(transaction=True)
+        for key in SORT_KEYS:
+            pipe.zadd(
+                self._key(rank_group, key),
+                {e["discord_id"]: -e.get(key, 0) for e in entries},
+            )
+        await pipe.execute()
+
+    async def remove(self, rank_group: str, discord_ids: Iterable[str]) -> None:
+        discord_ids = list(discord_ids)
+        if not discord_ids:
+            return
+        pipe = self.redis.pipeline(transaction=True)
+        for key in SORT_KEYS:
+            pipe.zrem(self._key(rank_group, key), *discord_ids)
+        await pipe.execute()
+
+    async def rank_of(
+        self, rank_group: str, discord_id: str, key: str = "points"
+    ) -> Optional[int]:
+        return await self.redis.zrank(self._key(rank_group, key), discord_id)
+
+    async def ranks_of(
+        self, rank_group: str, discord_ids: Iterable[str], key: str = "points"
+    ) -> List[int]:
+        discord_ids = list(discord_ids)
+        if not discord_ids:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for discord_id in discord_ids:
+            pipe.zrank(self._key(rank_group, key), discord_id)
+        return sorted(rank for rank in await pipe.execute() if rank is not None)
+
+    async def ids_in_range(
+        self, rank_group: str, start: int, stop: int, key: str = "points"
+    ) -> List[str]:
+        if stop <= start:
+            return []
+        return await self.redis.zrange(self._key(rank_group, key), start, stop - 1)
+
+    async def count_ahead_of_score(
+        self, rank_group: str, score: float, key: str = "points"
+    ) -> int:
+        return await self.redis.zcount(self._key(rank_group, key), "-inf", f"({-score}")
+
+    async def count(self, rank_group: str, key: str = "points") -> int:
+        return await self.redis.zcard(self._key(rank_group, key))
+
+
+_rank_index = None
+
+
+async def get_rank_index():
+    """Get the rank index, preferring the shared Redis backend."""
+    global _rank_index
+    if _rank_index is None:
+        redis = await get_redis_client()
+        if redis is not None:
+            _rank_index = RedisRankIndex(redis)
+            logger.info("Using Redis rank index")
+        else:
+            _rank_index = MemoryRankIndex()
+            logger.info("Using in-memory rank index")
+    return _rank_index
+
+
+async def init_rank_index(db, rank_groups: Iterable[str]) -> None:
+    """
+    Build the rank index from leaderboard_entries. Called on startup. The
+    shared Redis index is built once and then kept up to date by the writes
+    of every replica, so restarting a replica does not rebuild it.
+    """
+    index = await get_rank_index()
+    projection = {"_id": 0, "discord_id": 1, **{key: 1 for key in SORT_KEYS}}
+    for rank_group in rank_groups:
+        if not await index.claim_build(rank_group):
+            logger.info(f"Rank index for {rank_group} already built")
+            continue
+        try:
+            entries = await db.leaderboard_entries.find(
+                {"rank_group": rank_group}, projection
+            ).to_list(length=None)
+            await index.rebuild(rank_group, entries)
+        except Exception:
+            await index.release_build(rank_group)
+            raise
+        logger.info(f"Rank index built for {rank_group} ({len(entries)} entries)")
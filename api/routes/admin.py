@@ -6,8 +6,11 @@ from models.admin_log import AdminLog
 from models.updates import AdminLogCreate
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional, Dict
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from rate_limit import check_rate_limit
+from sanctions import sanctions, record_sanction, lift_sanction
 
 
 class BatchCheckRequest(BaseModel):
@@ -89,6 +92,23 @@ async def count_admin_logs(
     return {"count": count}
 
 
+def _sanction_record(doc: dict) -> dict:
+    """Shape a sanction document like the admin log records the bot expects."""
+    return {
+        "target_discord_id": doc["discord_id"],
+        "reason": doc.get("reason"),
+        "duration_minutes": doc.get("duration_minutes"),
+        "timestamp": doc["created_at"],
+        "expires_at": doc.get("expires_at"),
+        "admin_discord_id": doc.get("admin_discord_id"),
+    }
+
+
+def _active_timeouts_query() -> dict:
+    # The TTL monitor runs about once a minute, so filter out stragglers
+    return {"type": "timeout", "expires_at": {"$gt": datetime.now(timezone.utc)}}
+
+
 @router.get("/bans", response_model=List[dict])
 async def get_banned_players(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
@@ -103,28 +123,18 @@ async def get_banned_players(
     Returns ban records sorted by timestamp (newest first).
     """
     cursor = (
-        db.admin_logs.find(
-            {"action": "ban", "target_discord_id": {"$exists": True}},
-            {
-                "target_discord_id": 1,
-                "reason": 1,
-                "timestamp": 1,
-                "admin_discord_id": 1,
-            },
-        )
-        .sort("timestamp", -1)
+        db.sanctions.find({"type": "ban"})
+        .sort("created_at", -1)
         .skip(skip)
         .limit(limit)
     )
-    return [doc async for doc in cursor]
+    return [_sanction_record(doc) async for doc in cursor]
 
 
 @router.get("/bans/count")
 async def count_banned_players(db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get total count of banned players."""
-    count = await db.admin_logs.count_documents(
-        {"action": "ban", "target_discord_id": {"$exists": True}}
-    )
+    count = await db.sanctions.count_documents({"type": "ban"})
     return {"count": count}
 
 
@@ -137,103 +147,49 @@ async def get_timeout_players(
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     """
-    Get list of timed-out players with pagination.
+    Get list of active timeouts with pagination.
 
     Returns timeout records sorted by timestamp (newest first).
     """
     cursor = (
-        db.admin_logs.find(
-            {"action": "timeout", "target_discord_id": {"$exists": True}},
-            {
-                "target_discord_id": 1,
-                "reason": 1,
-                "duration_minutes": 1,
-                "timestamp": 1,
-                "admin_discord_id": 1,
-            },
-        )
-        .sort("timestamp", -1)
+        db.sanctions.find(_active_timeouts_query())
+        .sort("created_at", -1)
         .skip(skip)
         .limit(limit)
     )
-    return [doc async for doc in cursor]
+    return [_sanction_record(doc) async for doc in cursor]
 
 
 @router.get("/timeouts/count")
 async def count_timeout_players(db: AsyncIOMotorDatabase = Depends(get_db)):
-    """Get total count of timed-out players."""
-    count = await db.admin_logs.count_documents(
-        {"action": "timeout", "target_discord_id": {"$exists": True}}
-    )
+    """Get total count of active timeouts."""
+    count = await db.sanctions.count_documents(_active_timeouts_query())
     return {"count": count}
 
 
 @router.get("/check-ban/{discord_id}", response_model=bool)
-async def is_player_banned(discord_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def is_player_banned(discord_id: str):
     """Check if a player is currently banned."""
-    doc = await db.admin_logs.find_one(
-        {"action": "ban", "target_discord_id": discord_id}
-    )
-    return bool(doc)
+    return sanctions.is_banned(discord_id)
 
 
 @router.get("/check-timeout/{discord_id}", response_model=bool)
-async def is_player_timeout(
-    discord_id: str, db: AsyncIOMotorDatabase = Depends(get_db)
-):
-    """
-    Check if a player is currently in timeout.
-
-    Checks only the latest timeout log.
-    """
-    # Find latest timeout
-    timeout = await db.admin_logs.find_one(
-        {"action": "timeout", "target_discord_id": discord_id}, sort=[("timestamp", -1)]
-    )
-
-    if not timeout:
-        return False
-
-    timeout_time = timeout["timestamp"]
-    if timeout_time.tzinfo is None:
-        timeout_time = timeout_time.replace(tzinfo=timezone.utc)
-    duration = timeout["duration_minutes"]
-    current_time = datetime.now(timezone.utc)
-
-    time_diff = (current_time - timeout_time).total_seconds() / 60.0
-
-    # Return True if active (time_diff < duration)
-    return time_diff < duration
+async def is_player_timeout(discord_id: str):
+    """Check if a player is currently in timeout."""
+    return sanctions.is_timed_out(discord_id)
 
 
 @router.get("/check-timeout/{discord_id}/remaining")
-async def get_timeout_remaining(
-    discord_id: str, db: AsyncIOMotorDatabase = Depends(get_db)
-):
+async def get_timeout_remaining(discord_id: str):
     """Get remaining timeout duration for a player in minutes."""
-    # Find latest timeout
-    timeout = await db.admin_logs.find_one(
-        {"action": "timeout", "target_discord_id": discord_id}, sort=[("timestamp", -1)]
-    )
-
+    timeout = sanctions.get_timeout(discord_id)
     if not timeout:
         return {"is_timeout": False, "remaining_minutes": 0}
 
-    timeout_time = timeout["timestamp"]
-    if timeout_time.tzinfo is None:
-        timeout_time = timeout_time.replace(tzinfo=timezone.utc)
-    duration = timeout["duration_minutes"]
-    current_time = datetime.now(timezone.utc)
-
-    time_diff = (current_time - timeout_time).total_seconds() / 60.0
-    remaining = duration - time_diff
-
-    if remaining <= 0:
-        return {"is_timeout": False, "remaining_minutes": 0}
-
+    remaining = sanctions.timeout_remaining(discord_id)
     return {
         "is_timeout": True,
-        "remaining_minutes": round(remaining, 1),
+        "remaining_minutes": round(remaining.total_seconds() / 60.0, 1),
         "reason": timeout.get("reason"),
     }
 
@@ -245,7 +201,24 @@ async def get_timeout_remaining(
 async def remove_admin_log(
     action: str, target_discord_id: str, db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Remove an admin log entry. Bot only."""
+    """
+    Remove an admin log entry. Bot only.
+
+    For bans and timeouts this lifts the active sanction; the audit trail in
+    admin_logs is kept.
+    """
+    if action in ("ban", "timeout"):
+        result = await db.sanctions.delete_one(
+            {"discord_id": target_discord_id, "type": action}
+        )
+        await lift_sanction(target_discord_id, action)
+        if result.deleted_count == 0:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No active {action} found for player '{target_discord_id}'.",
+            )
+        return {"message": "Admin log removed successfully"}
+
     result = await db.admin_logs.delete_one(
         {"action": action, "target_discord_id": target_discord_id}
     )
@@ -275,19 +248,28 @@ async def ban_player(
             status_code=400, detail="target_discord_id is required to ban a player"
         )
 
-    # Check if already banned
-    existing = await db.admin_logs.find_one(
-        {"action": "ban", "target_discord_id": log.target_discord_id}
-    )
-    if existing:
+    now = datetime.now(timezone.utc)
+    sanction = {
+        "discord_id": log.target_discord_id,
+        "type": "ban",
+        "reason": log.reason,
+        "admin_discord_id": log.admin_discord_id,
+        "created_at": now,
+        "expires_at": None,
+    }
+    try:
+        result = await db.sanctions.insert_one(sanction)
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=409,
             detail=f"Player '{log.target_discord_id}' is already banned",
         )
+    await record_sanction(sanction)
 
     log_dict = log.model_dump()
-    log_dict["timestamp"] = datetime.now(timezone.utc)
+    log_dict["timestamp"] = now
     log_dict["action"] = "ban"
+    log_dict["sanction_id"] = result.inserted_id
     await db.admin_logs.insert_one(log_dict)
     return AdminLog(**log_dict)
 
@@ -316,14 +298,28 @@ async def timeout_player(
             detail="duration_minutes is required for timeout (how long the timeout should last)",
         )
 
-    # Remove existing timeout if any
-    await db.admin_logs.delete_one(
-        {"action": "timeout", "target_discord_id": log.target_discord_id}
+    # A new timeout replaces any active one
+    now = datetime.now(timezone.utc)
+    sanction = await db.sanctions.find_one_and_update(
+        {"discord_id": log.target_discord_id, "type": "timeout"},
+        {
+            "$set": {
+                "reason": log.reason,
+                "admin_discord_id": log.admin_discord_id,
+                "duration_minutes": log.duration_minutes,
+                "created_at": now,
+                "expires_at": now + timedelta(minutes=log.duration_minutes),
+            }
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
     )
+    await record_sanction(sanction)
 
     log_dict = log.model_dump()
-    log_dict["timestamp"] = datetime.now(timezone.utc)
+    log_dict["timestamp"] = now
     log_dict["action"] = "timeout"
+    log_dict["sanction_id"] = sanction["_id"]
     await db.admin_logs.insert_one(log_dict)
     return AdminLog(**log_dict)
 
@@ -339,7 +335,7 @@ async def unban_player(
     """
     Unban a player. Bot only.
 
-    Removes the ban record and creates an unban log entry.
+    Lifts the ban sanction and creates an unban log entry.
     """
     if not log.target_discord_id:
         raise HTTPException(
@@ -347,9 +343,10 @@ async def unban_player(
         )
 
     # Remove the ban
-    result = await db.admin_logs.delete_one(
-        {"action": "ban", "target_discord_id": log.target_discord_id}
+    result = await db.sanctions.delete_one(
+        {"discord_id": log.target_discord_id, "type": "ban"}
     )
+    await lift_sanction(log.target_discord_id, "ban")
     if result.deleted_count == 0:
         raise HTTPException(
             status_code=404,
@@ -369,53 +366,19 @@ async def unban_player(
     response_model=BatchCheckResponse,
     dependencies=[Depends(require_bot_token)],
 )
-async def batch_check_players(
-    request: BatchCheckRequest, db: AsyncIOMotorDatabase = Depends(get_db)
-):
+async def batch_check_players(request: BatchCheckRequest):
     """
     Batch check bans and timeouts for multiple players. Bot only.
 
-    Returns dictionaries mapping discord_id to boolean status.
+    Returns dictionaries mapping discord_id to boolean status. Served from the
+    in-memory sanction set.
     """
-    bans: Dict[str, bool] = {}
-    timeouts: Dict[str, bool] = {}
-
-    # Fetch all bans in one query
-    if request.discord_ids:
-        ban_docs = await db.admin_logs.find(
-            {"action": "ban", "target_discord_id": {"$in": request.discord_ids}}
-        ).to_list(length=len(request.discord_ids))
-        banned_ids = {doc["target_discord_id"] for doc in ban_docs}
-        bans = {
-            discord_id: discord_id in banned_ids for discord_id in request.discord_ids
-        }
-
-        # Fetch all timeouts in one query
-        timeout_docs = (
-            await db.admin_logs.find(
-                {"action": "timeout", "target_discord_id": {"$in": request.discord_ids}}
-            )
-            .sort("timestamp", -1)
-            .to_list(length=len(request.discord_ids) * 2)
-        )
-
-        current_time = datetime.now(timezone.utc)
-
-        for discord_id in request.discord_ids:
-            latest_timeout = None
-            for doc in timeout_docs:
-                if doc["target_discord_id"] == discord_id:
-                    latest_timeout = doc
-                    break
-
-            if latest_timeout:
-                timeout_time = latest_timeout["timestamp"]
-                if timeout_time.tzinfo is None:
-                    timeout_time = timeout_time.replace(tzinfo=timezone.utc)
-                duration = latest_timeout["duration_minutes"]
-                time_diff = (current_time - timeout_time).total_seconds() / 60.0
-                timeouts[discord_id] = time_diff < duration
-            else:
-                timeouts[discord_id] = False
-
+    bans = {
+        discord_id: sanctions.is_banned(discord_id)
+        for discord_id in request.discord_ids
+    }
+    timeouts = {
+        discord_id: sanctions.is_timed_out(discord_id)
+        for discord_id in request.discord_ids
+    }
     return BatchCheckResponse(bans=bans, timeouts=timeouts)
@@ -0,0 +1,81 @@
+"""
+Registry of the messages the bot owns in each guild (queue panels, the
+leaderboard, rank and stats buttons, match history cards), keyed by (guild,
+role). The bot reads it on startup to fetch its messages directly instead of
+scanning channels.
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from auth import require_bot_token
+from db import get_db
+from models.bot_message import BotMessage
+from models.updates import BotMessageUpdate
+
+router = APIRouter(prefix="/bot-messages", tags=["bot-messages"])
+
+
+@router.get(
+    "/{guild_id}",
+    response_model=List[BotMessage],
+    dependencies=[Depends(require_bot_token)],
+)
+async def list_bot_messages(guild_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+    cursor = db.bot_messages.find({"guild_id": guild_id}, {"_id": 0})
+    return [BotMessage(**doc) async for doc in cursor]
+
+
+@router.put(
+    "/{guild_id}/{role}",
+    response_model=BotMessage,
+    dependencies=[Depends(require_bot_token)],
+)
+async def set_bot_message(
+    guild_id: str,
+    role: str,
+    update: BotMessageUpdate,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    doc = await db.bot_messages.find_one_and_update(
+        {"guild_id": guild_id, "role": role},
+        {
+            "$set": {
+                "channel_id": update.channel_id,
+                "message_id": update.message_id,
+                "digest": update.digest,
+                "updated_at": datetime.now(timezone.utc),
+            }
+        },
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return BotMessage(**doc)
+
+
+@router.delete("/{guild_id}", dependencies=[Depends(require_bot_token)])
+async def delete_bot_messages(
+    guild_id: str,
+    prefix: str = Query(..., min_length=1, description="Role prefix to delete"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    result = await db.bot_messages.delete_many(
+        {"guild_id": guild_id, "role": {"$regex": f"^{re.escape(prefix)}"}}
+    )
+    return {"deleted_count": result.deleted_count}
+
+
+@router.delete("/{guild_id}/{role}", dependencies=[Depends(require_bot_token)])
+async def delete_bot_message(
+    guild_id: str, role: str, db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    result = await db.bot_messages.delete_one({"guild_id": guild_id, "role": role})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Bot message not found")
+    return {"deleted": True}
@@ -1,11 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import BaseModel
 from db import get_db
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import List, Optional
 from models.match import Match
 
 router = APIRouter(prefix="/history", tags=["history"]) 
 
+
+class MatchPage(BaseModel):
+    """A page of finished matches, oldest first, and the cursor of the next page."""
+
+    matches: List[Match]
+    next_cursor: Optional[str] = None
+
 @router.get("/matches", response_model=List[Match])
 async def get_recent_matches(limit: int = Query(10, ge=1, le=100), db: AsyncIOMotorDatabase = Depends(get_db)):
     cursor = db.matches.find({"result": {"$ne": "cancelled"}}).sort("created_at", -1).limit(limit)
@@ -16,6 +26,22 @@ async def get_all_matches(limit: int = Query(10, ge=1, le=100), db: AsyncIOMotor
     cursor = db.matches.find().sort("created_at", -1).limit(limit)
     return [Match(**doc) async for doc in cursor]
 
+@router.get("/matches/pages", response_model=MatchPage)
+async def get_matches_page(
+    after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    query = {"result": {"$in": ["red", "blue"]}}
+    if after:
+        try:
+            query["_id"] = {"$gt": ObjectId(after)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    docs = await db.matches.find(query).sort("_id", 1).limit(limit).to_list(length=limit)
+    next_cursor = str(docs[-1]["_id"]) if len(docs) == limit else None
+    return MatchPage(matches=[Match(**doc) for doc in docs], next_cursor=next_cursor)
+
 @router.get("/matches/player/{discord_id}", response_model=List[Match])
 async def get_player_matches(
     discord_id: str, 
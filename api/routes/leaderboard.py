@@ -2,18 +2,402 @@ from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
 from db import get_db
 from auth import require_bot_token, get_request_origin
 from models.leaderboard import Leaderboard, LeaderboardEntry
+from models.updates import VALID_RANK_GROUPS, LeaderboardDeltaBatch
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List, Literal, Optional
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import Collection, List, Literal, Optional
+from bisect import bisect_left
+from datetime import datetime, timezone
 from events.broadcast import broadcast_leaderboard_update
+from rank_index import get_rank_index
+from sanctions import sanctions
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
+VALID_SORT_FIELDS = {"points", "winrate", "matches_played", "streak"}
+
+# Number of entries included in leaderboard_update broadcasts
+BROADCAST_TOP_N = 50
+
+# Starting points of a player's first leaderboard entry
+DEFAULT_POINTS = 1000
+
+# Settlement markers kept per entry and player, see ledger_filter
+LEDGER_MARKERS = 50
+
+_STREAK = {"$ifNull": ["$streak", 0]}
+STREAK_TRANSITIONS = {
+    "win": {"$add": [{"$max": [0, _STREAK]}, 1]},
+    "loss": {"$subtract": [{"$min": [0, _STREAK]}, 1]},
+    "undo_win": {"$max": [0, {"$subtract": [_STREAK, 1]}]},
+    "undo_loss": {"$min": [0, {"$add": [_STREAK, 1]}]},
+}
+
+
+def _require_rank_group(rank_group: str) -> None:
+    if rank_group not in VALID_RANK_GROUPS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Leaderboard for rank group '{rank_group}' was not found.",
+        )
+
+
+def _sort_spec(sort_by: str, sort_order: str) -> list:
+    """
+    Build a sort specification that is fully covered by the
+    (rank_group, <field> desc, discord_id asc) compound indexes.
+    Ascending order walks the same index backwards.
+    """
+    if sort_by not in VALID_SORT_FIELDS:
+        sort_by = "points"
+    if sort_order == "desc":
+        return [(sort_by, DESCENDING), ("discord_id", ASCENDING)]
+    return [(sort_by, ASCENDING), ("discord_id", DESCENDING)]
+
+
+async def find_leaderboard_entries(
+    db: AsyncIOMotorDatabase,
+    rank_group: str,
+    sort_by: str = "points",
+    sort_order: str = "desc",
+    skip: int = 0,
+    limit: int = 0,
+    exclude: Optional[Collection[str]] = None,
+) -> List[LeaderboardEntry]:
+    """
+    Fetch entries of a rank group using an indexed sort/skip/limit. Banned
+    players are left out unless `exclude` names the players to leave out.
+    """
+    if exclude is None:
+        exclude = sanctions.banned_ids()
+    query = {"rank_group": rank_group}
+    if exclude:
+        query["discord_id"] = {"$nin": list(exclude)}
+    cursor = (
+        db.leaderboard_entries.find(query, {"_id": 0})
+        .sort(_sort_spec(sort_by, sort_order))
+        .skip(skip)
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+    return [LeaderboardEntry(**doc) async for doc in cursor]
+
+
+async def upsert_leaderboard_entries(
+    db: AsyncIOMotorDatabase, rank_group: str, entries: List[LeaderboardEntry]
+) -> None:
+    """Write entries as one document per (rank_group, discord_id)."""
+    if not entries:
+        return
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            {"rank_group": rank_group, "discord_id": entry.discord_id},
+            {
+                "$set": {
+                    **entry.model_dump(),
+                    "rank_group": rank_group,
+                    "last_updated": now,
+                }
+            },
+            upsert=True,
+        )
+        for entry in entries
+    ]
+    await db.leaderboard_entries.bulk_write(operations, ordered=False)
+    await index_leaderboard_entries(rank_group, entries)
+
+
+def _streak_expression(delta):
+    if delta.streak == "restore" and delta.streak_before is not None:
+        # Exact undo: restore the previous streak unless it has moved on since
+        return {
+            "$cond": [
+                {"$eq": [_STREAK, delta.streak_after]},
+                delta.streak_before,
+                _STREAK,
+            ]
+        }
+    return STREAK_TRANSITIONS.get(delta.streak, _STREAK)
+
+
+def _delta_pipeline(delta, rank: str, now: datetime) -> list:
+    """Build an update pipeline applying one delta; missing fields start at defaults."""
+    return [
+        {
+            "$set": {
+                "points": {
+                    "$max": [
+                        0,
+                        {
+                            "$add": [
+                                {"$ifNull": ["$points", DEFAULT_POINTS]},
+                                delta.points,
+                            ]
+                        },
+                    ]
+                },
+                "matches_played": {
+                    "$max": [
+                        0,
+                        {
+                            "$add": [
+                                {"$ifNull": ["$matches_played", 0]},
+                                delta.matches_played,
+                            ]
+                        },
+                    ]
+                },
+                "wins": {
+                    "$max": [0, {"$add": [{"$ifNull": ["$wins", 0]}, delta.wins]}]
+                },
+                "streak": _streak_expression(delta),
+                "rank": (
+                    {"$literal": delta.rank}
+                    if delta.rank
+                    else {"$ifNull": ["$rank", {"$literal": rank}]}
+                ),
+                "last_updated": now,
+            }
+        },
+        {
+            "$set": {
+                "wins": {"$min": ["$wins", "$matches_played"]},
+                "winrate": {
+                    "$cond": [
+                        {"$gt": ["$matches_played", 0]},
+                        {
+                            "$multiply": [
+                                {
+                                    "$divide": [
+                                        {"$min": ["$wins", "$matches_played"]},
+                                        "$matches_played",
+                                    ]
+                                },
+                                100,
+                            ]
+                        },
+                        0.0,
+                    ]
+                },
+            }
+        },
+    ]
+
+
+def ledger_filter(marker: str, requires: Optional[str] = None) -> dict:
+    """Filter matching documents not yet marked with `marker`."""
+    condition = {"$nin": [marker]}
+    if requires:
+        condition["$all"] = [requires]
+    return {"ledger": condition}
+
+
+def ledger_stage(marker: str) -> dict:
+    """Pipeline stage recording `marker` among the document's last markers."""
+    return {
+        "$set": {
+            "ledger": {
+                "$slice": [
+                    {"$concatArrays": [{"$ifNull": ["$ledger", []]}, [marker]]},
+                    -LEDGER_MARKERS,
+                ]
+            }
+        }
+    }
+
+
+async def apply_leaderboard_deltas(
+    db: AsyncIOMotorDatabase,
+    rank_group: str,
+    deltas: list,
+    session=None,
+    marker: Optional[str] = None,
+    requires: Optional[str] = None,
+) -> List[LeaderboardEntry]:
+    """
+    Apply per-player increments in a single bulk_write.
+
+    Each delta is an atomic pipeline update on one entry document, so
+    concurrent writers never overwrite each other's changes. Players without
+    an entry get one starting at DEFAULT_POINTS. Returns the touched entries;
+    callers push them into the rank index via index_leaderboard_entries.
+
+    With `marker`, entries already marked with it are skipped and the others
+    are marked, so retrying a partly applied batch never applies it twice.
+    With `requires`, only entries marked with that are changed and no entry
+    is created.
+    """
+    if not deltas:
+        return []
+
+    discord_ids = [delta.discord_id for delta in deltas]
+    ranks = {
+        doc["discord_id"]: doc.get("rank") or "Unranked"
+        async for doc in db.players.find(
+            {"discord_id": {"$in": discord_ids}},
+            {"_id": 0, "discord_id": 1, "rank": 1},
+            session=session,
+        )
+    }
+
+    now = datetime.now(timezone.utc)
+    guard = ledger_filter(marker, requires) if marker else {}
+    stages = [ledger_stage(marker)] if marker else []
+    operations = [
+        UpdateOne(
+            {"rank_group": rank_group, "discord_id": delta.discord_id, **guard},
+            _delta_pipeline(delta, ranks.get(delta.discord_id, "Unranked"), now)
+            + stages,
+            upsert=not requires,
+        )
+        for delta in deltas
+    ]
+    try:
+        await db.leaderboard_entries.bulk_write(
+            operations, ordered=False, session=session
+        )
+    except BulkWriteError as e:
+        # An entry already marked fails the guard and its upsert then hits
+        # the unique index: that delta was applied before
+        if not marker or any(
+            error.get("code") != 11000 for error in e.details["writeErrors"]
+        ):
+            raise
+
+    cursor = db.leaderboard_entries.find(
+        {"rank_group": rank_group, "discord_id": {"$in": discord_ids}},
+        {"_id": 0},
+        session=session,
+    )
+    return [LeaderboardEntry(**doc) async for doc in cursor]
+
+
+async def index_leaderboard_entries(
+    rank_group: str, entries: List[LeaderboardEntry]
+) -> None:
+    """Push written entries into the rank index (after any transaction commits)."""
+    index = await get_rank_index()
+    await index.update(rank_group, [entry.model_dump() for entry in entries])
+
+
+async def _ranked_ids(
+    index,
+    rank_group: str,
+    start: int,
+    stop: int,
+    sort_by: str,
+    banned: Collection[str],
+    banned_ranks: List[int],
+) -> List[str]:
+    """
+    IDs at positions [start, stop) of the ranking without banned players.
+
+    `banned_ranks` are the sorted index positions of the banned players, so
+    the matching index range is found by shifting past each one.
+    """
+    if stop <= start:
+        return []
+    index_start = start
+    for rank in banned_ranks:
+        if rank > index_start:
+            break
+        index_start += 1
+    index_stop = index_start + stop - start
+    for rank in banned_ranks[bisect_left(banned_ranks, index_start) :]:
+        if rank >= index_stop:
+            break
+        index_stop += 1
+    ids = await index.ids_in_range(rank_group, index_start, index_stop, sort_by)
+    return [discord_id for discord_id in ids if discord_id not in banned]
+
+
+async def find_ranked_entries(
+    db: AsyncIOMotorDatabase,
+    rank_group: str,
+    sort_by: str = "points",
+    sort_order: str = "desc",
+    skip: int = 0,
+    limit: int = 10,
+) -> List[LeaderboardEntry]:
+    """
+    Fetch a page of entries by rank position using the rank index. Banned
+    players are left out of the ranking.
+
+    Falls back to an indexed Mongo skip/limit when the rank index does not
+    cover every requested row (e.g. right after a restart of Redis).
+    """
+    if sort_by not in VALID_SORT_FIELDS:
+        sort_by = "points"
+
+    index = await get_rank_index()
+    banned = set(sanctions.banned_ids())
+    banned_ranks = await index.ranks_of(rank_group, banned, sort_by)
+    if sort_order == "desc":
+        ids = await _ranked_ids(
+            index, rank_group, skip, skip + limit, sort_by, banned, banned_ranks
+        )
+    else:
+        # Ascending order is the exact reverse of the descending ranking
+        total = await index.count(rank_group, sort_by) - len(banned_ranks)
+        stop = max(total - skip, 0)
+        start = max(stop - limit, 0)
+        ids = await _ranked_ids(
+            index, rank_group, start, stop, sort_by, banned, banned_ranks
+        )
+        ids.reverse()
+
+    if ids:
+        cursor = db.leaderboard_entries.find(
+            {"rank_group": rank_group, "discord_id": {"$in": ids}}, {"_id": 0}
+        )
+        docs = {doc["discord_id"]: doc async for doc in cursor}
+        if len(docs) == len(ids):
+            return [LeaderboardEntry(**docs[discord_id]) for discord_id in ids]
+
+    return await find_leaderboard_entries(
+        db, rank_group, sort_by, sort_order, skip=skip, limit=limit, exclude=banned
+    )
+
+
+async def broadcast_top_players(
+    db: AsyncIOMotorDatabase, rank_group: str, origin: str
+) -> None:
+    """Broadcast the current top entries of a rank group."""
+    top_entries = await find_leaderboard_entries(db, rank_group, limit=BROADCAST_TOP_N)
+    await broadcast_leaderboard_update(
+        rank_group=rank_group,
+        top_players=[p.model_dump() for p in top_entries],
+        origin=origin,
+    )
+
+
+async def _last_updated(db: AsyncIOMotorDatabase, rank_group: str) -> datetime:
+    doc = await db.leaderboard_entries.find_one(
+        {"rank_group": rank_group},
+        {"last_updated": 1},
+        sort=[("last_updated", DESCENDING)],
+    )
+    if doc and doc.get("last_updated"):
+        return doc["last_updated"]
+    return datetime.now(timezone.utc)
+
 
 @router.get("/", response_model=List[Leaderboard])
 async def list_leaderboards(db: AsyncIOMotorDatabase = Depends(get_db)):
     """List all leaderboards."""
-    cursor = db.leaderboards.find()
-    return [Leaderboard(**doc) async for doc in cursor]
+    leaderboards = []
+    for rank_group in VALID_RANK_GROUPS:
+        players = await find_leaderboard_entries(db, rank_group)
+        leaderboards.append(
+            Leaderboard(
+                rank_group=rank_group,
+                players=players,
+                last_updated=await _last_updated(db, rank_group),
+            )
+        )
+    return leaderboards
 
 
 @router.get("/{rank_group}", response_model=Leaderboard)
@@ -32,27 +416,15 @@ async def get_leaderboard(
     - **sort_by**: Field to sort by (default: points)
     - **sort_order**: asc or desc (default: desc)
     """
-    doc = await db.leaderboards.find_one({"rank_group": rank_group})
-    if not doc:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Leaderboard for rank group '{rank_group}' was not found. It may not have been initialized yet.",
-        )
+    _require_rank_group(rank_group)
 
-    leaderboard = Leaderboard(**doc)
-
-    # Server-side sorting
-    valid_sort_fields = {"points", "winrate", "matches_played", "streak"}
-    if sort_by not in valid_sort_fields:
-        sort_by = "points"
-
-    reverse = sort_order == "desc"
-    leaderboard.players = sorted(
-        leaderboard.players, key=lambda x: getattr(x, sort_by, 0), reverse=reverse
+    players = await find_leaderboard_entries(db, rank_group, sort_by, sort_order)
+    return Leaderboard(
+        rank_group=rank_group,
+        players=players,
+        last_updated=await _last_updated(db, rank_group),
     )
 
-    return leaderboard
-
 
 @router.get("/{rank_group}/top", response_model=List[LeaderboardEntry])
 async def get_top_players(
@@ -68,75 +440,113 @@ async def get_top_players(
     """
     Get top players from a leaderboard with pagination.
 
-    This endpoint returns only the player entries (not the full leaderboard),
-    making it more efficient for displaying leaderboard pages.
+    This endpoint returns only the player entries (not the full leaderboard)
+    and is served by the rank index.
     """
-    doc = await db.leaderboards.find_one({"rank_group": rank_group})
-    if not doc:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Leaderboard for rank group '{rank_group}' was not found.",
-        )
-
-    leaderboard = Leaderboard(**doc)
-
-    # Server-side sorting
-    valid_sort_fields = {"points", "winrate", "matches_played", "streak"}
-    if sort_by not in valid_sort_fields:
-        sort_by = "points"
-
-    reverse = sort_order == "desc"
-    sorted_players = sorted(
-        leaderboard.players, key=lambda x: getattr(x, sort_by, 0), reverse=reverse
+    _require_rank_group(rank_group)
+    return await find_ranked_entries(
+        db, rank_group, sort_by, sort_order, skip=skip, limit=limit
     )
 
-    # Pagination
-    return sorted_players[skip : skip + limit]
-
 
 @router.get("/{rank_group}/count")
 async def get_player_count(rank_group: str, db: AsyncIOMotorDatabase = Depends(get_db)):
-    """Get total number of players in a leaderboard."""
-    doc = await db.leaderboards.find_one({"rank_group": rank_group})
-    if not doc:
-        raise HTTPException(
-            status_code=404,
-            detail=f"Leaderboard for rank group '{rank_group}' was not found.",
-        )
+    """Get total number of players in a leaderboard, without banned players."""
+    _require_rank_group(rank_group)
+    count = await db.leaderboard_entries.count_documents(
+        {"rank_group": rank_group, "discord_id": {"$nin": sanctions.banned_ids()}}
+    )
+    return {"count": count}
 
-    leaderboard = Leaderboard(**doc)
-    return {"count": len(leaderboard.players)}
+
+@router.get("/{rank_group}/entries", response_model=List[LeaderboardEntry])
+async def get_entries(
+    rank_group: str,
+    discord_ids: List[str] = Query(..., description="Discord IDs to fetch"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """Get the entries of specific players (e.g. the players of one match)."""
+    _require_rank_group(rank_group)
+    cursor = db.leaderboard_entries.find(
+        {"rank_group": rank_group, "discord_id": {"$in": discord_ids}}, {"_id": 0}
+    )
+    return [LeaderboardEntry(**doc) async for doc in cursor]
 
 
 @router.get("/{rank_group}/player/{discord_id}")
 async def get_player_rank(
-    rank_group: str, discord_id: str, db: AsyncIOMotorDatabase = Depends(get_db)
+    rank_group: str,
+    discord_id: str,
+    sort_by: str = Query("points", description="Field to rank by"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
 ):
-    """Get a specific player's rank position in the leaderboard."""
-    doc = await db.leaderboards.find_one({"rank_group": rank_group})
+    """
+    Get a specific player's rank position in the leaderboard. Banned players
+    are not ranked.
+    """
+    _require_rank_group(rank_group)
+    if sort_by not in VALID_SORT_FIELDS:
+        sort_by = "points"
+
+    doc = None
+    if not sanctions.is_banned(discord_id):
+        doc = await db.leaderboard_entries.find_one(
+            {"rank_group": rank_group, "discord_id": discord_id}, {"_id": 0}
+        )
     if not doc:
         raise HTTPException(
             status_code=404,
-            detail=f"Leaderboard for rank group '{rank_group}' was not found.",
+            detail=f"Player '{discord_id}' was not found in the {rank_group} leaderboard.",
         )
 
-    leaderboard = Leaderboard(**doc)
+    player = LeaderboardEntry(**doc)
+
+    index = await get_rank_index()
+    banned = sanctions.banned_ids()
+    banned_ranks = await index.ranks_of(rank_group, banned, sort_by)
+    ahead = await index.rank_of(rank_group, discord_id, sort_by)
+    if ahead is None:
+        # Not indexed yet: count entries ahead, ties broken by discord_id
+        score = getattr(player, sort_by)
+        ahead = await db.leaderboard_entries.count_documents(
+            {
+                "rank_group": rank_group,
+                "discord_id": {"$nin": banned},
+                "$or": [
+                    {sort_by: {"$gt": score}},
+                    {sort_by: score, "discord_id": {"$lt": discord_id}},
+                ],
+            }
+        )
+        await index.update(rank_group, [doc])
+    else:
+        ahead -= bisect_left(banned_ranks, ahead)
+    total = await index.count(rank_group, sort_by) - len(banned_ranks)
 
-    # Sort by points (default ranking)
-    sorted_players = sorted(leaderboard.players, key=lambda x: x.points, reverse=True)
+    return {
+        "rank_position": ahead + 1,
+        "total_players": total,
+        "player": player,
+    }
 
-    for i, player in enumerate(sorted_players, start=1):
-        if player.discord_id == discord_id:
-            return {
-                "rank_position": i,
-                "total_players": len(sorted_players),
-                "player": player,
-            }
 
-    raise HTTPException(
-        status_code=404,
-        detail=f"Player '{discord_id}' was not found in the {rank_group} leaderboard.",
-    )
+@router.get("/{rank_group}/rank-of-score")
+async def get_rank_of_score(
+    rank_group: str,
+    score: float = Query(..., description="Score to look up"),
+    sort_by: str = Query("points", description="Field the score refers to"),
+):
+    """Get the rank position a given score would hold in the leaderboard."""
+    _require_rank_group(rank_group)
+    if sort_by not in VALID_SORT_FIELDS:
+        sort_by = "points"
+
+    index = await get_rank_index()
+    banned_ranks = await index.ranks_of(rank_group, sanctions.banned_ids(), sort_by)
+    ahead = await index.count_ahead_of_score(rank_group, score, sort_by)
+    ahead -= bisect_left(banned_ranks, ahead)
+    total = await index.count(rank_group, sort_by) - len(banned_ranks)
+    return {"rank_position": ahead + 1, "total_players": total}
 
 
 @router.put(
@@ -150,25 +560,49 @@ async def update_leaderboard(
     leaderboard: Leaderboard = Body(...),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
-    """Update or create a leaderboard. Bot only."""
-    result = await db.leaderboards.update_one(
-        {"rank_group": rank_group}, {"$set": leaderboard.dict()}, upsert=True
-    )
-    doc = await db.leaderboards.find_one({"rank_group": rank_group})
-    updated_leaderboard = Leaderboard(**doc)
+    """
+    Upsert leaderboard entries. Bot only.
 
-    origin = get_request_origin(request)
+    Only the entries present in the body are written; entries of other
+    players are left untouched. Returns the written entries.
+    """
+    _require_rank_group(rank_group)
 
-    # Sort by points and get top 50 for the broadcast
-    sorted_players = sorted(
-        updated_leaderboard.players, key=lambda x: x.points, reverse=True
-    )[:50]
-    top_players = [p.dict() for p in sorted_players]
+    await upsert_leaderboard_entries(db, rank_group, leaderboard.players)
 
-    await broadcast_leaderboard_update(
+    origin = get_request_origin(request)
+    await broadcast_top_players(db, rank_group, origin)
+
+    return Leaderboard(
         rank_group=rank_group,
-        top_players=top_players,
-        origin=origin,
+        players=leaderboard.players,
+        last_updated=datetime.now(timezone.utc),
     )
 
-    return updated_leaderboard
+
+@router.patch(
+    "/{rank_group}/entries",
+    response_model=List[LeaderboardEntry],
+    dependencies=[Depends(require_bot_token)],
+)
+async def patch_leaderboard_entries(
+    rank_group: str,
+    request: Request,
+    batch: LeaderboardDeltaBatch = Body(...),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Apply per-player increments to leaderboard entries. Bot only.
+
+    Write cost is proportional to the number of players in the batch, not
+    the size of the leaderboard. Returns only the touched entries.
+    """
+    _require_rank_group(rank_group)
+
+    entries = await apply_leaderboard_deltas(db, rank_group, batch.entries)
+    await index_leaderboard_entries(rank_group, entries)
+
+    origin = get_request_origin(request)
+    await broadcast_top_players(db, rank_group, origin)
+
+    return entries
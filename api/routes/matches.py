@@ -1,52 +1,128 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
-from db import get_db
+from db import get_db, next_sequence, run_transaction
 from auth import require_bot_token, get_request_origin
 from models.match import Match
-from models.updates import MatchUpdate
+from models.updates import (
+    MatchCreate,
+    MatchUpdate,
+    MatchSettle,
+    LeaderboardEntryDelta,
+)
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 from events.broadcast import (
     broadcast_match_created,
     broadcast_match_updated,
     broadcast_match_result,
+    broadcast_match_settled,
+)
+from models.leaderboard import LeaderboardEntry
+from match_registry import active_matches, record_match
+from rank_index import get_rank_index
+from routes.leaderboard import (
+    BROADCAST_TOP_N,
+    DEFAULT_POINTS,
+    apply_leaderboard_deltas,
+    broadcast_top_players,
+    find_leaderboard_entries,
+    index_leaderboard_entries,
+    ledger_filter,
+    ledger_stage,
 )
 
 router = APIRouter(prefix="/matches", tags=["matches"])
 
+# How long a settle or revert holds its match (see _claim_match)
+SETTLE_LEASE_SECONDS = 60
+
+
+def calculate_mmr_points(
+    team1_avg: float, team2_avg: float, team1_won: bool, base_points: int = 25
+) -> Tuple[int, int]:
+    """
+    Points change of each team, adjusted by the difference of team averages.
+    Winners gain 20-30 points and losers lose 20-30 points.
+    """
+    mmr_diff = team1_avg - team2_avg
+
+    adjustment = int(mmr_diff / 60)
+
+    if team1_won:
+        team1_points = max(20, min(30, base_points - adjustment))
+        team2_points = max(-30, min(-20, -(base_points + adjustment)))
+    else:
+        team1_points = max(-30, min(-20, -(base_points + adjustment)))
+        team2_points = max(20, min(30, base_points - adjustment))
 
-@router.get("/next-id", dependencies=[Depends(require_bot_token)])
-async def get_next_match_id(db: AsyncIOMotorDatabase = Depends(get_db)):
-    cursor = db.matches.find({}, {"match_id": 1}).sort("_id", -1)
-    highest_num = 0
-    async for doc in cursor:
-        match_id = doc.get("match_id", "")
-        if match_id.startswith("match_"):
-            try:
-                num = int(match_id.split("_")[1])
-                highest_num = max(highest_num, num)
-            except (IndexError, ValueError):
-                continue
+    return team1_points, team2_points
 
-    next_num = highest_num + 1
-    return {"match_id": f"match_{next_num}"}
+
+def _player_result_pipeline(won: bool, count: int = 1) -> list:
+    """
+    Update pipeline counting a played match on a player document.
+    A count of -1 removes a previously counted match.
+    """
+
+    def _add(field: str, amount: int) -> dict:
+        return {"$max": [0, {"$add": [{"$ifNull": [f"${field}", 0]}, amount]}]}
+
+    return [
+        {
+            "$set": {
+                "matches_played": _add("matches_played", count),
+                "wins": _add("wins", count if won else 0),
+                "losses": _add("losses", 0 if won else count),
+            }
+        },
+        {
+            "$set": {
+                "winrate": {
+                    "$cond": [
+                        {"$gt": ["$matches_played", 0]},
+                        {"$multiply": [{"$divide": ["$wins", "$matches_played"]}, 100]},
+                        0.0,
+                    ]
+                }
+            }
+        },
+    ]
+
+
+async def allocate_match_id(session=None) -> str:
+    """Reserve the next match ID from the match_id counter."""
+    return f"match_{await next_sequence('match_id', session=session)}"
 
 
 @router.get("/active", response_model=List[Match])
-async def get_active_matches(db: AsyncIOMotorDatabase = Depends(get_db)):
-    cursor = db.matches.find({"result": None})
-    matches = [Match(**doc) async for doc in cursor]
-    return matches
+async def get_active_matches():
+    return active_matches.all()
+
+
+@router.get("/active/by-player/{discord_id}", response_model=Optional[Match])
+async def get_active_match_for_player(discord_id: str):
+    """Get the unresolved match a player is in, or null."""
+    return active_matches.match_for_player(discord_id)
 
 
 @router.post("/", response_model=Match, dependencies=[Depends(require_bot_token)])
 async def create_match(
     request: Request,
-    match: Match = Body(...),
+    create: MatchCreate = Body(...),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
-    if await db.matches.find_one({"match_id": match.match_id}):
+    """Create a match. The match ID is allocated atomically unless one is given."""
+    match = Match(
+        **create.model_dump(exclude={"match_id"}),
+        match_id=create.match_id or await allocate_match_id(),
+    )
+    try:
+        await db.matches.insert_one(match.dict())
+    except DuplicateKeyError:
         raise HTTPException(status_code=409, detail="Match already exists")
-    await db.matches.insert_one(match.dict())
+    await record_match(match)
 
     origin = get_request_origin(request)
 
@@ -71,6 +147,438 @@ async def get_match(match_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     return Match(**doc)
 
 
+def _ledger_snapshot(entry: Optional[dict]) -> dict:
+    """Values of a leaderboard entry recorded in the points ledger."""
+    entry = entry or {}
+    return {
+        "points": entry.get("points", DEFAULT_POINTS),
+        "matches_played": entry.get("matches_played", 0),
+        "wins": entry.get("wins", 0),
+        "streak": entry.get("streak", 0),
+    }
+
+
+def _ledger_after(before: dict, delta: LeaderboardEntryDelta) -> dict:
+    """The snapshot a settlement delta produces from `before`, as applied."""
+    streak = before["streak"]
+    matches_played = before["matches_played"] + delta.matches_played
+    return {
+        "points": max(0, before["points"] + delta.points),
+        "matches_played": matches_played,
+        "wins": min(before["wins"] + delta.wins, matches_played),
+        "streak": max(0, streak) + 1 if delta.streak == "win" else min(0, streak) - 1,
+    }
+
+
+def _settlement_key(match_id: str, settlement: int) -> str:
+    """Marks the entries and players changed by one settlement of a match."""
+    return f"{match_id}#{settlement}"
+
+
+async def _claim_match(
+    db: AsyncIOMotorDatabase, doc: dict, changes: dict, session
+) -> dict:
+    """
+    Claim a match for one settle or revert and apply `changes` to it.
+
+    The compare-and-set is on the match's settlement counter, which every
+    claim bumps, so two requests never both claim the same state of a match
+    (e.g. two forced re-settles with the same winner). The claim also holds
+    a lease, released by _release_match, that keeps other requests off the
+    match while its ledger is applied or undone. A request that fails part
+    way blocks the match until the lease expires; the next claim then
+    finishes the cleanup from the ledger.
+    """
+    now = datetime.now(timezone.utc)
+    claimed = await db.matches.find_one_and_update(
+        {
+            "match_id": doc["match_id"],
+            "settlement": doc.get("settlement"),
+            "$or": [{"settling_until": None}, {"settling_until": {"$lte": now}}],
+        },
+        {
+            "$set": {
+                **changes,
+                "settlement": doc.get("settlement", 0) + 1,
+                "settling_until": now + timedelta(seconds=SETTLE_LEASE_SECONDS),
+            }
+        },
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if not claimed:
+        raise HTTPException(
+            status_code=409, detail="Match is being settled, try again shortly"
+        )
+    return claimed
+
+
+async def _release_match(
+    db: AsyncIOMotorDatabase, match_id: str, settlement: int, session
+) -> None:
+    await db.matches.update_one(
+        {"match_id": match_id, "settlement": settlement},
+        {"$set": {"settling_until": None}},
+        session=session,
+    )
+
+
+async def _revert_ledger(
+    db: AsyncIOMotorDatabase, match_id: str, rank_group: str, session=None
+) -> Tuple[List[LeaderboardEntry], List[str]]:
+    """
+    Undo the points a match applied, using its active points_ledger rows.
+
+    A settlement marks every entry and player it changes with its key and
+    the undo marks them with "-<key>", so an undo retried after failing part
+    way never applies twice. Rows still pending belong to a settlement that
+    failed part way: only the entries and players it marked are undone.
+    Entries the settlement created and nothing touched since are deleted
+    again. Returns the touched entries and the discord IDs of deleted
+    entries.
+    """
+    rows = await db.points_ledger.find(
+        {"match_id": match_id, "active": True}, session=session
+    ).to_list(length=None)
+    if not rows:
+        return [], []
+
+    groups = {}
+    for row in rows:
+        # Rows recorded before settlement keys existed were applied in full
+        key = row.get("settlement") or _settlement_key(match_id, 0)
+        groups.setdefault((key, row.get("state") == "pending"), []).append(row)
+
+    touched = {}
+    for (key, pending), group in groups.items():
+        requires = key if pending else None
+        deltas = [
+            LeaderboardEntryDelta(
+                discord_id=row["discord_id"],
+                points=row["before"]["points"] - row["after"]["points"],
+                matches_played=row["before"]["matches_played"]
+                - row["after"]["matches_played"],
+                wins=row["before"]["wins"] - row["after"]["wins"],
+                streak="restore",
+                streak_before=row["before"]["streak"],
+                streak_after=row["after"]["streak"],
+            )
+            for row in group
+        ]
+        entries = await apply_leaderboard_deltas(
+            db,
+            rank_group,
+            deltas,
+            session=session,
+            marker=f"-{key}",
+            requires=requires,
+        )
+        touched.update({entry.discord_id: entry for entry in entries})
+
+        for won in (True, False):
+            discord_ids = [row["discord_id"] for row in group if row["won"] == won]
+            if discord_ids:
+                await db.players.update_many(
+                    {
+                        "discord_id": {"$in": discord_ids},
+                        **ledger_filter(f"-{key}", requires),
+                    },
+                    _player_result_pipeline(won, -1) + [ledger_stage(f"-{key}")],
+                    session=session,
+                )
+
+    await db.points_ledger.update_many(
+        {"_id": {"$in": [row["_id"] for row in rows]}},
+        {"$set": {"active": False, "reverted_at": datetime.now(timezone.utc)}},
+        session=session,
+    )
+
+    entries = list(touched.values())
+    created = {row["discord_id"] for row in rows if row.get("created")}
+    removed = [
+        entry.discord_id
+        for entry in entries
+        if entry.discord_id in created and entry.matches_played == 0
+    ]
+    if removed:
+        await db.leaderboard_entries.delete_many(
+            {"rank_group": rank_group, "discord_id": {"$in": removed}},
+            session=session,
+        )
+        entries = [entry for entry in entries if entry.discord_id not in removed]
+
+    return entries, removed
+
+
+async def _require_ledger(db: AsyncIOMotorDatabase, doc: dict, session) -> None:
+    """
+    Refuse to revert a match settled before the points ledger existed.
+
+    Those matches have a result but neither a settlement counter nor ledger
+    rows, so reverting them would leave their points applied while
+    reporting success.
+    """
+    if doc.get("result") not in ("red", "blue") or "settlement" in doc:
+        return
+    row = await db.points_ledger.find_one(
+        {"match_id": doc["match_id"], "active": True}, {"_id": 1}, session=session
+    )
+    if row is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Match has no points ledger; its settlement cannot be reverted",
+        )
+
+
+async def _sync_rank_index(
+    rank_group: str, entries: List[LeaderboardEntry], removed: List[str]
+) -> None:
+    """Push committed ledger changes into the rank index."""
+    if removed:
+        index = await get_rank_index()
+        await index.remove(rank_group, removed)
+    await index_leaderboard_entries(rank_group, entries)
+
+
+@router.post("/{match_id}/settle", dependencies=[Depends(require_bot_token)])
+async def settle_match(
+    match_id: str,
+    request: Request,
+    settle: MatchSettle = Body(...),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Settle a match in one call. Bot only.
+
+    Records the result, computes the MMR changes from the team averages and
+    updates the match, player and leaderboard documents in one transaction.
+    Every change is recorded in points_ledger before it is applied so it can
+    be reverted exactly, also when a deployment without transactions fails
+    part way. The match is claimed exclusively (see _claim_match), so two
+    racing settlements can never both apply.
+
+    With `force`, a match that already has a result is re-settled: the
+    previous settlement is reverted from the ledger first. Matches settled
+    before the ledger existed are refused with 409.
+    """
+    winner = settle.winner
+
+    async def _settle(session):
+        doc = await db.matches.find_one({"match_id": match_id}, session=session)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Match not found")
+        previous_result = doc.get("result")
+        if previous_result is not None and not settle.force:
+            raise HTTPException(
+                status_code=409, detail="Match has already been settled"
+            )
+        await _require_ledger(db, doc, session)
+
+        doc = await _claim_match(
+            db,
+            doc,
+            {
+                "red_score": settle.red_score,
+                "blue_score": settle.blue_score,
+                "result": winner,
+                "ended_at": datetime.now(timezone.utc),
+            },
+            session,
+        )
+        key = _settlement_key(match_id, doc["settlement"])
+        match = Match(**doc)
+        reverted, removed = await _revert_ledger(
+            db, match_id, match.rank_group, session=session
+        )
+
+        red_team, blue_team = match.players_red, match.players_blue
+        current = {
+            entry["discord_id"]: entry
+            async for entry in db.leaderboard_entries.find(
+                {
+                    "rank_group": match.rank_group,
+                    "discord_id": {"$in": red_team + blue_team},
+                },
+                {"_id": 0},
+                session=session,
+            )
+        }
+
+        red_avg = sum(
+            _ledger_snapshot(current.get(p))["points"] for p in red_team
+        ) / max(len(red_team), 1)
+        blue_avg = sum(
+            _ledger_snapshot(current.get(p))["points"] for p in blue_team
+        ) / max(len(blue_team), 1)
+
+        red_won = winner == "red"
+        red_change, blue_change = calculate_mmr_points(red_avg, blue_avg, red_won)
+
+        points_changes = {}
+        won_by_player = {}
+        deltas = []
+        for team, change, won in (
+            (red_team, red_change, red_won),
+            (blue_team, blue_change, not red_won),
+        ):
+            for discord_id in team:
+                points_changes[discord_id] = change
+                won_by_player[discord_id] = won
+                deltas.append(
+                    LeaderboardEntryDelta(
+                        discord_id=discord_id,
+                        points=change,
+                        matches_played=1,
+                        wins=1 if won else 0,
+                        streak="win" if won else "loss",
+                    )
+                )
+
+        now = datetime.now(timezone.utc)
+        try:
+            await db.points_ledger.insert_many(
+                [
+                    {
+                        "match_id": match_id,
+                        "rank_group": match.rank_group,
+                        "discord_id": delta.discord_id,
+                        "settlement": key,
+                        "state": "pending",
+                        "won": won_by_player[delta.discord_id],
+                        "created": delta.discord_id not in current,
+                        "before": _ledger_snapshot(current.get(delta.discord_id)),
+                        "after": _ledger_after(
+                            _ledger_snapshot(current.get(delta.discord_id)), delta
+                        ),
+                        "active": True,
+                        "settled_at": now,
+                        "reverted_at": None,
+                    }
+                    for delta in deltas
+                ],
+                session=session,
+            )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=409, detail="Match was settled concurrently"
+            )
+
+        entries = await apply_leaderboard_deltas(
+            db, match.rank_group, deltas, session=session, marker=key
+        )
+        winners, losers = (red_team, blue_team) if red_won else (blue_team, red_team)
+        for team, won in ((winners, True), (losers, False)):
+            await db.players.update_many(
+                {"discord_id": {"$in": team}, **ledger_filter(key)},
+                _player_result_pipeline(won) + [ledger_stage(key)],
+                session=session,
+            )
+
+        # Record the values actually reached, so a revert restores exactly
+        if entries:
+            await db.points_ledger.bulk_write(
+                [
+                    UpdateOne(
+                        {
+                            "match_id": match_id,
+                            "discord_id": entry.discord_id,
+                            "settlement": key,
+                        },
+                        {
+                            "$set": {
+                                "state": "applied",
+                                "after": _ledger_snapshot(entry.model_dump()),
+                            }
+                        },
+                    )
+                    for entry in entries
+                ],
+                session=session,
+            )
+        await _release_match(db, match_id, doc["settlement"], session)
+
+        touched = {entry.discord_id: entry for entry in reverted}
+        touched.update({entry.discord_id: entry for entry in entries})
+        removed = [discord_id for discord_id in removed if discord_id not in touched]
+        return match, points_changes, list(touched.values()), removed
+
+    match, points_changes, entries, removed = await run_transaction(_settle)
+    await record_match(match)
+    await _sync_rank_index(match.rank_group, entries, removed)
+
+    top_entries = await find_leaderboard_entries(
+        db, match.rank_group, limit=BROADCAST_TOP_N
+    )
+    await broadcast_match_settled(
+        match_id=match_id,
+        rank_group=match.rank_group,
+        result=winner,
+        red_score=settle.red_score,
+        blue_score=settle.blue_score,
+        points_changes=points_changes,
+        top_players=[entry.model_dump() for entry in top_entries],
+        origin=get_request_origin(request),
+    )
+
+    return {"match": match, "points_changes": points_changes, "entries": entries}
+
+
+@router.post("/{match_id}/revert", dependencies=[Depends(require_bot_token)])
+async def revert_match(
+    match_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Cancel a match and undo any points it applied. Bot only.
+
+    Uses the match's points_ledger rows, so the cost is proportional to the
+    number of players in the match. Reverting an already reverted or never
+    settled match only marks it cancelled. Matches settled before the ledger
+    existed are refused with 409.
+    """
+
+    async def _revert(session):
+        doc = await db.matches.find_one({"match_id": match_id}, session=session)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Match not found")
+        await _require_ledger(db, doc, session)
+
+        doc = await _claim_match(
+            db,
+            doc,
+            {
+                "result": "cancelled",
+                "red_score": None,
+                "blue_score": None,
+                "ended_at": datetime.now(timezone.utc),
+            },
+            session,
+        )
+        match = Match(**doc)
+        entries, removed = await _revert_ledger(
+            db, match_id, match.rank_group, session=session
+        )
+        await _release_match(db, match_id, doc["settlement"], session)
+        return match, entries, removed
+
+    match, entries, removed = await run_transaction(_revert)
+    await record_match(match)
+    await _sync_rank_index(match.rank_group, entries, removed)
+
+    origin = get_request_origin(request)
+    await broadcast_match_result(
+        match_id=match_id,
+        result="cancelled",
+        rank_group=match.rank_group,
+        origin=origin,
+    )
+    if entries or removed:
+        await broadcast_top_players(db, match.rank_group, origin)
+
+    return {"match": match, "entries": entries, "removed": removed}
+
+
 @router.patch(
     "/{match_id}", response_model=Match, dependencies=[Depends(require_bot_token)]
 )
@@ -88,6 +596,7 @@ async def update_match(
         raise HTTPException(status_code=404, detail="Match not found")
     doc = await db.matches.find_one({"match_id": match_id})
     match = Match(**doc)
+    await record_match(match)
 
     origin = get_request_origin(request)
 
@@ -1,70 +1,62 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from pydantic import Field
 from db import get_db
 from auth import require_bot_token, get_request_origin
+from models.match import Match
 from models.queue import Queue, QueueEntry
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from events.broadcast import broadcast_queue_update
+from typing import List, Optional
+from events.broadcast import broadcast_queue_update, broadcast_queue_popped
+from match_registry import active_matches, record_match
+from models.updates import VALID_RANK_GROUPS
+from queue_engine import ALREADY_QUEUED, FULL, QUEUE_SIZE, get_queue_engine
+from routes.matches import allocate_match_id
+from sanctions import sanctions
 
 router = APIRouter(prefix="/queue", tags=["queue"])
 
 
-async def is_player_banned(discord_id: str, db: AsyncIOMotorDatabase) -> bool:
-    doc = await db.admin_logs.find_one(
-        {"action": "ban", "target_discord_id": discord_id}
-    )
-    return bool(doc)
+def is_player_banned(discord_id: str) -> bool:
+    return sanctions.is_banned(discord_id)
 
 
-async def is_player_timeout(discord_id: str, db: AsyncIOMotorDatabase) -> bool:
-    from datetime import datetime, timezone
+def is_player_timeout(discord_id: str) -> bool:
+    return sanctions.is_timed_out(discord_id)
 
-    # Check only the latest timeout log
-    cursor = (
-        db.admin_logs.find({"action": "timeout", "target_discord_id": discord_id})
-        .sort("timestamp", -1)
-        .limit(1)
-    )
-    try:
-        timeout = await cursor.to_list(length=1)
-        if not timeout:
-            return False
-        timeout = timeout[0]
-    except Exception:
-        return False
-
-    timeout_time = timeout["timestamp"]
-    if timeout_time.tzinfo is None:
-        timeout_time = timeout_time.replace(tzinfo=timezone.utc)
-    duration = timeout["duration_minutes"]
-    current_time = datetime.now(timezone.utc)
-
-    time_diff = (current_time - timeout_time).total_seconds() / 60.0
-
-    # Do not delete expired timeouts, just return False
-    return time_diff < duration
-
-
-async def is_player_in_match(discord_id: str, db: AsyncIOMotorDatabase) -> bool:
-    match = await db.matches.find_one(
-        {
-            "result": None,
-            "$or": [{"players_red": discord_id}, {"players_blue": discord_id}],
-        }
-    )
-    return bool(match)
 
+def is_player_in_match(discord_id: str) -> bool:
+    return active_matches.is_player_in_match(discord_id)
 
-@router.get("/{rank_group}", response_model=Queue)
-async def get_queue(rank_group: str, db: AsyncIOMotorDatabase = Depends(get_db)):
-    doc = await db.queues.find_one({"rank_group": rank_group})
-    if not doc:
+
+def _require_rank_group(rank_group: str) -> None:
+    if rank_group not in VALID_RANK_GROUPS:
         raise HTTPException(status_code=404, detail="Queue not found")
-    return Queue(**doc)
+
+
+class QueueSnapshot(Queue):
+    """Queue plus the version it is at, matching the version of queue events."""
+
+    version: int = 0
+
+
+@router.get("/{rank_group}", response_model=QueueSnapshot)
+async def get_queue(rank_group: str):
+    _require_rank_group(rank_group)
+    engine = await get_queue_engine()
+    players, version = await engine.snapshot(rank_group)
+    return QueueSnapshot(rank_group=rank_group, players=players, version=version)
+
+
+class QueueJoinResult(QueueSnapshot):
+    """Queue after a join, plus the match created if the join filled it."""
+
+    match: Optional[Match] = None
+    matched_players: List[QueueEntry] = Field(default_factory=list)
 
 
 @router.post(
     "/{rank_group}/join",
-    response_model=Queue,
+    response_model=QueueJoinResult,
     dependencies=[Depends(require_bot_token)],
 )
 async def join_queue(
@@ -73,167 +65,174 @@ async def join_queue(
     entry: QueueEntry = Body(...),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
-    if await is_player_banned(entry.discord_id, db):
+    """
+    Join a queue. The join that fills the queue pops the first QUEUE_SIZE
+    players and creates their match in the same request.
+    """
+    _require_rank_group(rank_group)
+
+    if is_player_banned(entry.discord_id):
         raise HTTPException(
             status_code=403, detail="You are banned from the queue system"
         )
 
-    if await is_player_timeout(entry.discord_id, db):
+    if is_player_timeout(entry.discord_id):
         raise HTTPException(
             status_code=403, detail="You are in timeout and cannot join the queue"
         )
 
-    if await is_player_in_match(entry.discord_id, db):
+    if is_player_in_match(entry.discord_id):
         raise HTTPException(
             status_code=403,
             detail="You are currently in an active match and cannot join the queue",
         )
 
-    # Atomic update to prevent race conditions
-    # Uses find_one_and_update with conditions to ensure:
-    # 1. Player is not already in queue
-    # 2. Queue has less than 10 players
-    result = await db.queues.find_one_and_update(
-        {
-            "rank_group": rank_group,
-            "$expr": {
-                "$and": [
-                    {
-                        "$not": {
-                            "$in": [
-                                entry.discord_id,
-                                {
-                                    "$map": {
-                                        "input": "$players",
-                                        "as": "p",
-                                        "in": "$$p.discord_id",
-                                    }
-                                },
-                            ]
-                        }
-                    },
-                    {"$lt": [{"$size": "$players"}, 10]},
-                ]
-            },
-        },
-        {"$push": {"players": entry.dict()}},
-        return_document=True,
-        upsert=True,
-    )
+    engine = await get_queue_engine()
+    outcome, players, matched, version = await engine.join(rank_group, entry)
+    if outcome == ALREADY_QUEUED:
+        raise HTTPException(status_code=400, detail="You are already in queue")
+    if outcome == FULL:
+        raise HTTPException(
+            status_code=400, detail=f"Queue is full ({QUEUE_SIZE}/{QUEUE_SIZE} players)"
+        )
 
-    if not result:
-        # The update failed - check why
-        queue_doc = await db.queues.find_one({"rank_group": rank_group})
-        if queue_doc:
-            if any(
-                p["discord_id"] == entry.discord_id
-                for p in queue_doc.get("players", [])
-            ):
-                raise HTTPException(status_code=400, detail="You are already in queue")
-            if len(queue_doc.get("players", [])) >= 10:
-                raise HTTPException(
-                    status_code=400, detail="Queue is full (10/10 players)"
-                )
-        else:
-            # Shouldn't happen with upsert, but handle gracefully
-            raise HTTPException(status_code=500, detail="Failed to join queue")
-
-    doc = await db.queues.find_one({"rank_group": rank_group})
-    queue = Queue(**doc)
+    match = None
+    if matched:
+        try:
+            match = Match(
+                match_id=await allocate_match_id(),
+                players_red=[],
+                players_blue=[],
+                captain_red=matched[0].discord_id,
+                captain_blue=matched[1].discord_id,
+                lobby_master=matched[0].discord_id,
+                rank_group=rank_group,
+            )
+            await db.matches.insert_one(match.dict())
+        except Exception:
+            # Do not lose the popped players if the match cannot be created
+            players, version = await engine.requeue(rank_group, matched)
+            await broadcast_queue_update(
+                rank_group=rank_group,
+                action="replaced",
+                version=version,
+                snapshot=players,
+                queue_count=len(players),
+                origin=get_request_origin(request),
+            )
+            raise
+        await record_match(match)
 
     origin = get_request_origin(request)
 
-    await broadcast_queue_update(
+    if match:
+        await broadcast_queue_popped(
+            rank_group=rank_group,
+            match_id=match.match_id,
+            matched_players=[p.discord_id for p in matched],
+            captain_red=match.captain_red,
+            captain_blue=match.captain_blue,
+            version=version,
+            added=[entry],
+            queue_count=len(players),
+            origin=origin,
+            origin_id=entry.discord_id,
+        )
+    else:
+        await broadcast_queue_update(
+            rank_group=rank_group,
+            action="joined",
+            version=version,
+            discord_id=entry.discord_id,
+            added=[entry],
+            queue_count=len(players),
+            origin=origin,
+            origin_id=entry.discord_id,
+        )
+
+    return QueueJoinResult(
         rank_group=rank_group,
-        action="joined",
-        discord_id=entry.discord_id,
-        players=[p.discord_id for p in queue.players],
-        queue_count=len(queue.players),
-        origin=origin,
-        origin_id=entry.discord_id,
+        players=players,
+        version=version,
+        match=match,
+        matched_players=matched,
     )
 
-    return queue
-
 
 @router.post(
     "/{rank_group}/leave",
-    response_model=Queue,
+    response_model=QueueSnapshot,
     dependencies=[Depends(require_bot_token)],
 )
 async def leave_queue(
     rank_group: str,
     request: Request,
     entry: QueueEntry = Body(...),
-    db: AsyncIOMotorDatabase = Depends(get_db),
 ):
-    result = await db.queues.update_one(
-        {"rank_group": rank_group},
-        {"$pull": {"players": {"discord_id": entry.discord_id}}},
-    )
-    doc = await db.queues.find_one({"rank_group": rank_group})
-    queue = Queue(**doc)
-
-    origin = get_request_origin(request)
-
-    await broadcast_queue_update(
-        rank_group=rank_group,
-        action="left",
-        discord_id=entry.discord_id,
-        players=[p.discord_id for p in queue.players],
-        queue_count=len(queue.players),
-        origin=origin,
-        origin_id=entry.discord_id,
-    )
+    _require_rank_group(rank_group)
+    engine = await get_queue_engine()
+    removed, players, version = await engine.leave(rank_group, entry.discord_id)
+
+    if removed:
+        origin = get_request_origin(request)
+
+        await broadcast_queue_update(
+            rank_group=rank_group,
+            action="left",
+            version=version,
+            discord_id=entry.discord_id,
+            removed=[entry.discord_id],
+            queue_count=len(players),
+            origin=origin,
+            origin_id=entry.discord_id,
+        )
 
-    return queue
+    return QueueSnapshot(rank_group=rank_group, players=players, version=version)
 
 
 @router.put(
-    "/{rank_group}", response_model=Queue, dependencies=[Depends(require_bot_token)]
+    "/{rank_group}",
+    response_model=QueueSnapshot,
+    dependencies=[Depends(require_bot_token)],
 )
 async def update_queue(
     rank_group: str,
     request: Request,
     queue: Queue = Body(...),
-    db: AsyncIOMotorDatabase = Depends(get_db),
 ):
-    result = await db.queues.update_one(
-        {"rank_group": rank_group}, {"$set": queue.dict()}, upsert=True
-    )
-    doc = await db.queues.find_one({"rank_group": rank_group})
-    updated_queue = Queue(**doc)
+    _require_rank_group(rank_group)
+    engine = await get_queue_engine()
+    players, version = await engine.replace(rank_group, queue.players)
 
     origin = get_request_origin(request)
 
     await broadcast_queue_update(
         rank_group=rank_group,
-        action="joined",  # Generic update treated as join for full queue replacement
-        players=[p.discord_id for p in updated_queue.players],
-        queue_count=len(updated_queue.players),
+        action="replaced",
+        version=version,
+        snapshot=players,
+        queue_count=len(players),
         origin=origin,
     )
 
-    return updated_queue
+    return QueueSnapshot(rank_group=rank_group, players=players, version=version)
 
 
 @router.delete("/{rank_group}", dependencies=[Depends(require_bot_token)])
-async def clear_queue(
-    rank_group: str, request: Request, db: AsyncIOMotorDatabase = Depends(get_db)
-):
-    await db.queues.update_one(
-        {"rank_group": rank_group}, {"$set": {"players": []}}, upsert=True
-    )
-    doc = await db.queues.find_one({"rank_group": rank_group})
+async def clear_queue(rank_group: str, request: Request):
+    _require_rank_group(rank_group)
+    engine = await get_queue_engine()
+    version = await engine.clear(rank_group)
 
     origin = get_request_origin(request)
 
     await broadcast_queue_update(
         rank_group=rank_group,
         action="cleared",
-        players=[],
+        version=version,
+        snapshot=[],
         queue_count=0,
         origin=origin,
     )
 
-    return Queue(**doc)
+    return QueueSnapshot(rank_group=rank_group, version=version)
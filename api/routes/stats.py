@@ -22,15 +22,12 @@ async def get_player_stats(
     resolved_group: Optional[str] = None
     
     for g in groups:
-        doc = await db.leaderboards.find_one({"rank_group": g})
-        if not doc or "players" not in doc:
-            continue
-        for p in doc["players"]:
-            if p.get("discord_id") == discord_id:
-                lb_entry = p
-                resolved_group = g
-                break
-        if lb_entry:
+        doc = await db.leaderboard_entries.find_one(
+            {"rank_group": g, "discord_id": discord_id}
+        )
+        if doc:
+            lb_entry = doc
+            resolved_group = g
             break
 
     return {
@@ -0,0 +1,139 @@
+"""
+Active sanctions (bans and timeouts).
+
+Sanctions live in the `sanctions` collection, one document per
+(discord_id, type). Timeouts carry an `expires_at` date and are removed by a
+TTL index; bans have no expiry. The API keeps the active set in memory so
+queue eligibility and batch checks never touch the database:
+
+- every sanction write updates the in-memory set directly and is announced
+  on the event bus to the other API replicas
+- expired timeouts are evicted lazily on lookup
+- a background task reloads the set periodically to pick up writes made by
+  other API replicas and TTL deletions
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from events.bus import event_bus
+
+logger = logging.getLogger("valohub")
+
+# How often the in-memory set is reloaded from MongoDB
+REFRESH_INTERVAL_SECONDS = 60
+
+
+def _aware(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+class SanctionRegistry:
+    """In-memory set of active bans and timeouts."""
+
+    def __init__(self):
+        self._bans: Dict[str, dict] = {}
+        self._timeouts: Dict[str, dict] = {}
+
+    def load(self, sanctions) -> None:
+        """Replace the registry contents with the given sanction documents."""
+        bans, timeouts = {}, {}
+        for doc in sanctions:
+            target = bans if doc["type"] == "ban" else timeouts
+            target[doc["discord_id"]] = doc
+        self._bans, self._timeouts = bans, timeouts
+
+    def add(self, doc: dict) -> None:
+        target = self._bans if doc["type"] == "ban" else self._timeouts
+        target[doc["discord_id"]] = doc
+
+    def remove(self, discord_id: str, sanction_type: str) -> None:
+        target = self._bans if sanction_type == "ban" else self._timeouts
+        target.pop(discord_id, None)
+
+    def is_banned(self, discord_id: str) -> bool:
+        return discord_id in self._bans
+
+    def banned_ids(self) -> List[str]:
+        return list(self._bans)
+
+    def get_timeout(self, discord_id: str) -> Optional[dict]:
+        """Return the active timeout of a player, evicting it once expired."""
+        doc = self._timeouts.get(discord_id)
+        if doc and _aware(doc["expires_at"]) <= datetime.now(timezone.utc):
+            del self._timeouts[discord_id]
+            return None
+        return doc
+
+    def is_timed_out(self, discord_id: str) -> bool:
+        return self.get_timeout(discord_id) is not None
+
+    def timeout_remaining(self, discord_id: str) -> Optional[timedelta]:
+        doc = self.get_timeout(discord_id)
+        if not doc:
+            return None
+        return _aware(doc["expires_at"]) - datetime.now(timezone.utc)
+
+
+# Global registry instance
+sanctions = SanctionRegistry()
+
+
+def _announced(doc: dict) -> dict:
+    return {
+        "discord_id": doc["discord_id"],
+        "type": doc["type"],
+        "reason": doc.get("reason"),
+        "expires_at": doc["expires_at"].isoformat() if doc.get("expires_at") else None,
+    }
+
+
+async def record_sanction(doc: dict) -> None:
+    """Activate a sanction here and on the other API replicas."""
+    sanctions.add(doc)
+    await event_bus.notify("sanction", _announced(doc))
+
+
+async def lift_sanction(discord_id: str, sanction_type: str) -> None:
+    """Lift a sanction here and on the other API replicas."""
+    sanctions.remove(discord_id, sanction_type)
+    await event_bus.notify(
+        "sanction_lifted", {"discord_id": discord_id, "type": sanction_type}
+    )
+
+
+@event_bus.on_notify("sanction")
+async def _apply_remote_sanction(payload: dict) -> None:
+    if payload.get("expires_at"):
+        payload["expires_at"] = datetime.fromisoformat(payload["expires_at"])
+    sanctions.add(payload)
+
+
+@event_bus.on_notify("sanction_lifted")
+async def _apply_remote_lift(payload: dict) -> None:
+    sanctions.remove(payload["discord_id"], payload["type"])
+
+
+async def load_sanctions(db: AsyncIOMotorDatabase) -> None:
+    """Reload active sanctions from MongoDB."""
+    now = datetime.now(timezone.utc)
+    cursor = db.sanctions.find(
+        {"$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}]}
+    )
+    sanctions.load([doc async for doc in cursor])
+
+
+async def refresh_sanctions_loop(db: AsyncIOMotorDatabase) -> None:
+    """Periodically reload sanctions. Runs for the lifetime of the API."""
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+        try:
+            await load_sanctions(db)
+        except Exception as e:
+            logger.error(f"Failed to refresh sanctions: {e}")
@@ -3,138 +3,450 @@ WebSocket connection manager and endpoint for real-time updates.
 """
 
 import asyncio
+from collections import OrderedDict
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
-from typing import Dict, Optional, Set
-from datetime import datetime, timezone
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set
 from jose import JWTError, jwt
 import json
 import logging
+import time
 
+from codec import JSON, Frame, encode, negotiate, transcode
 from config import settings
 
 logger = logging.getLogger("valohub")
 
-MAX_WS_CONNECTIONS = 100
+# Connections per replica, and connection attempts handled at once; more
+# are refused with 1013 (try again later)
+MAX_WS_CONNECTIONS = settings.ws_max_connections
+MAX_WS_HANDSHAKES = settings.ws_max_handshakes
 
 PING_INTERVAL_SECONDS = 30
 PONG_TIMEOUT_SECONDS = 90  # 3 missed pings
 
 
+# Topics clients can subscribe to, by prefix:
+#   queue:<rank_group>, matches:<rank_group>, leaderboard:<rank_group>,
+#   match:<match_id>, player:<discord_id>
+TOPIC_PREFIXES = ("queue:", "matches:", "match:", "leaderboard:", "player:")
+MAX_TOPICS_PER_CONNECTION = 50
+
+# Frames waiting to be written per connection before it counts as a slow
+# consumer and is closed. The bot gets more room since it must see
+# every event.
+MAX_PENDING_FRAMES = 256
+MAX_PENDING_FRAMES_BOT = 4096
+SLOW_CONSUMER_CLOSE_CODE = status.WS_1013_TRY_AGAIN_LATER
+
+# Events that carry full state; a pending one is replaced by a newer one
+# for the same key instead of queueing both. Queue updates are deltas and
+# must all be delivered.
+COALESCED_EVENTS = {
+    "leaderboard_update": "rank_group",
+}
+
+
+def is_valid_topic(topic: str) -> bool:
+    return (
+        isinstance(topic, str)
+        and topic.startswith(TOPIC_PREFIXES)
+        and len(topic) <= 100
+        and topic.split(":", 1)[1] != ""
+    )
+
+
+def coalesce_key(event: dict) -> Optional[tuple]:
+    field = COALESCED_EVENTS.get(event.get("type"))
+    if field is None:
+        return None
+    return (event["type"], event.get(field))
+
+
+class Outbox:
+    """
+    Bounded queue of outbound frames for one connection, drained by its own
+    writer task so that senders never wait on the socket. Frames are already
+    in the connection's encoding: text, or bytes sent as binary messages.
+    """
+
+    __slots__ = (
+        "websocket",
+        "max_pending",
+        "encoding",
+        "_on_error",
+        "_frames",
+        "_counter",
+        "_ready",
+        "_released",
+        "_writer",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_pending: int,
+        on_error: Callable[[Exception], None],
+        held: bool = False,
+        encoding: str = JSON,
+    ):
+        self.websocket = websocket
+        self.max_pending = max_pending
+        self.encoding = encoding
+        self._on_error = on_error
+        self._frames: "OrderedDict[Hashable, Frame]" = OrderedDict()
+        self._counter = 0
+        self._ready = asyncio.Event()
+        self._released = asyncio.Event()
+        if not held:
+            self._released.set()
+        self._writer = asyncio.create_task(self._drain())
+
+    def put(self, frame: Frame, key: Optional[Hashable] = None) -> bool:
+        """
+        Queue a frame. A pending frame with the same key is replaced in
+        place. Returns False when the queue is full.
+        """
+        if key is not None and key in self._frames:
+            self._frames[key] = frame
+            return True
+        if len(self._frames) >= self.max_pending:
+            return False
+        if key is None:
+            self._counter += 1
+            key = self._counter
+        self._frames[key] = frame
+        self._ready.set()
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._frames)
+
+    def release(self, frames: List[Frame]):
+        """Start writing a held outbox, sending `frames` before anything queued."""
+        for frame in reversed(frames):
+            self._counter += 1
+            self._frames[self._counter] = frame
+            self._frames.move_to_end(self._counter, last=False)
+        if self._frames:
+            self._ready.set()
+        self._released.set()
+
+    async def _drain(self):
+        try:
+            await self._released.wait()
+            while True:
+                await self._ready.wait()
+                while self._frames:
+                    _, frame = self._frames.popitem(last=False)
+                    if isinstance(frame, bytes):
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._on_error(e)
+
+    def close(self):
+        self._writer.cancel()
+        self._frames.clear()
+
+
+class Connection:
+    """Per-connection state: socket, outbox, subscriptions and heartbeat."""
+
+    __slots__ = ("websocket", "outbox", "topics", "last_pong", "slot")
+
+    def __init__(self, websocket: WebSocket, outbox: Outbox, slot: int):
+        self.websocket = websocket
+        self.outbox = outbox
+        self.topics: Set[str] = set()
+        self.last_pong = time.monotonic()
+        self.slot = slot
+
+
 class ConnectionManager:
-    """Manages active WebSocket connections."""
+    """
+    Manages active WebSocket connections and their topic subscriptions.
 
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.user_info: Dict[str, dict] = {}
-        self.bot_connection: Optional[WebSocket] = None
-        self.last_pong: Dict[str, datetime] = {}
-        self.bot_last_pong: Optional[datetime] = None
+    Web clients receive the events of the topics they subscribe to; the bot
+    connection receives every event.
 
-    async def connect(self, websocket: WebSocket, user_info: dict) -> bool:
+    Heartbeats run on a timer wheel: connections are spread over
+    PING_INTERVAL_SECONDS one-second slots, and a single task visits one slot
+    per second, pinging its connections and closing the stale ones. Each
+    connection is checked once per interval without a task of its own.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = MAX_WS_CONNECTIONS,
+        max_handshakes: int = MAX_WS_HANDSHAKES,
+    ):
+        self.max_connections = max_connections
+        self.max_handshakes = max_handshakes
+        self.connections: Dict[str, Connection] = {}
+        self.bot: Optional[Connection] = None
+        self.topic_index: Dict[str, Set[str]] = {}
+        self.handshakes = 0
+        # Slot -> connection keys (discord_id, None for the bot)
+        self._wheel: List[Set[Optional[str]]] = [
+            set() for _ in range(PING_INTERVAL_SECONDS)
+        ]
+        self._next_slot = 0
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def _get(self, discord_id: Optional[str]) -> Optional[Connection]:
+        return self.bot if discord_id is None else self.connections.get(discord_id)
+
+    def begin_handshake(self, is_bot: bool = False) -> bool:
+        """
+        Admit a new connection attempt, or return False when the replica is
+        full or already busy with MAX_WS_HANDSHAKES handshakes. The bot is
+        always admitted. Pair with `end_handshake`.
+        """
+        if not is_bot:
+            if self.handshakes >= self.max_handshakes:
+                return False
+            if len(self.connections) + self.handshakes >= self.max_connections:
+                return False
+        self.handshakes += 1
+        return True
+
+    def end_handshake(self):
+        self.handshakes -= 1
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_info: dict,
+        hold: bool = False,
+        encoding: str = JSON,
+    ) -> bool:
         """
         Accept and register a new connection.
         Returns True if connection was accepted, False if limit reached.
+        With `hold`, frames are queued but not written until `release`.
+        Frames are sent in `encoding` (see `codec`).
         """
-        if len(self.active_connections) >= MAX_WS_CONNECTIONS:
+        is_bot = user_info.get("is_bot", False)
+        if not is_bot and len(self.connections) >= self.max_connections:
             return False
 
         await websocket.accept()
-        discord_id = user_info.get("discord_id", "")
-        now = datetime.now(timezone.utc)
+        discord_id = None if is_bot else user_info.get("discord_id", "")
+
+        # A new connection replaces an existing one for the same user
+        if self._get(discord_id) is not None:
+            self.disconnect(discord_id or "", is_bot)
+
+        outbox = Outbox(
+            websocket,
+            MAX_PENDING_FRAMES_BOT if is_bot else MAX_PENDING_FRAMES,
+            lambda e: self._on_send_error(discord_id, websocket, e),
+            held=hold,
+            encoding=encoding,
+        )
+        conn = Connection(websocket, outbox, self._next_slot)
+        self._next_slot = (self._next_slot + 1) % len(self._wheel)
+        self._wheel[conn.slot].add(discord_id)
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
 
-        # Handle bot connection specially
-        if user_info.get("is_bot"):
-            self.bot_connection = websocket
-            self.bot_last_pong = now
+        if is_bot:
+            self.bot = conn
             logger.info("WebSocket connected: Bot")
             return True
 
-        self.active_connections[discord_id] = websocket
-        self.user_info[discord_id] = user_info
-        self.last_pong[discord_id] = now
+        self.connections[discord_id] = conn
+        self.subscribe(discord_id, self.default_topics(user_info))
         logger.info(f"WebSocket connected: {discord_id}")
         return True
 
-    def disconnect(self, discord_id: str, is_bot: bool = False):
-        """Remove a connection."""
+    def disconnect(
+        self,
+        discord_id: str,
+        is_bot: bool = False,
+        websocket: Optional[WebSocket] = None,
+    ):
+        """
+        Remove a connection. With `websocket`, only if it is still the
+        registered connection, not one that has since replaced it.
+        """
+        key = None if is_bot else discord_id
+        conn = self._get(key)
+        if conn is None or (websocket is not None and conn.websocket is not websocket):
+            return
+
+        conn.outbox.close()
+        self._wheel[conn.slot].discard(key)
         if is_bot:
-            self.bot_connection = None
-            self.bot_last_pong = None
+            self.bot = None
             logger.info("WebSocket disconnected: Bot")
             return
 
-        if discord_id in self.active_connections:
-            del self.active_connections[discord_id]
-        if discord_id in self.user_info:
-            del self.user_info[discord_id]
-        if discord_id in self.last_pong:
-            del self.last_pong[discord_id]
+        del self.connections[discord_id]
+        for topic in conn.topics:
+            self._remove_from_topic(topic, discord_id)
         logger.info(f"WebSocket disconnected: {discord_id}")
 
+    def default_topics(self, user_info: dict) -> Set[str]:
+        """Topics a web client is subscribed to on connect."""
+        topics = {f"player:{user_info.get('discord_id', '')}"}
+        rank_group = user_info.get(
+            "preferred_rank_group"
+        ) or self.get_rank_group_from_rank(user_info.get("rank", ""))
+        if rank_group:
+            topics |= {
+                f"queue:{rank_group}",
+                f"matches:{rank_group}",
+                f"leaderboard:{rank_group}",
+            }
+        return topics
+
+    def topics_of(self, discord_id: str) -> Set[str]:
+        """Topics a web client is subscribed to."""
+        conn = self.connections.get(discord_id)
+        return conn.topics if conn else set()
+
+    def subscribe(self, discord_id: str, topics) -> Set[str]:
+        """
+        Subscribe a connection to valid topics, up to the per-connection
+        limit. Returns the connection's subscriptions.
+        """
+        current = self.topics_of(discord_id)
+        if discord_id not in self.connections:
+            return current
+        for topic in topics:
+            if len(current) >= MAX_TOPICS_PER_CONNECTION:
+                break
+            if not is_valid_topic(topic) or topic in current:
+                continue
+            current.add(topic)
+            self.topic_index.setdefault(topic, set()).add(discord_id)
+        return current
+
+    def unsubscribe(self, discord_id: str, topics) -> Set[str]:
+        """Unsubscribe a connection. Returns the connection's subscriptions."""
+        current = self.topics_of(discord_id)
+        for topic in topics:
+            if topic in current:
+                current.discard(topic)
+                self._remove_from_topic(topic, discord_id)
+        return current
+
+    def _remove_from_topic(self, topic: str, discord_id: str):
+        members = self.topic_index.get(topic)
+        if members is not None:
+            members.discard(discord_id)
+            if not members:
+                del self.topic_index[topic]
+
     def update_pong(self, discord_id: str, is_bot: bool = False):
         """Update last pong time for heartbeat tracking."""
-        now = datetime.now(timezone.utc)
-        if is_bot:
-            self.bot_last_pong = now
-        else:
-            self.last_pong[discord_id] = now
+        conn = self._get(None if is_bot else discord_id)
+        if conn is not None:
+            conn.last_pong = time.monotonic()
 
-    def is_stale(self, discord_id: str, is_bot: bool = False) -> bool:
-        """Check if connection is stale (no pong received within timeout)."""
-        now = datetime.now(timezone.utc)
-        if is_bot:
-            if self.bot_last_pong is None:
-                return True
-            return (now - self.bot_last_pong).total_seconds() > PONG_TIMEOUT_SECONDS
-        else:
-            last = self.last_pong.get(discord_id)
-            if last is None:
-                return True
-            return (now - last).total_seconds() > PONG_TIMEOUT_SECONDS
+    async def _heartbeat_loop(self):
+        tick = 0
+        try:
+            while True:
+                await asyncio.sleep(1)
+                tick = (tick + 1) % len(self._wheel)
+                self._heartbeat_slot(tick)
+        except asyncio.CancelledError:
+            pass
+
+    def _heartbeat_slot(self, slot: int):
+        """Ping the connections of a wheel slot and close the stale ones."""
+        deadline = time.monotonic() - PONG_TIMEOUT_SECONDS
+        stale: List[WebSocket] = []
+        for key in list(self._wheel[slot]):
+            conn = self._get(key)
+            if conn is None:
+                self._wheel[slot].discard(key)
+            elif conn.last_pong < deadline:
+                logger.warning(f"Connection stale for {key or 'bot'}, closing")
+                self.disconnect(key or "", is_bot=key is None)
+                stale.append(conn.websocket)
+            else:
+                self.send_frame(key, "ping")
+        for websocket in stale:
+            asyncio.create_task(self._close(websocket, status.WS_1000_NORMAL_CLOSURE))
+
+    def send_frame(
+        self,
+        discord_id: Optional[str],
+        frame: str,
+        key: Optional[Hashable] = None,
+    ):
+        """
+        Queue a JSON frame for a connection (None for the bot), converted to
+        the connection's encoding. Closes the connection if it has fallen too
+        far behind.
+        """
+        conn = self._get(discord_id)
+        if conn is None:
+            return
+        outbox = conn.outbox
+        if outbox.put(transcode(frame, outbox.encoding), key):
+            return
+        logger.warning(
+            f"Closing slow WebSocket consumer {discord_id or 'bot'} "
+            f"({outbox.pending} frames pending)"
+        )
+        self.disconnect(discord_id or "", is_bot=discord_id is None)
+        asyncio.create_task(
+            self._close(conn.websocket, SLOW_CONSUMER_CLOSE_CODE, "Slow consumer")
+        )
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int, reason: str = ""):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    def _on_send_error(
+        self, discord_id: Optional[str], websocket: WebSocket, error: Exception
+    ):
+        logger.error(f"Failed to send to {discord_id or 'bot'}: {error}")
+        self.disconnect(discord_id or "", discord_id is None, websocket)
+
+    def release(self, discord_id: Optional[str], frames: List[str]):
+        """Release a held connection (None for the bot), sending `frames` first."""
+        conn = self._get(discord_id)
+        if conn:
+            encoding = conn.outbox.encoding
+            conn.outbox.release([transcode(frame, encoding) for frame in frames])
 
     async def send_personal(self, discord_id: str, event: dict):
         """Send event to a specific user."""
-        websocket = self.active_connections.get(discord_id)
-        if websocket:
-            try:
-                await websocket.send_text(json.dumps(event, default=str))
-            except Exception as e:
-                logger.error(f"Failed to send to {discord_id}: {e}")
-                self.disconnect(discord_id)
-
-    async def broadcast(self, event: dict, rank_group: Optional[str] = None):
+        self.send_frame(discord_id, encode(event))
+
+    async def broadcast(self, event: dict, topics: Iterable[str]):
+        """Queue an event for its topics. See `broadcast_frame`."""
+        self.broadcast_frame(encode(event), topics, coalesce_key(event))
+
+    def broadcast_frame(
+        self, frame: str, topics: Iterable[str], key: Optional[Hashable] = None
+    ):
         """
-        Broadcast event to all connected users.
-        If rank_group is provided, only send to users in that rank group.
-        Also sends to bot connection if available.
+        Queue a serialized event for the subscribers of any of its topics,
+        and for the bot. Only enqueues: each connection's writer task does
+        the sending.
         """
-        event_json = json.dumps(event, default=str)
-        disconnected_users: list[str] = []
-
-        if self.bot_connection:
-            try:
-                await self.bot_connection.send_text(event_json)
-            except Exception as e:
-                logger.error(f"Failed to send to bot: {e}")
-                self.bot_connection = None
-
-        for discord_id, websocket in self.active_connections.items():
-            # Filter by rank group if specified
-            if rank_group:
-                user_rank = self.user_info.get(discord_id, {}).get("rank", "")
-                user_rg = self.get_rank_group_from_rank(user_rank)
-                if user_rg != rank_group:
-                    continue
-
-            try:
-                await websocket.send_text(event_json)
-            except Exception as e:
-                logger.error(f"Failed to send to {discord_id}: {e}")
-                disconnected_users.append(discord_id)
-
-        # Clean up disconnected users
-        for discord_id in disconnected_users:
-            self.disconnect(discord_id)
+        recipients: Set[str] = set()
+        for topic in topics:
+            recipients |= self.topic_index.get(topic, set())
+
+        for discord_id in recipients:
+            self.send_frame(discord_id, frame, key)
+        if self.bot:
+            self.send_frame(None, frame, key)
 
     @staticmethod
     def get_rank_group_from_rank(rank: str) -> Optional[str]:
@@ -154,11 +466,33 @@ class ConnectionManager:
     @property
     def connection_count(self) -> int:
         """Get total number of active connections."""
-        count = len(self.active_connections)
-        if self.bot_connection:
+        count = len(self.connections)
+        if self.bot:
             count += 1
         return count
 
+    def stats(self) -> dict:
+        """Subscribers per topic and outbound queue depths."""
+        depths = [conn.outbox.pending for conn in self.connections.values()]
+        bot_depth = self.bot.outbox.pending if self.bot else 0
+        return {
+            "topic_subscribers": {
+                topic: len(members) for topic, members in self.topic_index.items()
+            },
+            "send_queues": {
+                "pending_frames": sum(depths) + bot_depth,
+                "max_pending": max(depths, default=0),
+                "bot_pending": bot_depth,
+                "backlogged": sum(1 for d in depths if d >= MAX_PENDING_FRAMES // 2),
+            },
+        }
+
+    async def stop(self):
+        """Stop the heartbeat task. Called on shutdown."""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
 
 # Global connection manager
 manager = ConnectionManager()
@@ -186,11 +520,79 @@ def validate_token(token: str) -> Optional[dict]:
         return None
 
 
+def handle_client_frame(discord_id: str, data: str):
+    """
+    Apply a subscription frame from a web client:
+
+        {"action": "subscribe" | "unsubscribe", "topics": ["queue:dia-asc", ...]}
+
+    Replies with the connection's resulting subscriptions.
+    """
+    try:
+        frame = json.loads(data)
+        action = frame.get("action")
+        topics = frame.get("topics")
+        if action not in ("subscribe", "unsubscribe") or not isinstance(topics, list):
+            raise ValueError
+    except (ValueError, AttributeError):
+        manager.send_frame(
+            discord_id,
+            json.dumps({"type": "error", "detail": "Invalid subscription frame"}),
+        )
+        return
+
+    if action == "subscribe":
+        current = manager.subscribe(discord_id, topics)
+    else:
+        current = manager.unsubscribe(discord_id, topics)
+    manager.send_frame(
+        discord_id, json.dumps({"type": "subscriptions", "topics": sorted(current)})
+    )
+
+
+async def replay_frames(discord_id: Optional[str], since: Optional[str]) -> List[str]:
+    """
+    Frames a reconnecting connection (None for the bot) missed since the
+    per-topic sequence numbers in `since`, oldest first. Web clients only get
+    topics they are subscribed to. Topics that can no longer be replayed are
+    reported in a leading resync_required frame.
+    """
+    # Imported here: the events package imports this module
+    from events.replay import get_replay_log, parse_since
+
+    since = parse_since(since)
+    if discord_id is not None:
+        subscribed = manager.topics_of(discord_id)
+        since = {t: seq for t, seq in since.items() if t in subscribed}
+    if not since:
+        return []
+
+    log = await get_replay_log()
+    missed: Dict[str, int] = {}
+    resync: List[str] = []
+    for topic, seq in since.items():
+        replay = await log.since(topic, seq)
+        if replay is None:
+            resync.append(topic)
+            continue
+        for all_seq, frame in replay:
+            missed[frame] = all_seq
+
+    frames = sorted(missed, key=missed.get)
+    if resync:
+        frames.insert(
+            0, json.dumps({"type": "resync_required", "topics": sorted(resync)})
+        )
+    return frames
+
+
 @router.websocket("/ws/{token}")
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str,
     rank_group: Optional[str] = Query(None),
+    since: Optional[str] = Query(None),
+    encoding: Optional[str] = Query(None),
 ):
     """
     WebSocket endpoint for real-time updates.
@@ -198,7 +600,21 @@ async def websocket_endpoint(
     Connect using: ws://host/ws/{jwt_token}?rank_group=iron-plat
 
     The token can be either a JWT token (for web users) or the bot API token.
-    Optionally filter events by rank_group: iron-plat, dia-asc, imm-radiant
+    Web users start subscribed to their own player topic and the queue,
+    matches and leaderboard topics of `rank_group` (default: the rank group
+    of their rank). They can change subscriptions by sending
+    {"action": "subscribe" | "unsubscribe", "topics": [...]}.
+    The bot receives every event.
+
+    Events carry per-topic sequence numbers in `seq`. After a reconnect,
+    pass the last ones seen as ?since=topic=seq,topic=seq to receive only the
+    missed events (the bot uses the all-events topic "*"). Topics whose gap
+    is no longer buffered are listed in a resync_required frame instead.
+
+    Pass ?encoding=msgpack to receive events as MessagePack in binary
+    messages instead of JSON text. Frames sent by the client, and the
+    ping/pong heartbeat, stay text. Messages are compressed with
+    permessage-deflate when the client offers it.
 
     Server sends "ping" every 30s. Client should respond with "pong".
     Connections with no pong in 90s are considered stale and closed.
@@ -210,42 +626,43 @@ async def websocket_endpoint(
         logger.warning("WebSocket auth failed: invalid token")
         return
 
+    wire_encoding = negotiate(encoding)
+    if wire_encoding is None:
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        logger.warning(f"WebSocket rejected: unsupported encoding {encoding!r}")
+        return
+
     # Store rank group preference if provided
     if rank_group and not user_info.get("is_bot"):
         user_info["preferred_rank_group"] = rank_group
 
-    # Try to connect
-    connected = await manager.connect(websocket, user_info)
-    if not connected:
+    discord_id = user_info.get("discord_id", "")
+    is_bot = user_info.get("is_bot", False)
+
+    # Shed connection attempts while full or flooded with handshakes
+    if not manager.begin_handshake(is_bot):
         await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
-        logger.warning("WebSocket connection limit reached")
+        logger.warning("WebSocket connection refused: server busy")
         return
 
-    discord_id = user_info.get("discord_id", "")
-    is_bot = user_info.get("is_bot", False)
+    try:
+        connected = await manager.connect(
+            websocket, user_info, hold=True, encoding=wire_encoding
+        )
+        if not connected:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            logger.warning("WebSocket connection limit reached")
+            return
 
-    async def heartbeat_loop():
-        """Send pings and check for stale connections."""
+        # Send missed events before any live ones
+        frames: List[str] = []
         try:
-            while True:
-                await asyncio.sleep(PING_INTERVAL_SECONDS)
-
-                # Check if connection is stale
-                if manager.is_stale(discord_id, is_bot):
-                    logger.warning(f"Connection stale for {discord_id}, closing")
-                    await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
-                    return
-
-                # Send ping
-                try:
-                    await websocket.send_text("ping")
-                except Exception:
-                    return  # Connection closed
-        except asyncio.CancelledError:
-            pass
-
-    # Start heartbeat task
-    heartbeat_task = asyncio.create_task(heartbeat_loop())
+            frames = await replay_frames(None if is_bot else discord_id, since)
+        except Exception as e:
+            logger.error(f"Failed to replay events for {discord_id}: {e}")
+        manager.release(None if is_bot else discord_id, frames)
+    finally:
+        manager.end_handshake()
 
     try:
         # Keep connection alive, receive messages
@@ -254,23 +671,21 @@ async def websocket_endpoint(
 
             # Handle client ping (client -> server)
             if data == "ping":
-                await websocket.send_text("pong")
+                manager.send_frame(None if is_bot else discord_id, "pong")
 
             # Handle client pong response (client responding to server ping)
             elif data == "pong":
                 manager.update_pong(discord_id, is_bot)
 
+            # Handle subscription changes
+            elif not is_bot:
+                handle_client_frame(discord_id, data)
+
     except WebSocketDisconnect:
-        manager.disconnect(discord_id, is_bot)
+        manager.disconnect(discord_id, is_bot, websocket)
     except Exception as e:
         logger.error(f"WebSocket error for {discord_id}: {e}")
-        manager.disconnect(discord_id, is_bot)
-    finally:
-        heartbeat_task.cancel()
-        try:
-            await heartbeat_task
-        except asyncio.CancelledError:
-            pass
+        manager.disconnect(discord_id, is_bot, websocket)
 
 
 @router.get("/ws/status")
@@ -278,6 +693,9 @@ async def websocket_status():
     """Get WebSocket connection status."""
     return {
         "active_connections": manager.connection_count,
-        "max_connections": MAX_WS_CONNECTIONS,
-        "bot_connected": manager.bot_connection is not None,
+        "max_connections": manager.max_connections,
+        "handshakes": manager.handshakes,
+        "bot_connected": manager.bot is not None,
+        "topics": len(manager.topic_index),
+        **manager.stats(),
     }
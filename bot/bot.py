@@ -10,6 +10,8 @@ from dotenv import load_dotenv
 from typing import cast
 from utils.rate_limit import rate_limiter
 from utils.permissions import check_command_permissions
+from utils.api_client import api_client
+from utils import cache
 from websocket_client import ws_client
 from websocket_handlers import setup_handlers
 
@@ -124,23 +126,39 @@ async def on_ready():
         setup_handlers(bot)
         asyncio.create_task(ws_client.start())
         logger.info("WebSocket client started in background")
+        cache.start_reporting()
     except Exception as e:
         logger.error(f"Failed to start WebSocket client: {e}")
 
 
+async def shutdown():
+    """Close the long-lived connections to the API."""
+    await ws_client.stop()
+    await cache.stop_reporting()
+    await api_client.close()
+
+
 async def main():
     backoff_seconds = 5
-    while True:
-        try:
-            async with bot:
-                await load_extensions()
-                await bot.start(TOKEN)
-        except (aiohttp.ClientConnectorError, aiohttp.ClientConnectorDNSError) as e:
-            logger.error(f"Discord connect failed: {e}; retrying in {backoff_seconds}s")
-        except Exception as e:
-            logger.error(f"Bot crashed: {e}; retrying in {backoff_seconds}s")
-        await asyncio.sleep(backoff_seconds)
-        backoff_seconds = min(backoff_seconds * 2, 300)
+    try:
+        while True:
+            try:
+                async with bot:
+                    await load_extensions()
+                    await bot.start(TOKEN)
+            except (
+                aiohttp.ClientConnectorError,
+                aiohttp.ClientConnectorDNSError,
+            ) as e:
+                logger.error(
+                    f"Discord connect failed: {e}; retrying in {backoff_seconds}s"
+                )
+            except Exception as e:
+                logger.error(f"Bot crashed: {e}; retrying in {backoff_seconds}s")
+            await asyncio.sleep(backoff_seconds)
+            backoff_seconds = min(backoff_seconds * 2, 300)
+    finally:
+        await shutdown()
 
 
 if __name__ == "__main__":
@@ -8,9 +8,10 @@ from pathlib import Path
 from dotenv import load_dotenv
 from utils.db import (
     get_match,
-    update_match_result,
+    settle_match,
+    revert_match,
     get_active_matches,
-    get_leaderboard,
+    get_leaderboard_entries,
     update_leaderboard,
     get_player,
     add_admin_log,
@@ -23,7 +24,6 @@ from utils.db import (
     get_banned_players,
     get_timeout_players,
 )
-from models.leaderboard import LeaderboardEntry
 from .leaderboard import LeaderboardCog
 from datetime import datetime, timezone
 import logging
@@ -77,77 +77,15 @@ class AdminCog(commands.Cog):
             return "imm-radiant"
         return "imm-radiant"
 
-    async def update_leaderboard_points(self, match_id: str, winner: str):
-        match = await get_match(match_id)
-        if not match or not match.players_red or not match.players_blue:
-            logger.error(
-                f"update_leaderboard_points: match not found or malformed for {match_id}"
-            )
-            return
-
-        first_player = await get_player(match.players_red[0])
-        if not first_player or not first_player.rank:
-            return
-
-        rank_group = self.get_rank_group(first_player.rank)
-
-        leaderboard = await get_leaderboard(rank_group)
-        current_entries = {str(p.discord_id): p for p in leaderboard.players}
-        updated_entries = []
-
-        all_match_players = match.players_red + match.players_blue
-        player_ranks = {}
-        for player_id in all_match_players:
-            player = await get_player(player_id)
-            if player and player.rank:
-                player_ranks[player_id] = player.rank
-
-        winning_team = match.players_red if winner == "red" else match.players_blue
-        for player_id in winning_team:
-            if player_id in current_entries:
-                entry = current_entries[player_id]
-                entry.points += 10
-                entry.matches_played += 1
-                entry.wins += 1
-                entry.winrate = (entry.wins / entry.matches_played) * 100
-                entry.streak = max(0, entry.streak) + 1
-            else:
-                entry = LeaderboardEntry(
-                    discord_id=player_id,
-                    rank=player_ranks.get(player_id, "Unranked"),
-                    points=1010,
-                    matches_played=1,
-                    wins=1,
-                    winrate=100.0,
-                    streak=1,
-                )
-            updated_entries.append(entry)
-
-        losing_team = match.players_blue if winner == "red" else match.players_red
-        for player_id in losing_team:
-            if player_id in current_entries:
-                entry = current_entries[player_id]
-                entry.points = max(0, entry.points - 10)
-                entry.matches_played += 1
-                entry.winrate = (entry.wins / entry.matches_played) * 100
-                entry.streak = min(0, entry.streak) - 1
-            else:
-                entry = LeaderboardEntry(
-                    discord_id=player_id,
-                    rank=player_ranks.get(player_id, "Unranked"),
-                    points=990,
-                    matches_played=1,
-                    wins=0,
-                    winrate=0.0,
-                    streak=-1,
-                )
-            updated_entries.append(entry)
-
-        await update_leaderboard(rank_group, updated_entries)
-
+    async def refresh_result_displays(
+        self, match, previous_result: Optional[str] = None
+    ):
         history_cog = self.bot.get_cog("HistoryCog")
         if history_cog:
-            await history_cog.add_match_to_history(match)
+            if previous_result in ("red", "blue"):
+                await history_cog.remove_match_from_history(match)
+            if match.result in ("red", "blue"):
+                await history_cog.add_match_to_history(match)
 
         leaderboard_cog = self.bot.get_cog("LeaderboardCog")
         if leaderboard_cog:
@@ -202,37 +140,55 @@ class AdminCog(commands.Cog):
                 )
                 return
 
-        if result == "cancelled" and match.result and match.result != "cancelled":
-            await self.revert_leaderboard_points(match_id, match.result)
+        previous_result = match.result
+        if result == "cancelled":
+            updated = await revert_match(match_id)
+            if not updated:
+                await interaction.followup.send(
+                    "❌ Failed to cancel the match!", ephemeral=True
+                )
+                return
+            if previous_result in ("red", "blue"):
+                await add_admin_log(
+                    action="revert_match",
+                    admin_discord_id=str(interaction.user.id),
+                    match_id=match_id,
+                    reason="Match result reverted due to cancellation",
+                )
             await add_admin_log(
-                action="revert_match",
+                action="cancel_match",
                 admin_discord_id=str(interaction.user.id),
                 match_id=match_id,
-                reason="Match result reverted due to cancellation",
+                reason="Match cancelled by admin",
             )
+        else:
+            if red_score == blue_score:
+                await interaction.followup.send(
+                    "Invalid scores! A match cannot end in a draw.", ephemeral=True
+                )
+                return
+            if result != ("red" if red_score > blue_score else "blue"):
+                await interaction.followup.send(
+                    f"Invalid scores! They don't match a {result} team win.",
+                    ephemeral=True,
+                )
+                return
 
-        await update_match_result(
-            match_id=match_id,
-            red_score=red_score if result != "cancelled" else None,
-            blue_score=blue_score if result != "cancelled" else None,
-            result=result,
-        )
-
-        if result != "cancelled":
-            await self.update_leaderboard_points(match_id, result)
+            settled = await settle_match(match_id, red_score, blue_score, force=True)
+            if not settled:
+                await interaction.followup.send(
+                    "❌ Failed to set the match result!", ephemeral=True
+                )
+                return
+            updated, _ = settled
             await add_admin_log(
                 action="set_result",
                 admin_discord_id=str(interaction.user.id),
                 match_id=match_id,
                 reason=f"Match result set to {result} (Red: {red_score}, Blue: {blue_score})",
             )
-        else:
-            await add_admin_log(
-                action="cancel_match",
-                admin_discord_id=str(interaction.user.id),
-                match_id=match_id,
-                reason="Match cancelled by admin",
-            )
+
+        await self.refresh_result_displays(updated, previous_result)
 
         await interaction.followup.send(
             f"✅ Match result updated!\n"
@@ -248,73 +204,6 @@ class AdminCog(commands.Cog):
         await asyncio.sleep(5)
         await self.cleanup_match_channels(interaction.guild, match_id)
 
-    async def revert_leaderboard_points(self, match_id: str, previous_result: str):
-        match = await get_match(match_id)
-
-        first_player = await get_player(match.players_red[0])
-        if not first_player or not first_player.rank:
-            return
-
-        rank_group = self.get_rank_group(first_player.rank)
-
-        leaderboard = await get_leaderboard(rank_group)
-        current_entries = {str(p.discord_id): p for p in leaderboard.players}
-        updated_entries = []
-
-        all_match_players = match.players_red + match.players_blue
-        player_ranks = {}
-        for player_id in all_match_players:
-            player = await get_player(player_id)
-            if player and player.rank:
-                player_ranks[player_id] = player.rank
-
-        winning_team = (
-            match.players_red if previous_result == "red" else match.players_blue
-        )
-        for player_id in winning_team:
-            if player_id in current_entries:
-                entry = current_entries[player_id]
-                entry.points -= 10
-                entry.matches_played -= 1
-                entry.wins -= 1
-                if entry.matches_played > 0:
-                    entry.winrate = (entry.wins / entry.matches_played) * 100
-                else:
-                    entry.winrate = 0.0
-                entry.streak = max(0, entry.streak - 1)
-                updated_entries.append(entry)
-
-        losing_team = (
-            match.players_blue if previous_result == "red" else match.players_red
-        )
-        for player_id in losing_team:
-            if player_id in current_entries:
-                entry = current_entries[player_id]
-                entry.points += 10
-                entry.matches_played -= 1
-                if entry.matches_played > 0:
-                    entry.winrate = (entry.wins / entry.matches_played) * 100
-                else:
-                    entry.winrate = 0.0
-                entry.streak = min(0, entry.streak + 1)
-                updated_entries.append(entry)
-
-        await update_leaderboard(rank_group, updated_entries)
-
-        history_cog = self.bot.get_cog("HistoryCog")
-        if history_cog:
-            await history_cog.remove_match_from_history(match)
-
-        leaderboard_cog = self.bot.get_cog("LeaderboardCog")
-        if leaderboard_cog:
-            guild = self.bot.get_guild(GUILD_ID)
-            if guild:
-                category = discord.utils.get(guild.categories, name="Hub")
-                if category:
-                    channel = discord.utils.get(category.channels, name="leaderboard")
-                    if channel:
-                        await leaderboard_cog.update_leaderboard_display(channel)
-
     async def cleanup_match_channels(self, guild: discord.Guild, match_id: str):
         try:
             match_category = discord.utils.get(guild.categories, name=match_id)
@@ -630,13 +519,11 @@ class AdminCog(commands.Cog):
 
             await update_player_rank(str(user.id), rank)
 
-            leaderboard = await get_leaderboard(rank_group)
-            if leaderboard:
-                for entry in leaderboard.players:
-                    if entry.discord_id == str(user.id):
-                        entry.rank = rank
-                        break
-                await update_leaderboard(rank_group, leaderboard.players)
+            entries = await get_leaderboard_entries(rank_group, [str(user.id)])
+            entry = entries.get(str(user.id))
+            if entry:
+                entry.rank = rank
+                await update_leaderboard(rank_group, [entry])
 
             leaderboard_cog = interaction.client.get_cog("LeaderboardCog")
             if leaderboard_cog:
@@ -678,12 +565,11 @@ class AdminCog(commands.Cog):
             await update_player_rank(str(user.id), player.rank)
 
             rank_group = self.get_rank_group(player.rank)
-            leaderboard = await get_leaderboard(rank_group)
-            for entry in leaderboard.players:
-                if entry.discord_id == str(user.id):
-                    entry.points = points
-                    break
-            await update_leaderboard(rank_group, leaderboard.players)
+            entries = await get_leaderboard_entries(rank_group, [str(user.id)])
+            entry = entries.get(str(user.id))
+            if entry:
+                entry.points = points
+                await update_leaderboard(rank_group, [entry])
 
             await add_admin_log(
                 action="set_points",
@@ -3,8 +3,12 @@ from discord.ext import commands
 from discord import app_commands
 from typing import List
 from datetime import datetime, timezone
-from utils.db import get_match_history
+from utils.db import get_match_history, get_match_history_page
+from utils.message_registry import message_registry
 from models.match import Match
+import asyncio
+import hashlib
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -12,11 +16,80 @@ from dotenv import load_dotenv
 load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
 GUILD_ID = int(os.getenv("DISCORD_GUILD_ID"))
 
+# Matches fetched per request while syncing the history channel
+HISTORY_PAGE_SIZE = 100
+
+# Role prefix of match cards in the message registry
+HISTORY_PREFIX = "history:"
+
+RANK_GROUP_DISPLAY = {
+    "iron-plat": "Iron - Platinum",
+    "dia-asc": "Diamond - Ascendant",
+    "imm-radiant": "Immortal - Radiant",
+}
+
+
+def history_role(match_id: str) -> str:
+    return f"{HISTORY_PREFIX}{match_id}"
+
+
+def card_digest(embed: discord.Embed) -> str:
+    content = json.dumps(embed.to_dict(), sort_keys=True, default=str)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def build_match_card(match: Match) -> discord.Embed:
+    duration = match.duration
+    if duration:
+        hours, remainder = divmod(duration.seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        duration_str = f"{hours}h {minutes}m {seconds}s"
+    else:
+        duration_str = "N/A"
+
+    red_side = "⚔️ Attack" if match.defense_start == "blue" else "🛡️ Defense"
+    blue_side = "⚔️ Attack" if match.defense_start == "red" else "🛡️ Defense"
+
+    embed = discord.Embed(
+        title=f"Match {match.match_id}",
+        description=f"**Rank Group: {RANK_GROUP_DISPLAY[match.rank_group]}**",
+        color=discord.Color.dark_theme(),
+        timestamp=match.created_at,
+    )
+
+    embed.add_field(
+        name=f"🔴 Red Team {red_side}",
+        value=f"• Captain: <@{match.players_red[0]}>\n"
+        + "\n".join([f"• <@{id}>" for id in match.players_red[1:]]),
+        inline=True,
+    )
+    embed.add_field(
+        name=f"🔵 Blue Team {blue_side}",
+        value=f"• Captain: <@{match.players_blue[0]}>\n"
+        + "\n".join([f"• <@{id}>" for id in match.players_blue[1:]]),
+        inline=True,
+    )
+
+    embed.add_field(
+        name="Match Details",
+        value=(
+            f"🗺️ Map: {match.selected_map or 'Unknown'}\n"
+            f"Score: {match.red_score}-{match.blue_score}\n"
+            f"Winner: {'🔴 Red Team' if match.result == 'red' else '🔵 Blue Team'}\n"
+            f"Duration: {duration_str}\n"
+            f"Date: {match.created_at.strftime('%Y-%m-%d %H:%M')}"
+        ),
+        inline=False,
+    )
+    return embed
+
 
 class HistoryCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.history_channels = {}
+        # Syncs and single card updates must not post the same card twice
+        self._cards_lock = asyncio.Lock()
         self.bot.add_listener(self.on_ready)
 
     async def on_ready(self):
@@ -51,6 +124,7 @@ class HistoryCog(commands.Cog):
 
             await channel.edit(overwrites=overwrites)
             self.history_channels[channel.id] = True
+            await self.update_history_display(channel)
 
     @app_commands.command(name="setup_history")
     @app_commands.default_permissions(administrator=True)
@@ -93,73 +167,72 @@ class HistoryCog(commands.Cog):
         )
 
     async def update_history_display(self, channel: discord.TextChannel):
-        await channel.purge()
-
-        matches = await get_match_history(limit=None)
-        if not matches:
-            await channel.send("No match history found.")
+        """
+        Bring the channel's match cards in line with the API: post missing
+        cards, edit changed ones and delete those of matches no longer
+        finished. Matches are streamed page by page.
+        """
+        async with self._cards_lock:
+            await self._sync_cards(channel)
+
+    async def _sync_cards(self, channel: discord.TextChannel):
+        guild = channel.guild
+        if not await message_registry.load(guild.id):
             return
 
-        for match in matches:
-            if match.result == "cancelled":
-                continue
-
-            red_team = [f"<@{id}>" for id in match.players_red]
-            blue_team = [f"<@{id}>" for id in match.players_blue]
-
-            red_team[0] = f"{red_team[0]} 👑"
-            blue_team[0] = f"{blue_team[0]} 👑"
-
-            duration = match.duration
-            if duration:
-                hours, remainder = divmod(duration.seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                duration_str = f"{hours}h {minutes}m {seconds}s"
-            else:
-                duration_str = "N/A"
-
-            rank_group_display = {
-                "iron-plat": "Iron - Platinum",
-                "dia-asc": "Diamond - Ascendant",
-                "imm-radiant": "Immortal - Radiant",
-            }
-
-            red_side = "⚔️ Attack" if match.defense_start == "blue" else "🛡️ Defense"
-            blue_side = "⚔️ Attack" if match.defense_start == "red" else "🛡️ Defense"
-
-            embed = discord.Embed(
-                title=f"Match {match.match_id}",
-                description=f"**Rank Group: {rank_group_display[match.rank_group]}**",
-                color=discord.Color.dark_theme(),
-                timestamp=match.created_at,
-            )
-
-            embed.add_field(
-                name=f"🔴 Red Team {red_side}",
-                value=f"• Captain: <@{match.players_red[0]}>\n"
-                + "\n".join([f"• <@{id}>" for id in match.players_red[1:]]),
-                inline=True,
-            )
-            embed.add_field(
-                name=f"🔵 Blue Team {blue_side}",
-                value=f"• Captain: <@{match.players_blue[0]}>\n"
-                + "\n".join([f"• <@{id}>" for id in match.players_blue[1:]]),
-                inline=True,
-            )
-
-            embed.add_field(
-                name="Match Details",
-                value=(
-                    f"🗺️ Map: {match.selected_map or 'Unknown'}\n"
-                    f"Score: {match.red_score}-{match.blue_score}\n"
-                    f"Winner: {'🔴 Red Team' if match.result == 'red' else '🔵 Blue Team'}\n"
-                    f"Duration: {duration_str}\n"
-                    f"Date: {match.created_at.strftime('%Y-%m-%d %H:%M')}"
-                ),
-                inline=False,
-            )
-
-            await channel.send(embed=embed)
+        indexed = message_registry.entries(guild.id, HISTORY_PREFIX)
+        if not any(entry[0] == channel.id for entry in indexed.values()):
+            # Cards posted before this channel was indexed cannot be matched
+            await message_registry.forget_prefix(guild, HISTORY_PREFIX)
+            await channel.purge(limit=None)
+            indexed = {}
+
+        seen = set()
+        after = None
+        while True:
+            page = await get_match_history_page(after, HISTORY_PAGE_SIZE)
+            if page is None:
+                # Without the full list, stale cards cannot be told apart
+                return
+            matches, after = page
+            for match in matches:
+                seen.add(history_role(match.match_id))
+                await self._post_card(channel, match)
+            if after is None:
+                break
+
+        for role in indexed.keys() - seen:
+            await self._delete_card(guild, role)
+
+    async def _post_card(self, channel: discord.TextChannel, match: Match):
+        embed = build_match_card(match)
+        digest = card_digest(embed)
+        role = history_role(match.match_id)
+
+        entry = message_registry.entry(channel.guild.id, role)
+        if entry and entry[0] == channel.id:
+            if entry[2] == digest:
+                return
+            try:
+                message = await channel.get_partial_message(entry[1]).edit(embed=embed)
+                await message_registry.remember(role, message, digest)
+                return
+            except discord.NotFound:
+                pass
+
+        message = await channel.send(embed=embed)
+        await message_registry.remember(role, message, digest)
+
+    async def _delete_card(self, guild: discord.Guild, role: str):
+        entry = message_registry.entry(guild.id, role)
+        if entry:
+            channel = guild.get_channel(entry[0])
+            if channel:
+                try:
+                    await channel.get_partial_message(entry[1]).delete()
+                except discord.NotFound:
+                    pass
+        await message_registry.forget(guild, role)
 
     async def add_new_match(self, match: Match):
         for channel_id in self.history_channels:
@@ -291,81 +364,20 @@ class HistoryCog(commands.Cog):
         if match.result == "cancelled":
             return
 
-        for channel_id in self.history_channels:
-            channel = self.bot.get_channel(channel_id)
-            if not channel:
-                continue
-
-            red_team = [f"<@{id}>" for id in match.players_red]
-            blue_team = [f"<@{id}>" for id in match.players_blue]
-
-            red_team[0] = f"{red_team[0]} 👑"
-            blue_team[0] = f"{blue_team[0]} 👑"
-
-            duration = match.duration
-            if duration:
-                hours, remainder = divmod(duration.seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                duration_str = f"{hours}h {minutes}m {seconds}s"
-            else:
-                duration_str = "N/A"
-
-            rank_group_display = {
-                "iron-plat": "Iron - Platinum",
-                "dia-asc": "Diamond - Ascendant",
-                "imm-radiant": "Immortal - Radiant",
-            }
-
-            red_side = "⚔️ Attack" if match.defense_start == "blue" else "🛡️ Defense"
-            blue_side = "⚔️ Attack" if match.defense_start == "red" else "🛡️ Defense"
-
-            embed = discord.Embed(
-                title=f"Match {match.match_id}",
-                description=f"**Rank Group: {rank_group_display[match.rank_group]}**",
-                color=discord.Color.dark_theme(),
-                timestamp=match.created_at,
-            )
-
-            embed.add_field(
-                name=f"🔴 Red Team {red_side}",
-                value=f"• Captain: <@{match.players_red[0]}>\n"
-                + "\n".join([f"• <@{id}>" for id in match.players_red[1:]]),
-                inline=True,
-            )
-            embed.add_field(
-                name=f"🔵 Blue Team {blue_side}",
-                value=f"• Captain: <@{match.players_blue[0]}>\n"
-                + "\n".join([f"• <@{id}>" for id in match.players_blue[1:]]),
-                inline=True,
-            )
-
-            embed.add_field(
-                name="Match Details",
-                value=(
-                    f"🗺️ Map: {match.selected_map or 'Unknown'}\n"
-                    f"Score: {match.red_score}-{match.blue_score}\n"
-                    f"Winner: {'🔴 Red Team' if match.result == 'red' else '🔵 Blue Team'}\n"
-                    f"Duration: {duration_str}\n"
-                    f"Date: {match.created_at.strftime('%Y-%m-%d %H:%M')}"
-                ),
-                inline=False,
-            )
-
-            await channel.send(embed=embed)
+        async with self._cards_lock:
+            for channel_id in self.history_channels:
+                channel = self.bot.get_channel(channel_id)
+                if not channel:
+                    continue
+                await self._post_card(channel, match)
 
     async def remove_match_from_history(self, match: Match):
-        for channel_id in self.history_channels:
-            channel = self.bot.get_channel(channel_id)
-            if not channel:
-                continue
-
-            async for message in channel.history(limit=200):
-                if not message.embeds:
+        async with self._cards_lock:
+            for channel_id in self.history_channels:
+                channel = self.bot.get_channel(channel_id)
+                if not channel:
                     continue
-                embed = message.embeds[0]
-                if embed.title and embed.title == f"Match {match.match_id}":
-                    await message.delete()
-                    break
+                await self._delete_card(channel.guild, history_role(match.match_id))
 
 
 async def setup(bot):
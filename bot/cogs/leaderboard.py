@@ -3,10 +3,12 @@ from discord.ext import commands
 from discord import app_commands
 from utils.db import (
     get_leaderboard_page,
+    get_total_pages,
     get_player,
     get_user_preferences,
     save_user_preferences,
 )
+from utils.message_registry import message_registry
 from models.preferences import UserPreferences
 import os
 from pathlib import Path
@@ -219,12 +221,6 @@ class LeaderboardCog(commands.Cog):
                     )
             await channel.edit(overwrites=overwrites)
 
-            async for message in channel.history(limit=None):
-                try:
-                    await message.delete()
-                except discord.NotFound:
-                    pass
-
             self.leaderboard_channels[channel.id] = {
                 "rank_group": "imm-radiant",
                 "page": 1,
@@ -295,7 +291,6 @@ class LeaderboardCog(commands.Cog):
         if channel_id not in self.leaderboard_channels:
             return
 
-        await channel.purge()
         embed = discord.Embed(
             title="Valorant Leaderboard",
             description="Click the button below to view the leaderboard!",
@@ -304,7 +299,7 @@ class LeaderboardCog(commands.Cog):
 
         view = discord.ui.View(timeout=None)
         view.add_item(ShowLeaderboardButton(self))
-        await channel.send(embed=embed, view=view)
+        await message_registry.publish(channel, "leaderboard", embed, view)
 
     async def update_user_leaderboard_display(
         self,
@@ -316,13 +311,7 @@ class LeaderboardCog(commands.Cog):
         page = user_prefs.page
         page_size = user_prefs.page_size
 
-        all_players = await get_leaderboard_page(rank_group, 1, 1000)
-        sorted_players = sorted(all_players, key=lambda x: x.points, reverse=True)
-
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        players = sorted_players[start_idx:end_idx]
-        total_pages = max(1, (len(sorted_players) + page_size - 1) // page_size)
+        total_pages = max(1, await get_total_pages(rank_group, page_size))
 
         if page > total_pages:
             user_prefs.page = total_pages
@@ -331,6 +320,9 @@ class LeaderboardCog(commands.Cog):
             user_prefs.page = 1
             page = 1
 
+        start_idx = (page - 1) * page_size
+        players = await get_leaderboard_page(rank_group, page, page_size)
+
         rank_group_colors = {
             "iron-plat": discord.Color.blue(),
             "dia-asc": discord.Color.green(),
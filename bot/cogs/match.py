@@ -5,6 +5,7 @@ from datetime import datetime
 import asyncio
 import random
 from models.queue import QueueEntry
+from models.match import Match
 from utils.db import (
     update_match_defense,
     get_match,
@@ -14,17 +15,13 @@ from utils.db import (
 )
 from utils.db import (
     create_match as create_match_db,
-    get_next_match_id,
     calculate_mmr_points,
 )
 from utils.db import (
-    get_leaderboard_page,
-    update_leaderboard,
-    get_leaderboard,
-    get_player,
+    get_leaderboard_entries,
+    settle_match,
 )
 from utils.db import update_match_result, add_admin_log
-from models.leaderboard import LeaderboardEntry
 from .leaderboard import LeaderboardCog
 import time
 
@@ -389,16 +386,11 @@ class CaptainVotingView(discord.ui.View):
         await self.start_team_selection()
 
     async def get_highest_rated_captains(self):
-        leaderboard = await get_leaderboard(self.rank_group)
         player_ids = [p.discord_id for p in self.players]
-
-        leaderboard_players = []
-        for player in leaderboard.players:
-            if player.discord_id in player_ids:
-                leaderboard_players.append(player)
+        entries = await get_leaderboard_entries(self.rank_group, player_ids)
 
         sorted_leaderboard_players = sorted(
-            leaderboard_players, key=lambda x: x.points, reverse=True
+            entries.values(), key=lambda x: x.points, reverse=True
         )
 
         if len(sorted_leaderboard_players) >= 2:
@@ -1396,8 +1388,9 @@ class ScoreSubmissionView(discord.ui.View):
     async def get_mmr_points_with_averages(self):
         try:
             match = await get_match(self.match_id)
-            leaderboard = await get_leaderboard(match.rank_group)
-            current_entries = {str(p.discord_id): p for p in leaderboard.players}
+            current_entries = await get_leaderboard_entries(
+                match.rank_group, self.red_team + self.blue_team
+            )
 
             red_team_points = []
             blue_team_points = []
@@ -1434,110 +1427,6 @@ class ScoreSubmissionView(discord.ui.View):
     def validate_score(self, score: int) -> bool:
         return 0 <= score <= 13
 
-    async def update_leaderboard_points(
-        self, interaction: discord.Interaction, winner: str
-    ):
-        match = await get_match(self.match_id)
-        rank_group = match.rank_group
-
-        leaderboard = await get_leaderboard(rank_group)
-        current_entries = {str(p.discord_id): p for p in leaderboard.players}
-        updated_entries = []
-
-        all_match_players = self.red_team + self.blue_team
-        player_ranks = {}
-        for player_id in all_match_players:
-            player = await get_player(player_id)
-            if player and player.rank:
-                player_ranks[player_id] = player.rank
-
-        red_team_points = []
-        blue_team_points = []
-
-        for player_id in self.red_team:
-            if player_id in current_entries:
-                red_team_points.append(current_entries[player_id].points)
-            else:
-                red_team_points.append(1000)
-
-        for player_id in self.blue_team:
-            if player_id in current_entries:
-                blue_team_points.append(current_entries[player_id].points)
-            else:
-                blue_team_points.append(1000)
-
-        red_avg = sum(red_team_points) / len(red_team_points)
-        blue_avg = sum(blue_team_points) / len(blue_team_points)
-
-        red_won = winner == "red"
-        red_points_change, blue_points_change = calculate_mmr_points(
-            red_avg, blue_avg, red_won
-        )
-
-        for player_id in self.red_team:
-            if player_id in current_entries:
-                entry = current_entries[player_id]
-                entry.points = max(0, entry.points + red_points_change)
-                entry.matches_played += 1
-                if red_won:
-                    entry.winrate = (
-                        entry.winrate * (entry.matches_played - 1) + 100
-                    ) / entry.matches_played
-                    entry.streak = max(0, entry.streak) + 1
-                else:
-                    entry.winrate = (
-                        entry.winrate * (entry.matches_played - 1)
-                    ) / entry.matches_played
-                    entry.streak = min(0, entry.streak) - 1
-            else:
-                new_points = 1000 + red_points_change
-                entry = LeaderboardEntry(
-                    discord_id=player_id,
-                    rank=player_ranks.get(player_id, "Unranked"),
-                    points=max(0, new_points),
-                    matches_played=1,
-                    winrate=100.0 if red_won else 0.0,
-                    streak=1 if red_won else -1,
-                )
-            updated_entries.append(entry)
-
-        for player_id in self.blue_team:
-            if player_id in current_entries:
-                entry = current_entries[player_id]
-                entry.points = max(0, entry.points + blue_points_change)
-                entry.matches_played += 1
-                if not red_won:
-                    entry.winrate = (
-                        entry.winrate * (entry.matches_played - 1) + 100
-                    ) / entry.matches_played
-                    entry.streak = max(0, entry.streak) + 1
-                else:
-                    entry.winrate = (
-                        entry.winrate * (entry.matches_played - 1)
-                    ) / entry.matches_played
-                    entry.streak = min(0, entry.streak) - 1
-            else:
-                new_points = 1000 + blue_points_change
-                entry = LeaderboardEntry(
-                    discord_id=player_id,
-                    rank=player_ranks.get(player_id, "Unranked"),
-                    points=max(0, new_points),
-                    matches_played=1,
-                    winrate=100.0 if not red_won else 0.0,
-                    streak=1 if not red_won else -1,
-                )
-            updated_entries.append(entry)
-
-        await update_leaderboard(rank_group, updated_entries)
-
-        history_cog = interaction.client.get_cog("HistoryCog")
-        if history_cog:
-            await history_cog.add_match_to_history(match)
-
-        leaderboard_cog = interaction.client.get_cog("LeaderboardCog")
-        if leaderboard_cog:
-            await leaderboard_cog.update_leaderboard()
-
     async def check_scores(self, interaction: discord.Interaction):
         if self.red_score is not None and self.blue_score is not None:
             if (
@@ -1596,16 +1485,33 @@ class ScoreSubmissionView(discord.ui.View):
             else:
                 red_score = self.red_score[0]
                 blue_score = self.red_score[1]
+                if red_score == blue_score:
+                    embed = discord.Embed(
+                        title="Invalid Score",
+                        description="A match cannot end in a draw.",
+                        color=discord.Color.red(),
+                    )
+                    await interaction.channel.send(embed=embed)
+                    self.red_score = None
+                    self.blue_score = None
+                    return
+
                 winner = "red" if red_score > blue_score else "blue"
 
-                await update_match_result(
-                    match_id=self.match_id,
-                    red_score=red_score,
-                    blue_score=blue_score,
-                    result=winner,
-                )
+                settled = await settle_match(self.match_id, red_score, blue_score)
+                if not settled:
+                    embed = discord.Embed(
+                        title="Settlement Failed",
+                        description="The match could not be settled. It may already have a result.",
+                        color=discord.Color.red(),
+                    )
+                    await interaction.channel.send(embed=embed)
+                    return
 
-                await self.update_leaderboard_points(interaction, winner)
+                match, _ = settled
+                history_cog = interaction.client.get_cog("HistoryCog")
+                if history_cog:
+                    await history_cog.add_match_to_history(match)
 
                 embed = discord.Embed(
                     title="Match Complete!",
@@ -1696,9 +1602,24 @@ class ScoreModal(discord.ui.Modal):
 
 
 async def create_match(
-    guild: discord.Guild, rank_group: str, players: List[QueueEntry], bot=None
+    guild: discord.Guild,
+    rank_group: str,
+    players: List[QueueEntry],
+    bot=None,
+    match: Optional[Match] = None,
 ):
-    match_id = await get_next_match_id()
+    # Matches popped from a queue by the API already have a record
+    if match is None:
+        temp_captains = [players[0].discord_id, players[1].discord_id]
+        match = await create_match_db(
+            players_red=[],
+            players_blue=[],
+            captain_red=temp_captains[0],
+            captain_blue=temp_captains[1],
+            lobby_master=temp_captains[0],
+            rank_group=rank_group,
+        )
+    match_id = match.match_id
 
     matches_parent_category = discord.utils.get(guild.categories, name="Matches")
     if not matches_parent_category:
@@ -1725,19 +1646,6 @@ async def create_match(
         name="Lobby", user_limit=10, overwrites=overwrites
     )
 
-    temp_captains = [players[0].discord_id, players[1].discord_id]
-    lobby_master = temp_captains[0]
-
-    await create_match_db(
-        match_id=match_id,
-        players_red=[],
-        players_blue=[],
-        captain_red=temp_captains[0],
-        captain_blue=temp_captains[1],
-        lobby_master=lobby_master,
-        rank_group=rank_group,
-    )
-
     match_cog = bot.get_cog("MatchCog") if bot else None
     afk_view = AFKCheckView(match_id, players, rank_group, match_vc, match_cog)
 
@@ -2,24 +2,28 @@ import discord
 from discord.ext import commands, tasks
 from discord import app_commands
 from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
 import os
+import time
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
 from models.queue import QueueEntry, Queue
 from utils.db import (
     get_player,
-    add_to_queue,
+    join_queue,
     get_queue,
     remove_player_from_queue,
     create_player,
     update_queue,
     clear_queue,
     delete_test_bots,
-    is_player_banned,
-    is_player_timeout,
+    batch_check_players,
     is_player_in_match,
 )
+from utils.click_queue import ClickQueue
+from utils.message_registry import message_registry
 from utils.rate_limit import rate_limiter
 from utils.constants import (
     RankGroup,
@@ -37,6 +41,185 @@ GUILD_ID = int(os.getenv("DISCORD_GUILD_ID"))
 logger = logging.getLogger("valohub")
 
 
+# Minimum time between two edits of the same queue message
+RENDER_INTERVAL_SECONDS = 1.5
+
+RANK_GROUP_COLORS = {
+    "iron-plat": discord.Color.blue(),
+    "dia-asc": discord.Color.green(),
+    "imm-radiant": discord.Color.red(),
+}
+
+
+def queue_role(rank_group: str) -> str:
+    """Key of a queue's message in the message registry."""
+    return f"queue:{rank_group}"
+
+
+def build_queue_embed(rank_group: str, queue: Queue) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"{rank_group.upper()} Queue", color=RANK_GROUP_COLORS[rank_group]
+    )
+
+    progress = min(len(queue.players) * 10, 100)
+    progress_bar = "▰" * (progress // 10) + "▱" * ((100 - progress) // 10)
+    embed.add_field(
+        name="Queue Status",
+        value=f"`{progress_bar}` {len(queue.players)}/10",
+        inline=False,
+    )
+
+    if queue.players:
+        players_list = "\n".join([f"• <@{p.discord_id}>" for p in queue.players])
+        embed.add_field(name="Players", value=players_list, inline=False)
+    else:
+        embed.add_field(name="Players", value="Queue is empty", inline=False)
+
+    embed.set_footer(text="Click the button below to join/leave the queue")
+    return embed
+
+
+async def _reply(interaction: discord.Interaction, message: str):
+    try:
+        await interaction.followup.send(message, ephemeral=True)
+    except discord.HTTPException as e:
+        logger.error(f"Failed to send queue click response: {e}")
+
+
+async def process_queue_clicks(
+    rank_group: str, interactions: List[discord.Interaction]
+):
+    """
+    Apply a batch of deferred queue button clicks in order. Each click joins
+    or leaves the queue depending on whether the player is in it when that
+    click's turn comes.
+
+    The queue cooldown is charged when a click is accepted; it is refunded to
+    every player whose clicks did not change the queue.
+    """
+    replied: Set[int] = set()
+    charged: Set[str] = set()
+    try:
+        await _apply_queue_clicks(rank_group, interactions, replied, charged)
+    except Exception as e:
+        # The clicks are deferred, so without a followup they keep "thinking"
+        for interaction in interactions:
+            if interaction.id not in replied:
+                await _reply(
+                    interaction, f"An error occurred while processing your click: {e}"
+                )
+        raise
+    finally:
+        for user_id in {str(i.user.id) for i in interactions} - charged:
+            rate_limiter.clear_cooldown(user_id, "queue")
+
+
+async def _apply_queue_clicks(
+    rank_group: str,
+    interactions: List[discord.Interaction],
+    replied: Set[int],
+    charged: Set[str],
+):
+    async def reply(interaction: discord.Interaction, message: str):
+        replied.add(interaction.id)
+        await _reply(interaction, message)
+
+    user_ids = list(dict.fromkeys(str(i.user.id) for i in interactions))
+    players = await asyncio.gather(*(get_player(u) for u in user_ids))
+    registered = [u for u, player in zip(user_ids, players) if player]
+    (bans, timeouts), in_match = await asyncio.gather(
+        batch_check_players(registered),
+        asyncio.gather(*(is_player_in_match(u) for u in registered)),
+    )
+    playing = {u for u, busy in zip(registered, in_match) if busy}
+
+    queue = await get_queue(rank_group)
+    changed = False
+    pops = []
+
+    for interaction in interactions:
+        user_id = str(interaction.user.id)
+        if user_id not in registered:
+            await reply(
+                interaction, "You need to register first using `/rank` command!"
+            )
+            continue
+        if bans.get(user_id, False):
+            await reply(interaction, "You are banned from the queue system!")
+            continue
+        if timeouts.get(user_id, False):
+            await reply(interaction, "You are in timeout and cannot join the queue!")
+            continue
+        if user_id in playing:
+            await reply(
+                interaction,
+                "You are currently in an active match and cannot join the queue!",
+            )
+            continue
+
+        if any(p.discord_id == user_id for p in queue.players):
+            try:
+                queue = await remove_player_from_queue(rank_group, user_id)
+                changed = True
+                charged.add(user_id)
+                await reply(interaction, "You have left the queue!")
+            except ValueError as e:
+                await reply(interaction, f"❌ {str(e)}")
+            except Exception as e:
+                await reply(
+                    interaction, f"An error occurred while leaving the queue: {str(e)}"
+                )
+            continue
+
+        try:
+            queue, popped_match, matched_players = await join_queue(rank_group, user_id)
+            changed = True
+            charged.add(user_id)
+            await reply(interaction, "You have joined the queue!")
+        except ValueError as e:
+            await reply(interaction, f"❌ {str(e)}")
+            continue
+        except Exception as e:
+            await reply(
+                interaction, f"An error occurred while joining the queue: {str(e)}"
+            )
+            continue
+
+        if popped_match:
+            # Later clicks in this batch by the popped players are not re-joins
+            playing.update(p.discord_id for p in matched_players)
+            pops.append((popped_match, matched_players))
+
+    if not changed:
+        return
+
+    guild = interactions[0].guild
+    client = interactions[0].client
+    queue_cog = client.get_cog("QueueCog")
+    if queue_cog:
+        await queue_cog.update_queue_message(guild, rank_group, queue)
+
+    # Setting up a match takes a while; the next clicks should not wait for it
+    for popped_match, matched_players in pops:
+        task = asyncio.create_task(
+            create_match(guild, rank_group, matched_players, client, match=popped_match)
+        )
+        _match_setups.add(task)
+        task.add_done_callback(_match_setup_done)
+
+
+_match_setups: Set[asyncio.Task] = set()
+
+
+def _match_setup_done(task: asyncio.Task):
+    _match_setups.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Error setting up popped match: {task.exception()}")
+
+
+click_queue = ClickQueue(process_queue_clicks)
+
+
 class QueueView(discord.ui.View):
     def __init__(self, rank_group: str):
         super().__init__(timeout=None)
@@ -50,9 +233,7 @@ class QueueView(discord.ui.View):
     async def join_button(
         self, interaction: discord.Interaction, button: discord.ui.Button
     ):
-        current_time = datetime.now(timezone.utc)
         user_id = str(interaction.user.id)
-        matched_players = []
 
         is_limited, remaining = rate_limiter.is_rate_limited(user_id, "queue")
         if is_limited:
@@ -61,123 +242,37 @@ class QueueView(discord.ui.View):
                 ephemeral=True,
             )
             return
+        # Set before the click is processed so double clicks are not queued twice;
+        # refunded by process_queue_clicks if the click does not change the queue
+        rate_limiter.update_cooldown(user_id, "queue")
 
-        try:
-            player = await get_player(user_id)
-            if not player:
-                await interaction.response.send_message(
-                    "You need to register first using `/rank` command!", ephemeral=True
-                )
-                return
-
-            if await is_player_banned(user_id):
-                await interaction.response.send_message(
-                    "You are banned from the queue system!", ephemeral=True
-                )
-                return
-
-            if await is_player_timeout(user_id):
-                await interaction.response.send_message(
-                    "You are in timeout and cannot join the queue!", ephemeral=True
-                )
-                return
-
-            if await is_player_in_match(user_id):
-                await interaction.response.send_message(
-                    "You are currently in an active match and cannot join the queue!",
-                    ephemeral=True,
-                )
-                return
-
-            rate_limiter.update_cooldown(user_id, "queue")
-
-            queue = await get_queue(self.rank_group)
-            player_in_queue = any(p.discord_id == user_id for p in queue.players)
-
-            if player_in_queue:
-                try:
-                    queue = await remove_player_from_queue(self.rank_group, user_id)
-                    await interaction.response.send_message(
-                        "You have left the queue!", ephemeral=True
-                    )
-                except ValueError as e:
-                    await interaction.response.send_message(
-                        f"❌ {str(e)}", ephemeral=True
-                    )
-                    return
-                except Exception as e:
-                    await interaction.response.send_message(
-                        f"An error occurred while leaving the queue: {str(e)}",
-                        ephemeral=True,
-                    )
-                    return
-            else:
-                try:
-                    queue = await add_to_queue(self.rank_group, user_id)
-                    await interaction.response.send_message(
-                        "You have joined the queue!", ephemeral=True
-                    )
-                except ValueError as e:
-                    await interaction.response.send_message(
-                        f"❌ {str(e)}", ephemeral=True
-                    )
-                    return
-                except Exception as e:
-                    await interaction.response.send_message(
-                        f"An error occurred while joining the queue: {str(e)}",
-                        ephemeral=True,
-                    )
-                    return
-
-            if len(queue.players) >= 10:
-                matched_players = queue.players[:10]
-                for player in matched_players:
-                    try:
-                        queue = await remove_player_from_queue(
-                            self.rank_group, player.discord_id
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Error removing matched player from queue: {str(e)}"
-                        )
-
-            queue = await get_queue(self.rank_group)
-            queue_cog = interaction.client.get_cog("QueueCog")
-            if queue_cog:
-                await queue_cog.update_queue_message(
-                    interaction.guild, self.rank_group, queue
-                )
-
-            if matched_players:
-                await create_match(
-                    interaction.guild,
-                    self.rank_group,
-                    matched_players,
-                    interaction.client,
-                )
-
-        except Exception as e:
-            try:
-                if interaction.response.is_done():
-                    await interaction.followup.send(
-                        f"An error occurred: {str(e)}", ephemeral=True
-                    )
-                else:
-                    await interaction.response.send_message(
-                        f"An error occurred: {str(e)}", ephemeral=True
-                    )
-            except Exception as send_err:
-                logger.error(f"Failed to send error response: {send_err}")
+        # Acknowledge within Discord's deadline; the result comes as a followup
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        if not click_queue.submit(self.rank_group, interaction):
+            rate_limiter.clear_cooldown(user_id, "queue")
+            await _reply(interaction, "The queue is busy, please try again shortly!")
 
 
 class QueueCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.bot.add_listener(self.on_ready)
+        # Queue message handles and the embeds last drawn on them
+        self._queue_messages: Dict[str, discord.Message] = {}
+        self._rendered: Dict[str, dict] = {}
+        # Latest queue waiting to be drawn and the task drawing it
+        self._latest: Dict[str, Tuple[discord.Guild, Queue]] = {}
+        self._renderers: Dict[str, asyncio.Task] = {}
+        self._last_edit: Dict[str, float] = {}
 
     async def on_ready(self):
         await self.setup_existing_queues()
 
+    async def cog_unload(self):
+        await click_queue.stop()
+        for task in self._renderers.values():
+            task.cancel()
+
     async def setup_existing_queues(self):
         guild = self.bot.get_guild(GUILD_ID)
         if not guild:
@@ -192,52 +287,21 @@ class QueueCog(commands.Cog):
             RankGroup.DIA_ASC.value,
             RankGroup.IMM_RADIANT.value,
         ]
-        for rank_group in rank_groups:
-            channel = discord.utils.get(category.channels, name=f"queue-{rank_group}")
-            if channel:
-                async for message in channel.history(limit=None):
-                    try:
-                        await message.delete()
-                    except discord.NotFound:
-                        pass
-
-                queue = await get_queue(rank_group) or Queue(
-                    rank_group=rank_group, players=[]
-                )
-                view = QueueView(rank_group)
-
-                rank_group_colors = {
-                    "iron-plat": discord.Color.blue(),
-                    "dia-asc": discord.Color.green(),
-                    "imm-radiant": discord.Color.red(),
-                }
-
-                embed = discord.Embed(
-                    title=f"{rank_group.upper()} Queue",
-                    color=rank_group_colors[rank_group],
-                )
 
-                progress = min(len(queue.players) * 10, 100)
-                progress_bar = "▰" * (progress // 10) + "▱" * ((100 - progress) // 10)
-                embed.add_field(
-                    name="Queue Status",
-                    value=f"`{progress_bar}` {len(queue.players)}/10",
-                    inline=False,
-                )
-
-                if queue.players:
-                    players_list = "\n".join(
-                        [f"• <@{p.discord_id}>" for p in queue.players]
-                    )
-                    embed.add_field(name="Players", value=players_list, inline=False)
-                else:
-                    embed.add_field(
-                        name="Players", value="Queue is empty", inline=False
-                    )
-
-                embed.set_footer(text="Click the button below to join/leave the queue")
+        async def restore(rank_group: str):
+            channel = discord.utils.get(category.channels, name=f"queue-{rank_group}")
+            if not channel:
+                return
+            queue = await get_queue(rank_group) or Queue(
+                rank_group=rank_group, players=[]
+            )
+            embed = build_queue_embed(rank_group, queue)
+            message = await message_registry.publish(
+                channel, queue_role(rank_group), embed, QueueView(rank_group)
+            )
+            await self._remember_message(rank_group, message, embed)
 
-                await channel.send(embed=embed, view=view)
+        await asyncio.gather(*(restore(rank_group) for rank_group in rank_groups))
 
     @app_commands.command(name="test_queue")
     @app_commands.default_permissions(administrator=True)
@@ -314,6 +378,7 @@ class QueueCog(commands.Cog):
             embed.set_footer(text="Click the button below to join/leave the queue")
 
             await message.edit(embed=embed, view=QueueView("imm-radiant"))
+            self._rendered.pop("imm-radiant", None)
             break
 
         await interaction.followup.send(
@@ -358,37 +423,9 @@ class QueueCog(commands.Cog):
             queue = await get_queue(rank_group) or Queue(
                 rank_group=rank_group, players=[]
             )
-            view = QueueView(rank_group)
-
-            rank_group_colors = {
-                "iron-plat": discord.Color.blue(),
-                "dia-asc": discord.Color.green(),
-                "imm-radiant": discord.Color.red(),
-            }
-
-            embed = discord.Embed(
-                title=f"{rank_group.upper()} Queue", color=rank_group_colors[rank_group]
-            )
-
-            progress = min(len(queue.players) * 10, 100)
-            progress_bar = "▰" * (progress // 10) + "▱" * ((100 - progress) // 10)
-            embed.add_field(
-                name="Queue Status",
-                value=f"`{progress_bar}` {len(queue.players)}/10",
-                inline=False,
-            )
-
-            if queue.players:
-                players_list = "\n".join(
-                    [f"• <@{p.discord_id}>" for p in queue.players]
-                )
-                embed.add_field(name="Players", value=players_list, inline=False)
-            else:
-                embed.add_field(name="Players", value="Queue is empty", inline=False)
-
-            embed.set_footer(text="Click the button below to join/leave the queue")
-
-            await channel.send(embed=embed, view=view)
+            embed = build_queue_embed(rank_group, queue)
+            message = await channel.send(embed=embed, view=QueueView(rank_group))
+            await self._remember_message(rank_group, message, embed)
 
         await interaction.followup.send(
             "✅ Queue channels have been set up!", ephemeral=True
@@ -471,89 +508,52 @@ class QueueCog(commands.Cog):
     async def update_queue_message(
         self, guild: discord.Guild, rank_group: str, queue: Queue
     ):
-        try:
-            category = discord.utils.get(guild.categories, name="Hub")
-            if not category:
-                return
-
-            channel_name = f"queue-{rank_group}"
-            channel = discord.utils.get(category.channels, name=channel_name)
-
-            messages = [msg async for msg in channel.history(limit=1)]
-            if not messages:
-                view = QueueView(rank_group)
-                rank_group_colors = {
-                    "iron-plat": discord.Color.blue(),
-                    "dia-asc": discord.Color.green(),
-                    "imm-radiant": discord.Color.red(),
-                }
-
-                embed = discord.Embed(
-                    title=f"{rank_group.upper()} Queue",
-                    color=rank_group_colors[rank_group],
-                )
-
-                progress = min(len(queue.players) * 10, 100)
-                progress_bar = "▰" * (progress // 10) + "▱" * ((100 - progress) // 10)
-                embed.add_field(
-                    name="Queue Status",
-                    value=f"`{progress_bar}` {len(queue.players)}/10",
-                    inline=False,
-                )
-
-                if queue.players:
-                    players_list = "\n".join(
-                        [f"• <@{p.discord_id}>" for p in queue.players]
-                    )
-                    embed.add_field(name="Players", value=players_list, inline=False)
-                else:
-                    embed.add_field(
-                        name="Players", value="Queue is empty", inline=False
-                    )
-
-                embed.set_footer(text="Click the button below to join/leave the queue")
-
-                await channel.send(embed=embed, view=view)
-                return
-
-            message = messages[0]
-            rank_group_colors = {
-                "iron-plat": discord.Color.blue(),
-                "dia-asc": discord.Color.green(),
-                "imm-radiant": discord.Color.red(),
-            }
-
-            embed = discord.Embed(
-                title=f"{rank_group.upper()} Queue", color=rank_group_colors[rank_group]
+        """
+        Schedule a redraw of a queue message. Updates within
+        RENDER_INTERVAL_SECONDS of the last edit are coalesced and the latest
+        queue is drawn; an edit that would not change the embed is skipped.
+        """
+        self._latest[rank_group] = (guild, queue)
+        if rank_group not in self._renderers:
+            self._renderers[rank_group] = asyncio.create_task(
+                self._render_loop(rank_group)
             )
 
-            progress = min(len(queue.players) * 10, 100)
-            progress_bar = "▰" * (progress // 10) + "▱" * ((100 - progress) // 10)
-            embed.add_field(
-                name="Queue Status",
-                value=f"`{progress_bar}` {len(queue.players)}/10",
-                inline=False,
-            )
-
-            if queue.players:
-                players_list = "\n".join(
-                    [f"• <@{p.discord_id}>" for p in queue.players]
+    async def _render_loop(self, rank_group: str):
+        try:
+            while rank_group in self._latest:
+                wait = (
+                    self._last_edit.get(rank_group, 0.0)
+                    + RENDER_INTERVAL_SECONDS
+                    - time.monotonic()
                 )
-                embed.add_field(name="Players", value=players_list, inline=False)
-            else:
-                embed.add_field(name="Players", value="Queue is empty", inline=False)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                guild, queue = self._latest.pop(rank_group)
+                await self._render(guild, rank_group, queue)
+        finally:
+            del self._renderers[rank_group]
+
+    async def _render(self, guild: discord.Guild, rank_group: str, queue: Queue):
+        embed = build_queue_embed(rank_group, queue)
+        if embed.to_dict() == self._rendered.get(rank_group):
+            return
 
-            embed.set_footer(text="Click the button below to join/leave the queue")
+        try:
+            message = await self._queue_message(guild, rank_group)
+            if message is not None:
+                try:
+                    await message.edit(embed=embed)
+                    self._rendered[rank_group] = embed.to_dict()
+                    return
+                except discord.NotFound:
+                    self._queue_messages.pop(rank_group, None)
 
-            view = QueueView(rank_group)
-            try:
-                await message.edit(embed=embed, view=view)
-            except discord.NotFound:
-                await channel.send(embed=embed, view=view)
-            except discord.Forbidden:
-                logger.error(f"No permission to edit message in {rank_group}")
-            except Exception as e:
-                logger.error(f"Error updating queue message for {rank_group}: {e}")
+            channel = self._queue_channel(guild, rank_group)
+            if not channel:
+                return
+            message = await channel.send(embed=embed, view=QueueView(rank_group))
+            await self._remember_message(rank_group, message, embed)
 
         except discord.NotFound:
             logger.warning(f"Queue message not found for {rank_group}")
@@ -561,6 +561,46 @@ class QueueCog(commands.Cog):
             logger.error(f"No permission to edit queue message in {rank_group}")
         except Exception as e:
             logger.error(f"Error updating queue message for {rank_group}: {e}")
+        finally:
+            self._last_edit[rank_group] = time.monotonic()
+
+    def _queue_channel(
+        self, guild: discord.Guild, rank_group: str
+    ) -> Optional[discord.TextChannel]:
+        category = discord.utils.get(guild.categories, name="Hub")
+        if not category:
+            return None
+        return discord.utils.get(category.channels, name=f"queue-{rank_group}")
+
+    async def _queue_message(
+        self, guild: discord.Guild, rank_group: str
+    ) -> Optional[discord.Message]:
+        """The queue's message, looked up once and then reused."""
+        message = self._queue_messages.get(rank_group)
+        if message is not None:
+            return message
+
+        message = await message_registry.fetch(guild, queue_role(rank_group))
+        if message is not None:
+            self._queue_messages[rank_group] = message
+            return message
+
+        channel = self._queue_channel(guild, rank_group)
+        if not channel:
+            return None
+        messages = [msg async for msg in channel.history(limit=1)]
+        if not messages:
+            return None
+        self._queue_messages[rank_group] = messages[0]
+        await message_registry.remember(queue_role(rank_group), messages[0])
+        return messages[0]
+
+    async def _remember_message(
+        self, rank_group: str, message: discord.Message, embed: discord.Embed
+    ):
+        self._queue_messages[rank_group] = message
+        self._rendered[rank_group] = embed.to_dict()
+        await message_registry.remember(queue_role(rank_group), message)
 
 
 async def setup(bot):
@@ -8,6 +8,7 @@ from typing import Optional
 
 from utils.db import get_player, create_player, update_player_rank
 from utils.rate_limit import rate_limiter
+from utils.message_registry import message_registry
 from utils.permissions import check_player_status
 
 load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
@@ -651,11 +652,6 @@ class Rank(commands.Cog):
                         view_channel=True, send_messages=False
                     )
             await channel.edit(overwrites=overwrites)
-            async for message in channel.history(limit=None):
-                try:
-                    await message.delete()
-                except discord.NotFound:
-                    pass
 
             embed = discord.Embed(
                 title="Valorant Rank Verification",
@@ -691,7 +687,7 @@ class Rank(commands.Cog):
             embed.set_footer(text="Need help? Contact an admin!")
 
             view = RankView()
-            await channel.send(embed=embed, view=view)
+            await message_registry.publish(channel, "rank", embed, view)
 
     @app_commands.command(name="setup_rank")
     @app_commands.default_permissions(administrator=True)
@@ -766,7 +762,7 @@ class Rank(commands.Cog):
             embed.set_footer(text="Need help? Contact an admin!")
 
             view = RankView()
-            await channel.send(embed=embed, view=view)
+            await message_registry.publish(channel, "rank", embed, view)
 
             await interaction.followup.send(
                 f"✅ Rank verification channel setup complete! Check {channel.mention}",
@@ -2,11 +2,12 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from utils.db import (
-    get_player_rank,
-    get_leaderboard_page,
+    get_player_position,
+    is_player_banned,
     get_player,
     get_player_match_history,
 )
+from utils.message_registry import message_registry
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -95,7 +96,6 @@ class StatsCog(commands.Cog):
         )
 
     async def update_stats_display(self, channel: discord.TextChannel):
-        await channel.purge()
         embed = discord.Embed(
             title="Player Statistics",
             description="Click a button below to view statistics!",
@@ -106,7 +106,7 @@ class StatsCog(commands.Cog):
         view.add_item(ShowMyStatsButton(self))
         view.add_item(SearchStatsButton(self))
         view.add_item(ShowHistoryButton(self))
-        await channel.send(embed=embed, view=view)
+        await message_registry.publish(channel, "stats", embed, view)
 
 
 class ShowMyStatsButton(discord.ui.Button):
@@ -144,21 +144,16 @@ class ShowMyStatsButton(discord.ui.Button):
             )
             return
 
-        player = await get_player_rank(rank_group, target_id)
-        if not player:
+        ranked = None
+        if not await is_player_banned(target_id):
+            ranked = await get_player_position(rank_group, target_id)
+        if not ranked:
             await interaction.followup.send(
                 f"{target_user.mention} hasn't played any matches yet!", ephemeral=True
             )
             return
 
-        all_players = await get_leaderboard_page(rank_group, 1, 1000)
-        sorted_players = sorted(all_players, key=lambda x: x.points, reverse=True)
-
-        position = None
-        for i, p in enumerate(sorted_players, start=1):
-            if p.discord_id == player.discord_id:
-                position = i
-                break
+        position, _, player = ranked
 
         embed = discord.Embed(
             title=f"Player Statistics - {target_user.display_name}",
@@ -402,21 +397,16 @@ class SearchStatsModal(discord.ui.Modal, title="Search Player Stats"):
             )
             return
 
-        player = await get_player_rank(rank_group, target_id)
-        if not player:
+        ranked = None
+        if not await is_player_banned(target_id):
+            ranked = await get_player_position(rank_group, target_id)
+        if not ranked:
             await interaction.followup.send(
                 f"{found_user.mention} hasn't played any matches yet!", ephemeral=True
             )
             return
 
-        all_players = await get_leaderboard_page(rank_group, 1, 1000)
-        sorted_players = sorted(all_players, key=lambda x: x.points, reverse=True)
-
-        position = None
-        for i, p in enumerate(sorted_players, start=1):
-            if p.discord_id == player.discord_id:
-                position = i
-                break
+        position, _, player = ranked
 
         embed = discord.Embed(
             title=f"Player Statistics - {found_user.display_name}",
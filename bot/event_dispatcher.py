@@ -0,0 +1,181 @@
+"""
+Concurrent dispatch of WebSocket events to their handlers.
+
+Each event goes to a worker for its key: the queue, leaderboard, match or
+player it is about. Workers for different keys run concurrently, so a slow
+Discord edit for one match does not hold back queue updates. Events with the
+same key are still handled in the order they arrived. The socket read loop
+only enqueues, so it keeps answering pings while handlers run.
+
+Pending events are bounded per key. An event carrying full state (a
+leaderboard update, a queue snapshot) replaces the pending events of the
+same type and key instead of queueing behind them.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger("valohub")
+
+# Events waiting per key before new ones are dropped
+MAX_PENDING_PER_KEY = 256
+
+# Handlers slower than this are logged
+SLOW_HANDLER_SECONDS = 2.0
+
+# How often handler and backlog metrics are logged
+METRICS_LOG_INTERVAL_SECONDS = 300
+
+Event = Dict[str, Any]
+
+
+def event_key(event: Event) -> str:
+    """Ordering key of an event; events with the same key run one at a time."""
+    event_type = event.get("type")
+    if event_type in ("queue_update", "queue_popped"):
+        return f"queue:{event.get('rank_group')}"
+    if event_type == "leaderboard_update":
+        return f"leaderboard:{event.get('rank_group')}"
+    if event.get("match_id"):
+        return f"match:{event['match_id']}"
+    if event_type == "player_updated":
+        return f"player:{event.get('discord_id')}"
+    return event_type or ""
+
+
+def supersedes(event: Event) -> bool:
+    """Whether an event makes pending events of the same type and key obsolete."""
+    event_type = event.get("type")
+    if event_type == "leaderboard_update":
+        return True
+    return event_type == "queue_update" and event.get("snapshot") is not None
+
+
+class HandlerStats:
+    __slots__ = ("count", "errors", "total", "slowest")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.slowest = 0.0
+
+    def record(self, seconds: float, failed: bool):
+        self.count += 1
+        self.errors += failed
+        self.total += seconds
+        self.slowest = max(self.slowest, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0,
+            "max_ms": round(self.slowest * 1000, 1),
+        }
+
+
+class EventDispatcher:
+    """Runs an event handler on per-key ordered worker queues."""
+
+    def __init__(
+        self,
+        handle: Callable[[Event], Awaitable[None]],
+        max_pending: int = MAX_PENDING_PER_KEY,
+    ):
+        self._handle = handle
+        self.max_pending = max_pending
+        self._pending: Dict[str, Deque[Event]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._stats: Dict[str, HandlerStats] = {}
+        self._reporter: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.coalesced = 0
+
+    def submit(self, event: Event) -> bool:
+        """Queue an event for its key's worker. Returns False if it was dropped."""
+        key = event_key(event)
+        pending = self._pending.setdefault(key, deque())
+
+        if supersedes(event) and pending:
+            kept = [e for e in pending if e.get("type") != event.get("type")]
+            self.coalesced += len(pending) - len(kept)
+            pending.clear()
+            pending.extend(kept)
+
+        if len(pending) >= self.max_pending:
+            self.dropped += 1
+            logger.warning(f"Event backlog full for {key}, dropped {event.get('type')}")
+            return False
+
+        pending.append(event)
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._work(key))
+        return True
+
+    async def _work(self, key: str):
+        pending = self._pending[key]
+        try:
+            while pending:
+                event = pending.popleft()
+                event_type = event.get("type", "")
+                started = time.monotonic()
+                failed = False
+                try:
+                    await self._handle(event)
+                except Exception as e:
+                    failed = True
+                    logger.error(f"Error handling {event_type}: {e}", exc_info=True)
+                elapsed = time.monotonic() - started
+                self._stats.setdefault(event_type, HandlerStats()).record(
+                    elapsed, failed
+                )
+                if elapsed > SLOW_HANDLER_SECONDS:
+                    logger.warning(
+                        f"Slow {event_type} handler for {key}: {elapsed:.1f}s "
+                        f"({len(pending)} pending)"
+                    )
+        finally:
+            # Idle keys are dropped so one-off match keys do not accumulate
+            del self._workers[key]
+            if not pending:
+                del self._pending[key]
+
+    def metrics(self) -> dict:
+        """Backlog and per event type handler latency."""
+        depths: List[int] = [len(p) for p in self._pending.values()]
+        return {
+            "workers": len(self._workers),
+            "pending": sum(depths),
+            "max_pending": max(depths, default=0),
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "handlers": {t: s.as_dict() for t, s in self._stats.items()},
+        }
+
+    async def _report_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(METRICS_LOG_INTERVAL_SECONDS)
+                if self._stats:
+                    logger.info(f"WebSocket dispatcher metrics: {self.metrics()}")
+        except asyncio.CancelledError:
+            pass
+
+    def start(self):
+        if self._reporter is None:
+            self._reporter = asyncio.create_task(self._report_loop())
+
+    async def stop(self):
+        """Cancel the workers and drop pending events."""
+        tasks = list(self._workers.values())
+        if self._reporter is not None:
+            tasks.append(self._reporter)
+            self._reporter = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
@@ -1,6 +1,10 @@
 import httpx
+import asyncio
+import copy
+import importlib.util
+import logging
 import os
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Hashable, Tuple, Union
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -10,119 +14,146 @@ load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
 API_BASE_URL = os.getenv("API_BASE_URL")
 BOT_API_TOKEN = os.getenv("BOT_API_TOKEN")
 
+# HTTP/2 multiplexes concurrent requests over one connection; needs the h2
+# package (pip install httpx[http2])
+API_HTTP2 = os.getenv("API_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# One pool of keep-alive connections shared by every request
+POOL_LIMITS = httpx.Limits(
+    max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0
+)
+REQUEST_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+logger = logging.getLogger("valohub")
+
 APIResponse = Dict[str, Any]
 RequestParams = Optional[Dict[str, Any]]
 RequestBody = Dict[str, Any]
+RequestKey = Tuple[str, Tuple[Tuple[str, str], ...], Hashable]
+
+
+def _http2_available() -> bool:
+    if not API_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("API_HTTP2 is set but h2 is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def _error_detail(response: httpx.Response) -> str:
+    try:
+        detail = response.json().get("detail")
+    except (ValueError, AttributeError):
+        detail = None
+    return detail if isinstance(detail, str) else response.reason_phrase
 
 
 class APIClient:
     def __init__(self) -> None:
         self.base_url: str = API_BASE_URL
         self.headers: Dict[str, str] = {"Authorization": f"Bot {BOT_API_TOKEN}"}
+        self._client: Optional[httpx.AsyncClient] = None
+        # Shared GET requests in flight, by endpoint and params
+        self._inflight: Dict[RequestKey, asyncio.Task] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created on first use so that it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                limits=POOL_LIMITS,
+                timeout=REQUEST_TIMEOUT,
+                http2=_http2_available(),
+            )
+        return self._client
 
-    async def get(self, endpoint: str, params: RequestParams = None) -> APIResponse:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{self.base_url}{endpoint}",
-                    headers=self.headers,
-                    params=params,
-                    timeout=10.0,
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 404:
-                    raise ValueError(f"Resource not found: {endpoint}")
-                if status == 429:
-                    raise ValueError("Too many requests. Please try again shortly.")
-                raise
-            except httpx.RequestError as e:
-                raise ConnectionError(f"Failed to connect to API: {e}")
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        params: RequestParams = None,
+        data: Optional[RequestBody] = None,
+    ) -> APIResponse:
+        try:
+            response = await self._get_client().request(
+                method, f"{self.base_url}{endpoint}", params=params, json=data
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if status == 404:
+                raise ValueError(f"Resource not found: {endpoint}")
+            if status == 409:
+                raise ValueError(f"Resource already exists: {endpoint}")
+            if status == 429:
+                raise ValueError("Too many requests. Please try again shortly.")
+            if status in (400, 403):
+                raise ValueError(_error_detail(e.response))
+            raise
+        except httpx.RequestError as e:
+            raise ConnectionError(f"Failed to connect to API: {e}")
+
+    async def get(
+        self,
+        endpoint: str,
+        params: RequestParams = None,
+        shared: bool = False,
+        share_key: Hashable = None,
+    ) -> APIResponse:
+        """
+        GET an endpoint. With `shared`, concurrent identical GETs make a
+        single request: callers arriving while it is in flight wait for it
+        and get a copy of its result (or its error). Nothing is kept once it
+        completes, so results are never staler than a direct request.
+
+        Only callers passing the same `share_key` share a request. Cache reads
+        pass their key's generation, so a caller never joins a request that
+        was sent before the entry it wants was invalidated.
+        """
+        if not shared:
+            return await self._request("GET", endpoint, params=params)
+
+        key = (
+            endpoint,
+            tuple(sorted((k, str(v)) for k, v in (params or {}).items())),
+            share_key,
+        )
+        task = self._inflight.get(key)
+        if task is not None:
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task = asyncio.ensure_future(self._request("GET", endpoint, params=params))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded so that one caller giving up does not fail the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: RequestKey, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the error retrieved even if every caller was cancelled
+            task.exception()
 
     async def post(self, endpoint: str, data: RequestBody) -> APIResponse:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}{endpoint}",
-                    headers=self.headers,
-                    json=data,
-                    timeout=10.0,
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 409:
-                    raise ValueError(f"Resource already exists: {endpoint}")
-                if status == 429:
-                    raise ValueError("Too many requests. Please try again shortly.")
-                raise
-            except httpx.RequestError as e:
-                raise ConnectionError(f"Failed to connect to API: {e}")
+        return await self._request("POST", endpoint, data=data)
 
     async def patch(self, endpoint: str, data: RequestBody) -> APIResponse:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.patch(
-                    f"{self.base_url}{endpoint}",
-                    headers=self.headers,
-                    json=data,
-                    timeout=10.0,
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 404:
-                    raise ValueError(f"Resource not found: {endpoint}")
-                if status == 429:
-                    raise ValueError("Too many requests. Please try again shortly.")
-                raise
-            except httpx.RequestError as e:
-                raise ConnectionError(f"Failed to connect to API: {e}")
+        return await self._request("PATCH", endpoint, data=data)
 
     async def put(self, endpoint: str, data: RequestBody) -> APIResponse:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.put(
-                    f"{self.base_url}{endpoint}",
-                    headers=self.headers,
-                    json=data,
-                    timeout=10.0,
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 404:
-                    raise ValueError(f"Resource not found: {endpoint}")
-                if status == 429:
-                    raise ValueError("Too many requests. Please try again shortly.")
-                raise
-            except httpx.RequestError as e:
-                raise ConnectionError(f"Failed to connect to API: {e}")
-
-    async def delete(self, endpoint: str) -> APIResponse:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.delete(
-                    f"{self.base_url}{endpoint}",
-                    headers=self.headers,
-                    timeout=10.0,
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 404:
-                    raise ValueError(f"Resource not found: {endpoint}")
-                if status == 429:
-                    raise ValueError("Too many requests. Please try again shortly.")
-                raise
-            except httpx.RequestError as e:
-                raise ConnectionError(f"Failed to connect to API: {e}")
+        return await self._request("PUT", endpoint, data=data)
+
+    async def delete(self, endpoint: str, params: RequestParams = None) -> APIResponse:
+        return await self._request("DELETE", endpoint, params)
+
+    async def close(self) -> None:
+        """Close the pooled connections. Called on bot shutdown."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
 
 api_client: APIClient = APIClient()
@@ -0,0 +1,205 @@
+"""
+Local caches of API entities for the bot.
+
+Players, queues, matches and sanctions read through `db` are
+kept in size-bounded LRU caches. Entries hold the API's JSON so every read
+builds a fresh model that callers are free to modify. The bot's own writes
+store the API's response, and `apply_event` invalidates or patches entries
+as WebSocket events report changes made elsewhere.
+
+Each cache also has a TTL. It bounds how stale an entry can get from changes
+no event reports, such as bans issued from the web panel or events missed
+while the bot was disconnected.
+
+Every write, patch and invalidation bumps the key's generation. Reads take
+the generation before calling the API and pass it to `set`, which drops the
+response if the key changed meanwhile, so a fetch that was in flight during
+an invalidating event cannot store its older data.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger("valohub")
+
+# How often the counters of every cache are logged
+STATS_LOG_INTERVAL_SECONDS = 300
+
+
+class EntityCache:
+    """
+    LRU cache whose entries expire `ttl` seconds after they are set. Expired
+    entries are kept until replaced or evicted.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        # Generation of the most recently changed keys, oldest first. Keys
+        # dropped from it, and all keys after `clear`, are at `_floor`
+        self._generations: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_writes = 0
+
+    def generation(self, key: Hashable) -> int:
+        """Take before fetching a value, then pass it to `set`."""
+        return max(self._generations.get(key, 0), self._floor)
+
+    def _bump(self, key: Hashable):
+        self._clock += 1
+        self._generations[key] = self._clock
+        self._generations.move_to_end(key)
+        if len(self._generations) > self.max_size:
+            _, self._floor = self._generations.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return default
+
+    def peek(self, key: Hashable, default: Any = None, stale: bool = False) -> Any:
+        """
+        Like `get`, without counting the lookup or refreshing its recency.
+        With `stale`, expired entries are returned too, as a fallback for
+        when the API cannot be reached.
+        """
+        entry = self._entries.get(key)
+        if entry is None or (not stale and time.monotonic() >= entry[1]):
+            return default
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """
+        Store a value. With `generation`, the value is dropped if the key has
+        changed since that generation was taken.
+        """
+        if generation is not None and generation != self.generation(key):
+            self.stale_writes += 1
+            return
+        self._bump(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def patch(self, key: Hashable, changes: Dict[str, Any]) -> bool:
+        """Update fields of a cached dict in place, keeping its expiry."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry[1]:
+            return False
+        self._bump(key)
+        entry[0].update(changes)
+        return True
+
+    def invalidate(self, key: Hashable):
+        self._bump(key)
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._clock += 1
+        self._floor = self._clock
+        self._generations.clear()
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "stale_writes": self.stale_writes,
+        }
+
+
+# Players by discord ID, patched by player_updated events
+players = EntityCache("players", max_size=2000, ttl=300)
+
+# (version, players) by rank group, maintained by the queue mirror
+queues = EntityCache("queues", max_size=16, ttl=60)
+
+# Matches by match ID
+matches = EntityCache("matches", max_size=500, ttl=120)
+
+# Ban and timeout flags by discord ID. No event reports sanctions, so only
+# the bot's own sanction commands invalidate them before the TTL
+bans = EntityCache("bans", max_size=5000, ttl=60)
+timeouts = EntityCache("timeouts", max_size=5000, ttl=60)
+
+ALL_CACHES = (players, queues, matches, bans, timeouts)
+
+
+def apply_event(event: Dict[str, Any]):
+    """Invalidate or patch the entries a WebSocket event changes."""
+    event_type = event.get("type")
+
+    if event_type == "player_updated":
+        discord_id = event.get("discord_id")
+        if not players.patch(discord_id, {event.get("field"): event.get("value")}):
+            players.invalidate(discord_id)
+    elif event_type == "match_settled":
+        # Points, wins and losses change for every player of the match
+        for discord_id in event.get("points_changes", {}):
+            players.invalidate(discord_id)
+        matches.invalidate(event.get("match_id"))
+    elif event_type in ("match_created", "match_updated", "match_result"):
+        matches.invalidate(event.get("match_id"))
+    elif event_type == "resync_required":
+        clear_all()
+
+
+def clear_all():
+    for cache in ALL_CACHES:
+        cache.clear()
+
+
+def stats() -> Dict[str, dict]:
+    """Hit, miss and size counters of every cache."""
+    return {cache.name: cache.stats() for cache in ALL_CACHES}
+
+
+_reporter: Optional[asyncio.Task] = None
+
+
+async def _report_loop():
+    try:
+        while True:
+            await asyncio.sleep(STATS_LOG_INTERVAL_SECONDS)
+            if any(cache.hits or cache.misses for cache in ALL_CACHES):
+                logger.info(f"Cache stats: {stats()}")
+    except asyncio.CancelledError:
+        pass
+
+
+def start_reporting():
+    """Log the cache counters periodically."""
+    global _reporter
+    if _reporter is None:
+        _reporter = asyncio.create_task(_report_loop())
+
+
+async def stop_reporting():
+    global _reporter
+    if _reporter is not None:
+        _reporter.cancel()
+        await asyncio.gather(_reporter, return_exceptions=True)
+        _reporter = None
@@ -0,0 +1,80 @@
+"""
+Serialized processing of button clicks.
+
+Clicks are handed to a worker for their key (a rank group for the queue
+buttons) and processed in the order they arrived, so the changes they make
+to one queue never interleave. Clicks that pile up while a batch is being
+processed are taken together as the next batch, which lets the handler
+check them with one round of API calls. Workers exit when their key is idle.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List
+
+logger = logging.getLogger("valohub")
+
+# Clicks handed to one call of the batch handler
+MAX_BATCH = 25
+
+# Clicks waiting per key before new ones are refused
+MAX_PENDING_PER_KEY = 200
+
+
+class ClickQueue:
+    """Runs a batch handler on per-key ordered worker queues."""
+
+    def __init__(
+        self,
+        process: Callable[[str, List[Any]], Awaitable[None]],
+        max_batch: int = MAX_BATCH,
+        max_pending: int = MAX_PENDING_PER_KEY,
+    ):
+        self._process = process
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: Dict[str, Deque[Any]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def submit(self, key: str, click: Any) -> bool:
+        """Queue a click for its key's worker. Returns False if the backlog is full."""
+        pending = self._pending.setdefault(key, deque())
+        if len(pending) >= self.max_pending:
+            logger.warning(f"Click backlog full for {key}")
+            return False
+
+        pending.append(click)
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._work(key))
+        return True
+
+    def pending(self, key: str) -> int:
+        return len(self._pending.get(key, ()))
+
+    async def _work(self, key: str):
+        pending = self._pending[key]
+        try:
+            while pending:
+                batch = [
+                    pending.popleft() for _ in range(min(len(pending), self.max_batch))
+                ]
+                try:
+                    await self._process(key, batch)
+                except Exception as e:
+                    logger.error(
+                        f"Error processing {len(batch)} clicks for {key}: {e}",
+                        exc_info=True,
+                    )
+        finally:
+            del self._workers[key]
+            if not pending:
+                del self._pending[key]
+
+    async def stop(self):
+        """Cancel the workers and drop pending clicks."""
+        tasks = list(self._workers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
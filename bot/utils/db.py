@@ -4,11 +4,12 @@ from models.queue import Queue, QueueEntry
 from models.match import Match
 from models.leaderboard import Leaderboard, LeaderboardEntry
 from models.preferences import UserPreferences
+from models.bot_message import BotMessage
 from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 from .api_client import api_client
-import time
+from . import cache
 import asyncio
 
 # Load .env from project root
@@ -16,22 +17,30 @@ load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
 
 
 async def get_player(discord_id: str) -> Optional[Player]:
-    try:
-        data = await api_client.get(f"/players/{discord_id}")
-        return Player(**data)
-    except (ValueError, ConnectionError, KeyError):
-        return None
+    data = cache.players.get(discord_id)
+    if data is None:
+        generation = cache.players.generation(discord_id)
+        try:
+            data = await api_client.get(
+                f"/players/{discord_id}", shared=True, share_key=generation
+            )
+        except (ValueError, ConnectionError, KeyError):
+            return None
+        cache.players.set(discord_id, data, generation)
+    return Player(**data)
 
 
 async def create_player(discord_id: str, riot_id: str, rank: str) -> Player:
     player_data = {"discord_id": discord_id, "riot_id": riot_id, "rank": rank}
     data = await api_client.post("/players/", player_data)
+    cache.players.set(discord_id, data)
     return Player(**data)
 
 
 async def update_player_rank(discord_id: str, rank: str) -> Optional[Player]:
     try:
         data = await api_client.patch(f"/players/{discord_id}", {"rank": rank})
+        cache.players.set(discord_id, data)
         return Player(**data)
     except (ValueError, ConnectionError, KeyError):
         return None
@@ -42,7 +51,7 @@ async def get_player_stats(
 ) -> Optional[dict]:
     try:
         params = {"rank_group": rank_group} if rank_group else None
-        data = await api_client.get(f"/stats/{discord_id}", params)
+        data = await api_client.get(f"/stats/{discord_id}", params, shared=True)
         return data
     except (ValueError, ConnectionError, KeyError):
         return None
@@ -50,8 +59,11 @@ async def get_player_stats(
 
 async def get_queue(rank_group: str) -> Queue:
     try:
-        data = await api_client.get(f"/queue/{rank_group}")
-        queue = Queue(**data)
+        cached = cache.queues.get(rank_group)
+        if cached is not None:
+            queue = Queue(rank_group=rank_group, players=list(cached[1]))
+        else:
+            queue, _ = await get_queue_snapshot(rank_group)
 
         if not queue.players:
             return queue
@@ -78,6 +90,22 @@ async def get_queue(rank_group: str) -> Queue:
         return Queue(rank_group=rank_group)
 
 
+async def get_queue_snapshot(rank_group: str) -> Tuple[Queue, int]:
+    """Queue as stored by the API, unfiltered, with its version."""
+    data = await api_client.get(f"/queue/{rank_group}", shared=True)
+    return _store_queue(data), data.get("version", 0)
+
+
+def _store_queue(data: dict) -> Queue:
+    """Cache a queue returned by the API unless a newer version is cached."""
+    queue = Queue(**data)
+    version = data.get("version", 0)
+    cached = cache.queues.peek(queue.rank_group)
+    if cached is None or version >= cached[0]:
+        cache.queues.set(queue.rank_group, (version, queue.players))
+    return queue
+
+
 async def update_queue(rank_group: str, players: List[QueueEntry]) -> Queue:
     if players:
         player_ids = [p.discord_id for p in players]
@@ -92,12 +120,12 @@ async def update_queue(rank_group: str, players: List[QueueEntry]) -> Queue:
 
     queue = Queue(rank_group=rank_group, players=players)
     data = await api_client.put(f"/queue/{rank_group}", queue.model_dump(mode="json"))
-    return Queue(**data)
+    return _store_queue(data)
 
 
 async def clear_queue(rank_group: str) -> Queue:
     data = await api_client.delete(f"/queue/{rank_group}")
-    return Queue(**data)
+    return _store_queue(data)
 
 
 async def delete_test_bots() -> int:
@@ -105,7 +133,13 @@ async def delete_test_bots() -> int:
     return data.get("deleted_count", 0)
 
 
-async def add_to_queue(rank_group: str, discord_id: str) -> Queue:
+async def add_to_queue(
+    rank_group: str, discord_id: str
+) -> Tuple[Queue, Optional[Match], List[QueueEntry]]:
+    """
+    Join a queue. Returns the queue, plus the match and its players when this
+    join filled the queue and the API popped it.
+    """
     if await is_player_banned(discord_id):
         raise ValueError("You are banned from the queue system")
     if await is_player_timeout(discord_id):
@@ -119,15 +153,24 @@ async def add_to_queue(rank_group: str, discord_id: str) -> Queue:
     if any(p.discord_id == discord_id for p in queue.players):
         raise ValueError("You are already in the queue")
 
+    return await join_queue(rank_group, discord_id)
+
+
+async def join_queue(
+    rank_group: str, discord_id: str
+) -> Tuple[Queue, Optional[Match], List[QueueEntry]]:
+    """`add_to_queue` without the eligibility checks, for callers that made them."""
     entry_data = {"discord_id": discord_id}
     data = await api_client.post(f"/queue/{rank_group}/join", entry_data)
-    return Queue(**data)
+    match = Match(**data["match"]) if data.get("match") else None
+    matched_players = [QueueEntry(**p) for p in data.get("matched_players", [])]
+    return _store_queue(data), match, matched_players
 
 
 async def remove_player_from_queue(rank_group: str, discord_id: str) -> Queue:
     entry_data = {"discord_id": discord_id}
     data = await api_client.post(f"/queue/{rank_group}/leave", entry_data)
-    return Queue(**data)
+    return _store_queue(data)
 
 
 def calculate_mmr_points(
@@ -138,49 +181,25 @@ def calculate_mmr_points(
     adjustment = int(mmr_diff / 60)
 
     if team1_won:
-        team1_points = base_points - adjustment
-        team2_points = -(base_points + adjustment)
+        team1_points = max(20, min(30, base_points - adjustment))
+        team2_points = max(-30, min(-20, -(base_points + adjustment)))
     else:
-        team1_points = -(base_points + adjustment)
-        team2_points = base_points - adjustment
-
-    team1_points = max(20, min(30, team1_points))
-    team2_points = max(-30, min(-20, team2_points))
+        team1_points = max(-30, min(-20, -(base_points + adjustment)))
+        team2_points = max(20, min(30, base_points - adjustment))
 
     return team1_points, team2_points
 
 
-async def get_next_match_id() -> str:
-    try:
-        data = await api_client.get("/matches/next-id")
-        return data["match_id"]
-    except (ValueError, ConnectionError, KeyError):
-        try:
-            matches = await api_client.get("/matches/active")
-            match_numbers = []
-            for match in matches:
-                match_id = match.get("match_id", "")
-                if match_id.startswith("match_"):
-                    try:
-                        num = int(match_id.split("_")[1])
-                        match_numbers.append(num)
-                    except (IndexError, ValueError):
-                        continue
-            next_num = max(match_numbers, default=0) + 1
-            return f"match_{next_num}"
-        except (ValueError, ConnectionError, KeyError):
-            return "match_1"
-
-
 async def create_match(
-    match_id: str,
     players_red: List[str],
     players_blue: List[str],
     captain_red: str,
     captain_blue: str,
     lobby_master: str,
     rank_group: str,
+    match_id: Optional[str] = None,
 ) -> Match:
+    """Create a match; the API allocates the match ID unless one is given."""
     match_data = {
         "match_id": match_id,
         "players_red": players_red,
@@ -191,7 +210,9 @@ async def create_match(
         "rank_group": rank_group,
     }
     data = await api_client.post("/matches/", match_data)
-    return Match(**data)
+    match = Match(**data)
+    cache.matches.set(match.match_id, data)
+    return match
 
 
 async def update_match_teams(
@@ -202,6 +223,7 @@ async def update_match_teams(
             f"/matches/{match_id}",
             {"players_red": players_red, "players_blue": players_blue},
         )
+        cache.matches.set(match_id, data)
         return Match(**data)
     except (ValueError, ConnectionError, KeyError):
         return None
@@ -212,6 +234,7 @@ async def update_match_defense(match_id: str, defense_start: str) -> Optional[Ma
         data = await api_client.patch(
             f"/matches/{match_id}", {"defense_start": defense_start}
         )
+        cache.matches.set(match_id, data)
         return Match(**data)
     except (ValueError, ConnectionError, KeyError):
         return None
@@ -225,6 +248,7 @@ async def update_match_maps(
             f"/matches/{match_id}",
             {"banned_maps": banned_maps, "selected_map": selected_map},
         )
+        cache.matches.set(match_id, data)
         return Match(**data)
     except (ValueError, ConnectionError, KeyError):
         return None
@@ -241,59 +265,69 @@ async def update_match_result(
             "ended_at": datetime.now(timezone.utc).isoformat(),
         }
         data = await api_client.patch(f"/matches/{match_id}", update_data)
+        cache.matches.set(match_id, data)
         return Match(**data)
     except (ValueError, ConnectionError, KeyError):
         return None
 
 
-async def get_match(match_id: str) -> Optional[Match]:
+async def settle_match(
+    match_id: str, red_score: int, blue_score: int, force: bool = False
+) -> Optional[Tuple[Match, Dict[str, int]]]:
     try:
-        data = await api_client.get(f"/matches/{match_id}")
-        return Match(**data)
+        data = await api_client.post(
+            f"/matches/{match_id}/settle",
+            {"red_score": red_score, "blue_score": blue_score, "force": force},
+        )
+        cache.matches.set(match_id, data["match"])
+        return Match(**data["match"]), data["points_changes"]
     except (ValueError, ConnectionError, KeyError):
         return None
 
 
-async def get_active_matches() -> List[Match]:
-    global _ACTIVE_MATCHES_CACHE, _ACTIVE_MATCHES_CACHE_TIME
-    now = time.monotonic()
-    if now - _ACTIVE_MATCHES_CACHE_TIME < _ACTIVE_MATCHES_CACHE_TTL_SECONDS:
-        return _ACTIVE_MATCHES_CACHE
-
+async def revert_match(match_id: str) -> Optional[Match]:
     try:
-        data = await api_client.get("/matches/active")
-        _ACTIVE_MATCHES_CACHE = [Match(**match) for match in data]
-        _ACTIVE_MATCHES_CACHE_TIME = now
-        return _ACTIVE_MATCHES_CACHE
-    except Exception:
-        return _ACTIVE_MATCHES_CACHE
+        data = await api_client.post(f"/matches/{match_id}/revert", {})
+        cache.matches.set(match_id, data["match"])
+        return Match(**data["match"])
+    except (ValueError, ConnectionError, KeyError):
+        return None
 
 
-async def is_player_in_match(discord_id: str) -> bool:
+async def get_match(match_id: str) -> Optional[Match]:
+    data = cache.matches.get(match_id)
+    if data is None:
+        generation = cache.matches.generation(match_id)
+        try:
+            data = await api_client.get(
+                f"/matches/{match_id}", shared=True, share_key=generation
+            )
+        except (ValueError, ConnectionError, KeyError):
+            return None
+        cache.matches.set(match_id, data, generation)
+    return Match(**data)
+
+
+async def get_active_matches() -> List[Match]:
     try:
-        active_matches = await get_active_matches()
-        for match in active_matches:
-            if match.players_red and discord_id in match.players_red:
-                return True
-            if match.players_blue and discord_id in match.players_blue:
-                return True
-        return False
+        data = await api_client.get("/matches/active", shared=True)
+        return [Match(**match) for match in data]
     except (ValueError, ConnectionError, KeyError, TypeError):
-        return False
+        return []
 
 
-async def get_leaderboard(rank_group: str) -> Leaderboard:
+async def get_active_match_for_player(discord_id: str) -> Optional[Match]:
     try:
-        data = await api_client.get(f"/leaderboard/{rank_group}")
-        leaderboard = Leaderboard(**data)
-        leaderboard.players = [
-            player
-            for player in leaderboard.players
-            if not await is_player_banned(player.discord_id)
-        ]
-        return leaderboard
+        data = await api_client.get(
+            f"/matches/active/by-player/{discord_id}", shared=True
+        )
+        return Match(**data) if data else None
     except (ValueError, ConnectionError, KeyError, TypeError):
-        return Leaderboard(rank_group=rank_group)
+        return None
+
+
+async def is_player_in_match(discord_id: str) -> bool:
+    return await get_active_match_for_player(discord_id) is not None
 
 
 async def update_leaderboard(
@@ -306,29 +340,77 @@ async def update_leaderboard(
     return Leaderboard(**data)
 
 
+async def get_leaderboard_entries(
+    rank_group: str, discord_ids: List[str]
+) -> Dict[str, LeaderboardEntry]:
+    if not discord_ids:
+        return {}
+    try:
+        data = await api_client.get(
+            f"/leaderboard/{rank_group}/entries", {"discord_ids": discord_ids}
+        )
+        return {entry["discord_id"]: LeaderboardEntry(**entry) for entry in data}
+    except (ValueError, ConnectionError, KeyError, TypeError):
+        return {}
+
+
+async def apply_leaderboard_deltas(
+    rank_group: str, deltas: List[dict]
+) -> List[LeaderboardEntry]:
+    data = await api_client.patch(
+        f"/leaderboard/{rank_group}/entries", {"entries": deltas}
+    )
+    return [LeaderboardEntry(**entry) for entry in data]
+
+
+async def get_player_position(
+    rank_group: str, discord_id: str
+) -> Optional[Tuple[int, int, LeaderboardEntry]]:
+    """Return (rank_position, total_players, entry) from the API rank index."""
+    try:
+        data = await api_client.get(
+            f"/leaderboard/{rank_group}/player/{discord_id}", shared=True
+        )
+        return (
+            data["rank_position"],
+            data["total_players"],
+            LeaderboardEntry(**data["player"]),
+        )
+    except (ValueError, ConnectionError, KeyError, TypeError):
+        return None
+
+
 async def get_player_rank(
     rank_group: str, discord_id: str
 ) -> Optional[LeaderboardEntry]:
-    leaderboard = await get_leaderboard(rank_group)
-    for player in leaderboard.players:
-        if player.discord_id == discord_id:
-            return player
-    return None
+    if await is_player_banned(discord_id):
+        return None
+    position = await get_player_position(rank_group, discord_id)
+    return position[2] if position else None
 
 
 async def get_leaderboard_page(
     rank_group: str, page: int = 1, page_size: int = 10
 ) -> List[LeaderboardEntry]:
-    leaderboard = await get_leaderboard(rank_group)
-    sorted_players = sorted(leaderboard.players, key=lambda x: x.points, reverse=True)
-    start_idx = (page - 1) * page_size
-    end_idx = start_idx + page_size
-    return sorted_players[start_idx:end_idx]
+    try:
+        data = await api_client.get(
+            f"/leaderboard/{rank_group}/top",
+            {"skip": (page - 1) * page_size, "limit": page_size},
+            shared=True,
+        )
+        # Banned players are left out of the ranking by the API
+        return [LeaderboardEntry(**entry) for entry in data]
+    except (ValueError, ConnectionError, KeyError, TypeError):
+        return []
 
 
 async def get_total_pages(rank_group: str, page_size: int = 10) -> int:
-    leaderboard = await get_leaderboard(rank_group)
-    return (len(leaderboard.players) + page_size - 1) // page_size
+    try:
+        data = await api_client.get(f"/leaderboard/{rank_group}/count", shared=True)
+        count = data["count"]
+    except (ValueError, ConnectionError, KeyError, TypeError):
+        return 0
+    return (count + page_size - 1) // page_size
 
 
 async def get_match_history(limit: Optional[int] = 10) -> List[Match]:
@@ -340,6 +422,20 @@ async def get_match_history(limit: Optional[int] = 10) -> List[Match]:
         return []
 
 
+async def get_match_history_page(
+    after: Optional[str] = None, limit: int = 100
+) -> Optional[Tuple[List[Match], Optional[str]]]:
+    """Finished matches oldest first, and the cursor of the next page if any."""
+    try:
+        params = {"limit": limit}
+        if after:
+            params["after"] = after
+        data = await api_client.get("/history/matches/pages", params)
+        return [Match(**match) for match in data["matches"]], data["next_cursor"]
+    except (ValueError, ConnectionError, KeyError, TypeError):
+        return None
+
+
 async def get_player_match_history(
     discord_id: str, limit: Optional[int] = 10
 ) -> List[Match]:
@@ -367,36 +463,27 @@ async def get_timeout_players() -> List[dict]:
         return []
 
 
-_BAN_CACHE: Dict[str, Tuple[bool, float]] = {}
-_TIMEOUT_CACHE: Dict[str, Tuple[bool, float]] = {}
-_SANCTION_TTL_SECONDS = 60.0
-
-_ACTIVE_MATCHES_CACHE: List[Match] = []
-_ACTIVE_MATCHES_CACHE_TIME: float = 0.0
-_ACTIVE_MATCHES_CACHE_TTL_SECONDS = 30.0
-
-
 async def batch_check_players(
     discord_ids: List[str],
 ) -> Tuple[Dict[str, bool], Dict[str, bool]]:
-    now = time.monotonic()
     bans = {}
     timeouts = {}
 
     uncached_ids = []
     for discord_id in discord_ids:
-        ban_cached = _BAN_CACHE.get(discord_id)
-        timeout_cached = _TIMEOUT_CACHE.get(discord_id)
-
-        if ban_cached and now < ban_cached[1]:
-            bans[discord_id] = ban_cached[0]
-        else:
+        banned = cache.bans.get(discord_id)
+        timed_out = cache.timeouts.get(discord_id)
+
+        if banned is not None:
+            bans[discord_id] = banned
+        if timed_out is not None:
+            timeouts[discord_id] = timed_out
+        if banned is None or timed_out is None:
             uncached_ids.append(discord_id)
 
-        if timeout_cached and now < timeout_cached[1]:
-            timeouts[discord_id] = timeout_cached[0]
-
     if uncached_ids:
+        ban_generations = {d: cache.bans.generation(d) for d in uncached_ids}
+        timeout_generations = {d: cache.timeouts.generation(d) for d in uncached_ids}
         try:
             data = await api_client.post(
                 "/admin/check-batch", {"discord_ids": uncached_ids}
@@ -404,16 +491,16 @@ async def batch_check_players(
             for discord_id in uncached_ids:
                 if discord_id in data.get("bans", {}):
                     bans[discord_id] = bool(data["bans"][discord_id])
-                    _BAN_CACHE[discord_id] = (
-                        bans[discord_id],
-                        now + _SANCTION_TTL_SECONDS,
+                    cache.bans.set(
+                        discord_id, bans[discord_id], ban_generations[discord_id]
                     )
 
                 if discord_id in data.get("timeouts", {}):
                     timeouts[discord_id] = bool(data["timeouts"][discord_id])
-                    _TIMEOUT_CACHE[discord_id] = (
+                    cache.timeouts.set(
+                        discord_id,
                         timeouts[discord_id],
-                        now + _SANCTION_TTL_SECONDS,
+                        timeout_generations[discord_id],
                     )
         except (ValueError, ConnectionError, KeyError):
             pass
@@ -422,29 +509,33 @@ async def batch_check_players(
 
 
 async def is_player_banned(discord_id: str) -> bool:
-    now = time.monotonic()
-    cached = _BAN_CACHE.get(discord_id)
-    if cached and (now < cached[1]):
-        return cached[0]
+    cached = cache.bans.get(discord_id)
+    if cached is not None:
+        return cached
+    generation = cache.bans.generation(discord_id)
     try:
-        data = await api_client.get(f"/admin/check-ban/{discord_id}")
-        _BAN_CACHE[discord_id] = (bool(data), now + _SANCTION_TTL_SECONDS)
+        data = await api_client.get(
+            f"/admin/check-ban/{discord_id}", shared=True, share_key=generation
+        )
+        cache.bans.set(discord_id, bool(data), generation)
         return bool(data)
     except (ValueError, ConnectionError):
-        return cached[0] if cached else False
+        return cache.bans.peek(discord_id, False, stale=True)
 
 
 async def is_player_timeout(discord_id: str) -> bool:
-    now = time.monotonic()
-    cached = _TIMEOUT_CACHE.get(discord_id)
-    if cached and (now < cached[1]):
-        return cached[0]
+    cached = cache.timeouts.get(discord_id)
+    if cached is not None:
+        return cached
+    generation = cache.timeouts.generation(discord_id)
     try:
-        data = await api_client.get(f"/admin/check-timeout/{discord_id}")
-        _TIMEOUT_CACHE[discord_id] = (bool(data), now + _SANCTION_TTL_SECONDS)
+        data = await api_client.get(
+            f"/admin/check-timeout/{discord_id}", shared=True, share_key=generation
+        )
+        cache.timeouts.set(discord_id, bool(data), generation)
         return bool(data)
     except (ValueError, ConnectionError):
-        return cached[0] if cached else False
+        return cache.timeouts.peek(discord_id, False, stale=True)
 
 
 async def add_admin_log(
@@ -471,12 +562,18 @@ async def add_admin_log(
     elif action == "unban":
         await api_client.post("/admin/unban", log_data)
 
+    if target_discord_id:
+        cache.bans.invalidate(target_discord_id)
+        cache.timeouts.invalidate(target_discord_id)
+
 
 async def remove_admin_log(action: str, target_discord_id: str) -> None:
     try:
         await api_client.delete(f"/admin/logs/{action}/{target_discord_id}")
     except (ValueError, ConnectionError):
         pass
+    cache.bans.invalidate(target_discord_id)
+    cache.timeouts.invalidate(target_discord_id)
 
 
 async def save_user_preferences(prefs: UserPreferences) -> None:
@@ -492,3 +589,41 @@ async def get_user_preferences(discord_id: str) -> Optional[UserPreferences]:
         return UserPreferences(**data)
     except (ValueError, ConnectionError, KeyError):
         return None
+
+
+async def get_bot_messages(guild_id: str) -> Optional[List[BotMessage]]:
+    try:
+        data = await api_client.get(f"/bot-messages/{guild_id}", shared=True)
+        return [BotMessage(**message) for message in data]
+    except (ValueError, ConnectionError, KeyError, TypeError):
+        return None
+
+
+async def save_bot_message(
+    guild_id: str,
+    role: str,
+    channel_id: str,
+    message_id: str,
+    digest: Optional[str] = None,
+) -> None:
+    try:
+        await api_client.put(
+            f"/bot-messages/{guild_id}/{role}",
+            {"channel_id": channel_id, "message_id": message_id, "digest": digest},
+        )
+    except (ValueError, ConnectionError):
+        pass
+
+
+async def delete_bot_message(guild_id: str, role: str) -> None:
+    try:
+        await api_client.delete(f"/bot-messages/{guild_id}/{role}")
+    except (ValueError, ConnectionError):
+        pass
+
+
+async def delete_bot_messages(guild_id: str, prefix: str) -> None:
+    try:
+        await api_client.delete(f"/bot-messages/{guild_id}", {"prefix": prefix})
+    except (ValueError, ConnectionError):
+        pass
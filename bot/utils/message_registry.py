@@ -0,0 +1,166 @@
+"""
+Where the bot's own messages live.
+
+Queue panels, the leaderboard, rank and stats button messages and the match
+history cards are recorded through the API under a (guild, role) key with
+their channel and message IDs. On startup each cog fetches its messages
+directly by ID and only falls back to scanning or clearing the channel when a
+message is not registered or no longer exists.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+import discord
+
+from .db import (
+    delete_bot_message,
+    delete_bot_messages,
+    get_bot_messages,
+    save_bot_message,
+)
+
+logger = logging.getLogger("valohub")
+
+# (channel_id, message_id, digest)
+Entry = Tuple[int, int, Optional[str]]
+
+
+class MessageRegistry:
+    def __init__(self):
+        # (guild_id, role) -> (channel_id, message_id, digest)
+        self._entries: Dict[Tuple[int, str], Entry] = {}
+        # Messages already fetched or sent, so later edits need no lookup
+        self._messages: Dict[Tuple[int, str], discord.Message] = {}
+        self._loaded: Dict[int, asyncio.Task] = {}
+
+    async def _load(self, guild_id: int) -> bool:
+        messages = await get_bot_messages(str(guild_id))
+        if messages is None:
+            return False
+        for message in messages:
+            self._entries[(guild_id, message.role)] = (
+                int(message.channel_id),
+                int(message.message_id),
+                message.digest,
+            )
+        return True
+
+    async def load(self, guild_id: int) -> bool:
+        """
+        Read a guild's registered messages once, whichever cog asks first.
+        Returns False if the API could not be reached.
+        """
+        task = self._loaded.get(guild_id)
+        if task is None:
+            task = self._loaded[guild_id] = asyncio.create_task(self._load(guild_id))
+        try:
+            loaded = await task
+        except Exception as e:
+            logger.error(f"Failed to load registered messages: {e}")
+            loaded = False
+        if not loaded:
+            # Try again on the next call rather than scanning from now on
+            if self._loaded.get(guild_id) is task:
+                del self._loaded[guild_id]
+            return False
+        return True
+
+    def entry(self, guild_id: int, role: str) -> Optional[Entry]:
+        return self._entries.get((guild_id, role))
+
+    def entries(self, guild_id: int, prefix: str) -> Dict[str, Entry]:
+        """Loaded entries of a guild whose role starts with `prefix`."""
+        return {
+            role: entry
+            for (guild, role), entry in self._entries.items()
+            if guild == guild_id and role.startswith(prefix)
+        }
+
+    async def fetch(self, guild: discord.Guild, role: str) -> Optional[discord.Message]:
+        """The registered message for `role`, or None if it has to be recreated."""
+        key = (guild.id, role)
+        if key in self._messages:
+            return self._messages[key]
+
+        await self.load(guild.id)
+        ids = self._entries.get(key)
+        if ids is None:
+            return None
+
+        channel_id, message_id, _ = ids
+        channel = guild.get_channel(channel_id)
+        if channel is None:
+            await self.forget(guild, role)
+            return None
+        try:
+            message = await channel.fetch_message(message_id)
+        except discord.NotFound:
+            await self.forget(guild, role)
+        except discord.HTTPException as e:
+            logger.warning(f"Could not fetch registered {role} message: {e}")
+        else:
+            self._messages[key] = message
+            return message
+        return None
+
+    async def remember(
+        self, role: str, message: discord.Message, digest: Optional[str] = None
+    ):
+        key = (message.guild.id, role)
+        entry = (message.channel.id, message.id, digest)
+        self._messages[key] = message
+        if self._entries.get(key) == entry:
+            return
+        self._entries[key] = entry
+        await save_bot_message(
+            str(message.guild.id),
+            role,
+            str(message.channel.id),
+            str(message.id),
+            digest,
+        )
+
+    async def forget(self, guild: discord.Guild, role: str):
+        self._messages.pop((guild.id, role), None)
+        if self._entries.pop((guild.id, role), None) is not None:
+            await delete_bot_message(str(guild.id), role)
+
+    async def forget_prefix(self, guild: discord.Guild, prefix: str):
+        """Forget every entry of a guild whose role starts with `prefix`."""
+        keys = [(guild.id, role) for role in self.entries(guild.id, prefix)]
+        for key in keys:
+            self._entries.pop(key, None)
+            self._messages.pop(key, None)
+        if keys:
+            await delete_bot_messages(str(guild.id), prefix)
+
+    async def publish(
+        self,
+        channel: discord.TextChannel,
+        role: str,
+        embed: discord.Embed,
+        view: discord.ui.View,
+    ) -> discord.Message:
+        """
+        Show `embed` as the channel's `role` message. The registered message is
+        edited in place. When there is none, the channel is cleared and a new
+        message is sent and registered.
+        """
+        message = await self.fetch(channel.guild, role)
+        if message is not None and message.channel.id == channel.id:
+            try:
+                message = await message.edit(embed=embed, view=view)
+                self._messages[(channel.guild.id, role)] = message
+                return message
+            except discord.NotFound:
+                await self.forget(channel.guild, role)
+
+        await channel.purge()
+        message = await channel.send(embed=embed, view=view)
+        await self.remember(role, message)
+        return message
+
+
+message_registry = MessageRegistry()
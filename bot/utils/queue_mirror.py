@@ -0,0 +1,68 @@
+"""
+Local mirror of the API queues, kept current by queue WebSocket events.
+
+Queue events carry the version they bring a queue to and the change as a
+delta (entries added, then discord IDs removed) or as a whole snapshot. The
+mirror applies them without calling the API, and fetches a queue only when a
+version is missing. Queues are stored in the `queues` entity cache, which
+`db.get_queue` reads from.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from models.queue import Queue, QueueEntry
+from .cache import queues
+from .db import get_queue_snapshot
+
+logger = logging.getLogger("valohub")
+
+
+class QueueMirror:
+    def get(self, rank_group: str) -> Optional[Queue]:
+        current = queues.peek(rank_group)
+        if current is None:
+            return None
+        _, players = current
+        return Queue(rank_group=rank_group, players=list(players))
+
+    def set(self, rank_group: str, players: List[QueueEntry], version: int) -> Queue:
+        queues.set(rank_group, (version, list(players)))
+        return self.get(rank_group)
+
+    async def refresh(self, rank_group: str) -> Queue:
+        """Replace a queue with the API's copy."""
+        queue, version = await get_queue_snapshot(rank_group)
+        return self.set(rank_group, queue.players, version)
+
+    async def apply(self, event: Dict[str, Any]) -> Queue:
+        """Apply a queue_update or queue_popped event and return the queue."""
+        rank_group = event["rank_group"]
+        version = event.get("version")
+        current = queues.peek(rank_group)
+
+        if current is not None and version is not None and version <= current[0]:
+            # Already reflected, e.g. by a snapshot fetched after this event
+            return self.get(rank_group)
+
+        snapshot = event.get("snapshot")
+        if snapshot is not None:
+            return self.set(rank_group, [QueueEntry(**p) for p in snapshot], version)
+
+        if current is None or version != current[0] + 1:
+            logger.info(f"Queue {rank_group} missed a version, fetching it")
+            return await self.refresh(rank_group)
+
+        _, players = current
+        queued = {p.discord_id for p in players}
+        players = players + [
+            QueueEntry(**p)
+            for p in event.get("added", [])
+            if p["discord_id"] not in queued
+        ]
+        removed = set(event.get("removed", []))
+        players = [p for p in players if p.discord_id not in removed]
+        return self.set(rank_group, players, version)
+
+
+queue_mirror = QueueMirror()
@@ -9,7 +9,8 @@ import asyncio
 import os
 import json
 import logging
-from typing import Optional, Callable, Dict, Any
+from collections import deque
+from typing import Optional, Callable, Deque, Dict, Any, Set
 from pathlib import Path
 
 import websockets
@@ -20,6 +21,13 @@ from websockets.exceptions import (
 )
 from dotenv import load_dotenv
 
+from event_dispatcher import EventDispatcher
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
 logger = logging.getLogger("valohub")
@@ -29,6 +37,15 @@ BOT_API_TOKEN = os.getenv("BOT_API_TOKEN", "")
 
 WS_URL = API_BASE_URL.replace("http://", "ws://").replace("https://", "wss://")
 
+# Event encoding requested from the API: compact binary MessagePack frames
+# when the library is installed, JSON text otherwise
+WS_ENCODING = os.getenv("WS_ENCODING", "msgpack" if msgpack else "json")
+
+# Sequence numbers remembered to drop replayed events that were already
+# received live. Live events can arrive out of seq order (frames relayed from
+# other replicas, concurrent publishes), so only exact repeats are dropped
+SEEN_SEQ_WINDOW = 1024
+
 
 class WebSocketClient:
     """WebSocket client for bot to receive API events."""
@@ -43,6 +60,13 @@ class WebSocketClient:
         self._running = False
         self._ping_task: Optional[asyncio.Task] = None
         self._connection_task: Optional[asyncio.Task] = None
+        # Highest sequence number seen on the all-events topic, sent on
+        # reconnect so the API replays what was missed
+        self.last_seq: Optional[int] = None
+        self._seen_seqs: Set[int] = set()
+        self._seen_order: Deque[int] = deque()
+        # Handlers run on per-key workers, off the socket read loop
+        self.dispatcher = EventDispatcher(self._handle_event)
 
     def on_event(self, event_type: str):
         """Decorator to register event handlers."""
@@ -65,6 +89,7 @@ class WebSocketClient:
             return
 
         self._running = True
+        self.dispatcher.start()
         self._connection_task = asyncio.create_task(self._connection_loop())
         logger.info("WebSocket client started")
 
@@ -84,6 +109,7 @@ class WebSocketClient:
             await self.ws.close()
             self.ws = None
 
+        await self.dispatcher.stop()
         self.connected = False
         logger.info("WebSocket client stopped")
 
@@ -103,7 +129,10 @@ class WebSocketClient:
 
     async def _connect(self):
         """Connect to WebSocket server."""
-        ws_endpoint = f"{WS_URL}/ws/{BOT_API_TOKEN}"
+        params = [f"encoding={WS_ENCODING}"]
+        if self.last_seq is not None:
+            params.append(f"since=*={self.last_seq}")
+        ws_endpoint = f"{WS_URL}/ws/{BOT_API_TOKEN}?{'&'.join(params)}"
         logger.info(f"Connecting to WebSocket: {WS_URL}/ws/***")
 
         try:
@@ -112,6 +141,7 @@ class WebSocketClient:
                 ping_interval=30,
                 ping_timeout=10,
                 close_timeout=5,
+                compression="deflate",
             )
             self.connected = True
             self.reconnect_delay = 1
@@ -139,12 +169,16 @@ class WebSocketClient:
             async for message in self.ws:
                 if message == "pong":
                     continue
+                if message == "ping":
+                    await self.ws.send("pong")
+                    continue
 
                 try:
-                    event = json.loads(message)
-                    await self._dispatch_event(event)
-                except json.JSONDecodeError:
-                    logger.warning(f"Received non-JSON message: {message[:100]}")
+                    event = self._decode(message)
+                except ValueError:
+                    logger.warning(f"Received undecodable message: {message[:100]!r}")
+                    continue
+                self._dispatch_event(event)
 
         except ConnectionClosed as e:
             logger.warning(f"WebSocket connection closed: {e}")
@@ -153,23 +187,52 @@ class WebSocketClient:
         except Exception as e:
             logger.error(f"Error receiving WebSocket messages: {e}")
 
-    async def _dispatch_event(self, event: Dict[str, Any]):
-        """Dispatch event to registered handler."""
+    @staticmethod
+    def _decode(message) -> Dict[str, Any]:
+        """Decode an event frame: binary MessagePack or JSON text."""
+        if isinstance(message, bytes):
+            if msgpack is None:
+                raise ValueError("msgpack is not installed")
+            return msgpack.unpackb(message)
+        return json.loads(message)
+
+    def _dispatch_event(self, event: Dict[str, Any]):
+        """Queue event for its registered handler, in arrival order per key."""
         event_type = event.get("type")
         if not event_type:
             logger.warning(f"Received event without type: {event}")
             return
 
-        handler = self.event_handlers.get(event_type)
+        seq = event.get("seq", {}).get("*")
+        if seq is not None and not self._track_seq(seq):
+            return
 
-        if handler:
-            try:
-                await handler(event)
-                logger.debug(f"Handled event: {event_type}")
-            except Exception as e:
-                logger.error(f"Error handling {event_type}: {e}", exc_info=True)
-        else:
+        if event_type not in self.event_handlers:
             logger.debug(f"No handler registered for event type: {event_type}")
+            return
+        self.dispatcher.submit(event)
+
+    def _track_seq(self, seq: int) -> bool:
+        """
+        Record an event's sequence number. Returns False if it was already
+        seen, as happens when the replay after a reconnect overlaps with
+        events received live.
+        """
+        if seq in self._seen_seqs:
+            return False
+        self._seen_seqs.add(seq)
+        self._seen_order.append(seq)
+        if len(self._seen_order) > SEEN_SEQ_WINDOW:
+            self._seen_seqs.discard(self._seen_order.popleft())
+        if self.last_seq is None or seq > self.last_seq:
+            self.last_seq = seq
+        return True
+
+    async def _handle_event(self, event: Dict[str, Any]):
+        """Run the registered handler; errors are logged by the dispatcher."""
+        event_type = event["type"]
+        await self.event_handlers[event_type](event)
+        logger.debug(f"Handled event: {event_type}")
 
     async def _ping_loop(self):
         """Send ping every 30 seconds to keep connection alive."""
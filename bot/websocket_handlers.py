@@ -14,8 +14,12 @@ import discord
 from dotenv import load_dotenv
 
 from websocket_client import ws_client
-from utils.db import get_queue
-from models.queue import Queue
+from utils import cache
+from utils.db import get_match
+from utils.queue_mirror import queue_mirror
+from models.queue import QueueEntry
+from cogs.match import create_match
+from utils.constants import ALL_RANK_GROUPS
 
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
@@ -32,16 +36,21 @@ def setup_handlers(bot: discord.ext.commands.Bot):
     @ws_client.on_event("queue_update")
     async def handle_queue_update(event: Dict[str, Any]):
         """Handle queue update events from frontend/API."""
-        # Skip events originating from bot to prevent loops
-        if event.get("origin") == "bot":
-            return
-
         action = event.get("action")
         rank_group = event.get("rank_group")
-        discord_id = event.get("discord_id")
-        players = event.get("players", [])
         queue_count = event.get("queue_count", 0)
 
+        # The mirror follows every change, including the bot's own
+        try:
+            queue = await queue_mirror.apply(event)
+        except Exception as e:
+            logger.error(f"Error applying queue update for {rank_group}: {e}")
+            return
+
+        # Skip events originating from bot to prevent loops
+        if event.get("origin") == "bot":
+            return
+
         logger.info(
             f"WS: Queue update - {action} for {rank_group} (count: {queue_count})"
         )
@@ -56,19 +65,62 @@ def setup_handlers(bot: discord.ext.commands.Bot):
         queue_cog = bot.get_cog("QueueCog")
         if queue_cog and hasattr(queue_cog, "update_queue_message"):
             try:
-                # Fetch fresh queue data from API
-                queue = await get_queue(rank_group)
-                if queue:
-                    await queue_cog.update_queue_message(guild, rank_group, queue)
-                    logger.info(f"Updated queue message for {rank_group}")
+                await queue_cog.update_queue_message(guild, rank_group, queue)
+                logger.info(f"Updated queue message for {rank_group}")
             except Exception as e:
                 logger.error(f"Error updating queue message: {e}")
         else:
             logger.warning("QueueCog not found or missing update_queue_message method")
 
+    @ws_client.on_event("queue_popped")
+    async def handle_queue_popped(event: Dict[str, Any]):
+        """Handle a queue popped into a match outside the bot's join button."""
+        rank_group = event.get("rank_group")
+        match_id = event.get("match_id")
+
+        try:
+            queue = await queue_mirror.apply(event)
+        except Exception as e:
+            logger.error(f"Error applying queue pop for {rank_group}: {e}")
+            queue = None
+
+        # The bot sets up its own pops right after the join request
+        if event.get("origin") == "bot":
+            return
+
+        logger.info(f"WS: Queue popped - {rank_group} into {match_id}")
+
+        guild = bot.get_guild(GUILD_ID)
+        if not guild:
+            logger.warning(f"Could not find guild {GUILD_ID}")
+            return
+
+        queue_cog = bot.get_cog("QueueCog")
+        if queue and queue_cog and hasattr(queue_cog, "update_queue_message"):
+            try:
+                await queue_cog.update_queue_message(guild, rank_group, queue)
+            except Exception as e:
+                logger.error(f"Error updating queue message: {e}")
+
+        try:
+            match = await get_match(match_id)
+            if not match:
+                logger.warning(f"Popped match {match_id} not found")
+                return
+            players = [
+                QueueEntry(discord_id=p) for p in event.get("matched_players", [])
+            ]
+            await create_match(guild, rank_group, players, bot, match=match)
+            logger.info(f"Set up popped match {match_id}")
+        except Exception as e:
+            logger.error(f"Error setting up popped match: {e}")
+
     @ws_client.on_event("match_created")
     async def handle_match_created(event: Dict[str, Any]):
         """Handle match created events from frontend/API."""
+        # Cached entities follow every change, including the bot's own
+        cache.apply_event(event)
+
         # Skip events originating from bot to prevent loops
         if event.get("origin") == "bot":
             return
@@ -102,6 +154,9 @@ def setup_handlers(bot: discord.ext.commands.Bot):
     @ws_client.on_event("match_updated")
     async def handle_match_updated(event: Dict[str, Any]):
         """Handle match updated events from frontend/API."""
+        # Cached entities follow every change, including the bot's own
+        cache.apply_event(event)
+
         # Skip events originating from bot to prevent loops
         if event.get("origin") == "bot":
             return
@@ -132,6 +187,9 @@ def setup_handlers(bot: discord.ext.commands.Bot):
     @ws_client.on_event("match_result")
     async def handle_match_result(event: Dict[str, Any]):
         """Handle match result events from frontend/API."""
+        # Cached entities follow every change, including the bot's own
+        cache.apply_event(event)
+
         # Skip events originating from bot to prevent loops
         if event.get("origin") == "bot":
             return
@@ -165,6 +223,9 @@ def setup_handlers(bot: discord.ext.commands.Bot):
     @ws_client.on_event("leaderboard_update")
     async def handle_leaderboard_update(event: Dict[str, Any]):
         """Handle leaderboard update events from frontend/API."""
+        # Cached entities follow every change, including the bot's own
+        cache.apply_event(event)
+
         # Skip events originating from bot to prevent loops
         if event.get("origin") == "bot":
             return
@@ -195,9 +256,55 @@ def setup_handlers(bot: discord.ext.commands.Bot):
                 "LeaderboardCog.on_leaderboard_update_from_api not implemented yet"
             )
 
+    @ws_client.on_event("match_settled")
+    async def handle_match_settled(event: Dict[str, Any]):
+        """Handle match settled events (result plus leaderboard changes)."""
+        # Cached entities follow every change, including the bot's own
+        cache.apply_event(event)
+
+        # Skip events originating from bot to prevent loops
+        if event.get("origin") == "bot":
+            return
+
+        match_id = event.get("match_id")
+        rank_group = event.get("rank_group")
+
+        logger.info(
+            f"WS: Match settled - {match_id}: {event.get('result')} "
+            f"(Red {event.get('red_score')} - Blue {event.get('blue_score')})"
+        )
+
+        # Get the guild
+        guild = bot.get_guild(GUILD_ID)
+        if not guild:
+            logger.warning(f"Could not find guild {GUILD_ID}")
+            return
+
+        # A settlement is both a match result and a leaderboard update
+        match_cog = bot.get_cog("MatchCog")
+        if match_cog and hasattr(match_cog, "on_match_result_from_api"):
+            try:
+                await match_cog.on_match_result_from_api(guild, event)
+                logger.info(f"Handled match settlement for {match_id}")
+            except Exception as e:
+                logger.error(f"Error handling match settlement: {e}")
+
+        leaderboard_cog = bot.get_cog("LeaderboardCog")
+        if leaderboard_cog and hasattr(
+            leaderboard_cog, "on_leaderboard_update_from_api"
+        ):
+            try:
+                await leaderboard_cog.on_leaderboard_update_from_api(guild, event)
+                logger.info(f"Handled leaderboard update for {rank_group}")
+            except Exception as e:
+                logger.error(f"Error handling leaderboard update: {e}")
+
     @ws_client.on_event("player_updated")
     async def handle_player_updated(event: Dict[str, Any]):
         """Handle player updated events from frontend/API."""
+        # Cached entities follow every change, including the bot's own
+        cache.apply_event(event)
+
         # Skip events originating from bot to prevent loops
         if event.get("origin") == "bot":
             return
@@ -208,4 +315,33 @@ def setup_handlers(bot: discord.ext.commands.Bot):
 
         logger.info(f"WS: Player updated - {discord_id}: {field} = {value}")
 
+    @ws_client.on_event("resync_required")
+    async def handle_resync_required(event: Dict[str, Any]):
+        """Refresh every display after missing more events than the API buffers."""
+        logger.warning(f"WS: Resync required for {event.get('topics')}")
+        cache.apply_event(event)
+
+        guild = bot.get_guild(GUILD_ID)
+        if not guild:
+            logger.warning(f"Could not find guild {GUILD_ID}")
+            return
+
+        queue_cog = bot.get_cog("QueueCog")
+        if queue_cog and hasattr(queue_cog, "update_queue_message"):
+            for rank_group in ALL_RANK_GROUPS:
+                try:
+                    queue = await queue_mirror.refresh(rank_group)
+                    await queue_cog.update_queue_message(guild, rank_group, queue)
+                except Exception as e:
+                    logger.error(f"Error resyncing queue {rank_group}: {e}")
+
+        leaderboard_cog = bot.get_cog("LeaderboardCog")
+        if leaderboard_cog and hasattr(
+            leaderboard_cog, "on_leaderboard_update_from_api"
+        ):
+            try:
+                await leaderboard_cog.on_leaderboard_update_from_api(guild, {})
+            except Exception as e:
+                logger.error(f"Error resyncing leaderboard: {e}")
+
     logger.info("WebSocket event handlers registered")
@@ -1,4 +1,4 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
 import os
 import time
 
@@ -47,12 +47,89 @@ def create_indexes(db):
         [("rank_group", ASCENDING)], unique=True, background=True
     )
 
+    db.leaderboard_entries.create_index(
+        [("rank_group", ASCENDING), ("discord_id", ASCENDING)],
+        unique=True,
+        background=True,
+    )
+    for field in ("points", "winrate", "matches_played", "streak"):
+        db.leaderboard_entries.create_index(
+            [
+                ("rank_group", ASCENDING),
+                (field, DESCENDING),
+                ("discord_id", ASCENDING),
+            ],
+            background=True,
+        )
+
+    db.points_ledger.create_index(
+        [("match_id", ASCENDING), ("discord_id", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"active": True},
+        background=True,
+    )
+    db.points_ledger.create_index(
+        [("match_id", ASCENDING), ("active", ASCENDING)], background=True
+    )
+
+    db.sanctions.create_index(
+        [("discord_id", ASCENDING), ("type", ASCENDING)], unique=True, background=True
+    )
+    db.sanctions.create_index(
+        "expires_at",
+        expireAfterSeconds=0,
+        partialFilterExpression={"type": "timeout"},
+        background=True,
+    )
+    db.sanctions.create_index(
+        [("type", ASCENDING), ("created_at", DESCENDING)], background=True
+    )
+
     db.queues.create_index([("rank_group", ASCENDING)], unique=True, background=True)
 
     db.preferences.create_index(
         [("discord_id", ASCENDING)], unique=True, background=True
     )
 
+    db.bot_messages.create_index(
+        [("guild_id", ASCENDING), ("role", ASCENDING)], unique=True, background=True
+    )
+
+
+def migrate_leaderboards(db):
+    """Move players embedded in leaderboards documents into leaderboard_entries."""
+    for doc in db.leaderboards.find({"players.0": {"$exists": True}}):
+        rank_group = doc["rank_group"]
+        operations = []
+        for player in doc.get("players", []):
+            matches_played = player.get("matches_played", 0)
+            winrate = player.get("winrate", 0.0)
+            wins = player.get("wins")
+            if wins is None:
+                wins = round(matches_played * winrate / 100)
+            entry = {
+                "rank_group": rank_group,
+                "discord_id": player["discord_id"],
+                "rank": player.get("rank", "Unranked"),
+                "points": player.get("points", 1000),
+                "matches_played": matches_played,
+                "wins": wins,
+                "winrate": winrate,
+                "streak": player.get("streak", 0),
+                "last_updated": doc.get("last_updated"),
+            }
+            operations.append(
+                UpdateOne(
+                    {"rank_group": rank_group, "discord_id": entry["discord_id"]},
+                    {"$setOnInsert": entry},
+                    upsert=True,
+                )
+            )
+        if operations:
+            db.leaderboard_entries.bulk_write(operations, ordered=False)
+        db.leaderboards.update_one({"_id": doc["_id"]}, {"$unset": {"players": ""}})
+        print(f"Migrated {len(operations)} leaderboard entries for {rank_group}")
+
 
 try:
     print(f"Attempting to connect to MongoDB with URI: {MONGO_URI}")
@@ -61,11 +138,16 @@ try:
 
     collections = [
         "admin_logs",
+        "counters",
         "leaderboards",
+        "leaderboard_entries",
         "matches",
         "players",
+        "points_ledger",
+        "sanctions",
         "queues",
         "preferences",
+        "bot_messages",
     ]
 
     for col in collections:
@@ -93,7 +175,6 @@ try:
             {
                 "$setOnInsert": {
                     "rank_group": group,
-                    "players": [],
                     "last_updated": time.time(),
                 }
             },
@@ -101,6 +182,8 @@ try:
         )
         print(f"Initialized leaderboard for {group}")
 
+    migrate_leaderboards(db)
+
     print("Database initialized successfully.")
 except Exception as e:
     print(f"Error initializing database: {e}")
@@ -5,7 +5,8 @@ from datetime import datetime, timezone
 
 class AdminLog(BaseModel):
     action: Literal[
-        "ban", 
+        "ban",
+        "unban", 
         "cancel_match", 
         "revert_match", 
         "timeout", 
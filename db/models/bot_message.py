@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime, timezone
+
+
+class BotMessage(BaseModel):
+    """A message the bot owns, such as a queue panel or a button message."""
+
+    guild_id: str
+    role: str
+    channel_id: str
+    message_id: str
+    # Hash of the rendered content, to skip edits that change nothing
+    digest: Optional[str] = None
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
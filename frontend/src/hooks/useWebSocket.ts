@@ -1,11 +1,21 @@
 import { useEffect, useRef, useCallback } from "react";
 import { create } from "zustand";
 import { devtools } from "zustand/middleware";
-import type { WebSocketEvent } from "@/types/events";
+import type {
+  WebSocketEvent,
+  ServerFrame,
+  QueueUpdateEvent,
+  QueuePoppedEvent,
+} from "@/types/events";
+import type { RankGroup } from "@/types/api";
 import { useQueueStore, useMatchStore, useLeaderboardStore } from "@/stores";
+import { queueApi } from "@/api";
 
 const WS_URL = import.meta.env.VITE_WS_URL || "ws://localhost:8000";
 
+// Sequence numbers remembered per topic to drop replayed duplicates
+const SEEN_SEQ_WINDOW = 512;
+
 // --- Connection status store (shared across components) ---
 
 export type ConnectionStatus =
@@ -46,16 +56,105 @@ export function useWebSocket(token: string | null) {
   const intentionalCloseRef = useRef(false);
 
   const { setStatus, setOnline } = useConnectionStore();
-  const { updateQueuePlayers } = useQueueStore();
+  // Highest sequence number seen per topic, sent as ?since= on reconnect
+  const lastSeqRef = useRef<Record<string, number>>({});
+  // Recently seen sequence numbers per topic. Live events can arrive out of
+  // seq order, so only exact repeats (replay overlap) are dropped
+  const seenSeqRef = useRef<Record<string, Set<number>>>({});
+
+  const { applyQueueDelta, setQueue } = useQueueStore();
   const { addMatch, updateMatch } = useMatchStore();
   const { setEntries } = useLeaderboardStore();
 
+  // Returns false for events already seen (replays can overlap live events)
+  const trackSeq = useCallback((event: WebSocketEvent): boolean => {
+    const last = lastSeqRef.current;
+    const seen = seenSeqRef.current;
+    const seq = Object.entries(event.seq ?? {}).filter(([topic]) => topic !== "*");
+    if (seq.some(([topic, n]) => seen[topic]?.has(n))) {
+      return false;
+    }
+    for (const [topic, n] of seq) {
+      const recent = (seen[topic] ??= new Set());
+      recent.add(n);
+      if (recent.size > SEEN_SEQ_WINDOW) {
+        // Sets iterate in insertion order, so this drops the oldest
+        recent.delete(recent.values().next().value as number);
+      }
+      if (last[topic] === undefined || n > last[topic]) {
+        last[topic] = n;
+      }
+    }
+    return true;
+  }, []);
+
+  const resync = useCallback(
+    async (topics: string[]) => {
+      for (const topic of topics) {
+        delete lastSeqRef.current[topic];
+        delete seenSeqRef.current[topic];
+        if (topic.startsWith("queue:")) {
+          const rankGroup = topic.slice("queue:".length) as RankGroup;
+          try {
+            setQueue(rankGroup, await queueApi.getQueue(rankGroup));
+          } catch (e) {
+            console.error("Failed to resync queue:", e);
+          }
+        }
+      }
+    },
+    [setQueue]
+  );
+
+  // Apply a queue delta, refetching the queue if a version was missed
+  const applyQueueEvent = useCallback(
+    (event: QueueUpdateEvent | QueuePoppedEvent) => {
+      const snapshot =
+        event.type === "queue_update" && event.snapshot
+          ? event.snapshot.map((entry) => entry.discord_id)
+          : undefined;
+      const applied = applyQueueDelta(
+        event.rank_group,
+        event.version,
+        event.added.map((entry) => entry.discord_id),
+        event.removed,
+        snapshot
+      );
+      if (!applied) {
+        void resync([`queue:${event.rank_group}`]);
+      }
+    },
+    [applyQueueDelta, resync]
+  );
+
   const handleEvent = useCallback(
     (event: WebSocketEvent) => {
       switch (event.type) {
         case "queue_update":
-          // Use updateQueuePlayers to match the exact players list from server
-          updateQueuePlayers(event.rank_group, event.players);
+          applyQueueEvent(event);
+          break;
+        case "queue_popped":
+          applyQueueEvent(event);
+          addMatch({
+            match_id: event.match_id,
+            rank_group: event.rank_group as
+              | "iron-plat"
+              | "dia-asc"
+              | "imm-radiant",
+            players_red: [],
+            players_blue: [],
+            captain_red: event.captain_red,
+            captain_blue: event.captain_blue,
+            lobby_master: event.captain_red,
+            defense_start: null,
+            banned_maps: [],
+            selected_map: null,
+            red_score: null,
+            blue_score: null,
+            result: null,
+            created_at: event.timestamp,
+            ended_at: null,
+          });
           break;
         case "match_created":
           addMatch({
@@ -89,6 +188,14 @@ export function useWebSocket(token: string | null) {
             blue_score: event.blue_score ?? null,
           });
           break;
+        case "match_settled":
+          updateMatch(event.match_id, {
+            result: event.result,
+            red_score: event.red_score,
+            blue_score: event.blue_score,
+          });
+          setEntries(event.rank_group, event.top_players);
+          break;
         case "leaderboard_update":
           setEntries(event.rank_group, event.top_players);
           break;
@@ -98,7 +205,7 @@ export function useWebSocket(token: string | null) {
           break;
       }
     },
-    [updateQueuePlayers, addMatch, updateMatch, setEntries]
+    [applyQueueEvent, addMatch, updateMatch, setEntries]
   );
 
   const clearReconnectTimer = useCallback(() => {
@@ -130,7 +237,12 @@ export function useWebSocket(token: string | null) {
     const isReconnect = reconnectAttemptsRef.current > 0;
     setStatus(isReconnect ? "reconnecting" : "connecting");
 
-    const wsUrl = `${WS_URL}/ws/${token}`;
+    const since = Object.entries(lastSeqRef.current)
+      .map(([topic, seq]) => `${topic}=${seq}`)
+      .join(",");
+    const wsUrl = since
+      ? `${WS_URL}/ws/${token}?since=${encodeURIComponent(since)}`
+      : `${WS_URL}/ws/${token}`;
     const ws = new WebSocket(wsUrl);
 
     ws.onopen = () => {
@@ -150,7 +262,13 @@ export function useWebSocket(token: string | null) {
     ws.onmessage = (event) => {
       try {
         if (event.data === "pong") return;
-        const data = JSON.parse(event.data) as WebSocketEvent;
+        const data = JSON.parse(event.data) as ServerFrame;
+        if (data.type === "resync_required") {
+          resync(data.topics);
+          return;
+        }
+        if (data.type === "subscriptions" || data.type === "error") return;
+        if (!trackSeq(data)) return;
         handleEvent(data);
       } catch (e) {
         console.error("Failed to parse WebSocket message:", e);
@@ -200,7 +318,15 @@ export function useWebSocket(token: string | null) {
     };
 
     wsRef.current = ws;
-  }, [token, handleEvent, setStatus, clearPingInterval, clearReconnectTimer]);
+  }, [
+    token,
+    handleEvent,
+    trackSeq,
+    resync,
+    setStatus,
+    clearPingInterval,
+    clearReconnectTimer,
+  ]);
 
   // --- Online/offline detection ---
   useEffect(() => {
@@ -9,6 +9,14 @@ interface QueueState {
   setQueue: (rankGroup: string, queue: Queue) => void;
   setQueues: (queues: Record<string, Queue>) => void;
   updateQueuePlayers: (rankGroup: string, players: string[]) => void;
+  // Returns false when the queue missed a version and must be refetched
+  applyQueueDelta: (
+    rankGroup: string,
+    version: number,
+    added: string[],
+    removed: string[],
+    snapshot?: string[]
+  ) => boolean;
   addPlayerToQueue: (rankGroup: string, discordId: string) => void;
   removePlayerFromQueue: (rankGroup: string, discordId: string) => void;
   setLoading: (loading: boolean) => void;
@@ -37,6 +45,31 @@ export const useQueueStore = create<QueueState>()(
         },
       },
     })),
+  applyQueueDelta: (rankGroup, version, added, removed, snapshot) => {
+    const queue = get().queues[rankGroup];
+    if (queue?.version !== undefined && version <= queue.version) {
+      return true;
+    }
+    if (snapshot === undefined && (queue?.version === undefined || version !== queue.version + 1)) {
+      return false;
+    }
+    const current = queue?.players ?? [];
+    const players = snapshot ?? [
+      ...current,
+      ...added.filter((id) => !current.includes(id)),
+    ];
+    set((state) => ({
+      queues: {
+        ...state.queues,
+        [rankGroup]: {
+          ...state.queues[rankGroup],
+          players: players.filter((id) => !removed.includes(id)),
+          version,
+        },
+      },
+    }));
+    return true;
+  },
   addPlayerToQueue: (rankGroup, discordId) =>
     set((state) => ({
       queues: {
@@ -33,6 +33,7 @@ export interface Queue {
   rank_group: string;
   players: string[];
   created_at: string;
+  version?: number;
 }
 
 export interface LeaderboardEntry {
@@ -2,24 +2,50 @@ import type { LeaderboardEntry } from "./api";
 
 export type EventType =
   | "queue_update"
+  | "queue_popped"
   | "match_created"
   | "match_updated"
   | "match_result"
+  | "match_settled"
   | "leaderboard_update"
   | "player_updated";
 
 export interface BaseEvent {
   type: EventType;
   timestamp: string;
+  seq?: Record<string, number>;
 }
 
+export interface QueueEntryData {
+  discord_id: string;
+  joined_at: string;
+}
+
+// Queue changes are deltas on the previous queue version: `added` entries
+// are appended, then `removed` IDs dropped. `snapshot` replaces the queue.
 export interface QueueUpdateEvent extends BaseEvent {
   type: "queue_update";
   rank_group: string;
-  action: "joined" | "left" | "cleared";
+  action: "joined" | "left" | "cleared" | "replaced";
   discord_id?: string;
   queue_count: number;
-  players: string[];
+  version: number;
+  added: QueueEntryData[];
+  removed: string[];
+  snapshot?: QueueEntryData[] | null;
+}
+
+export interface QueuePoppedEvent extends BaseEvent {
+  type: "queue_popped";
+  rank_group: string;
+  match_id: string;
+  matched_players: string[];
+  captain_red: string;
+  captain_blue: string;
+  queue_count: number;
+  version: number;
+  added: QueueEntryData[];
+  removed: string[];
 }
 
 export interface MatchCreatedEvent extends BaseEvent {
@@ -47,6 +73,17 @@ export interface MatchResultEvent extends BaseEvent {
   blue_score?: number;
 }
 
+export interface MatchSettledEvent extends BaseEvent {
+  type: "match_settled";
+  match_id: string;
+  rank_group: string;
+  result: "red" | "blue";
+  red_score: number;
+  blue_score: number;
+  points_changes: Record<string, number>;
+  top_players: LeaderboardEntry[];
+}
+
 export interface LeaderboardUpdateEvent extends BaseEvent {
   type: "leaderboard_update";
   rank_group: string;
@@ -62,8 +99,32 @@ export interface PlayerUpdatedEvent extends BaseEvent {
 
 export type WebSocketEvent =
   | QueueUpdateEvent
+  | QueuePoppedEvent
   | MatchCreatedEvent
   | MatchUpdatedEvent
   | MatchResultEvent
+  | MatchSettledEvent
   | LeaderboardUpdateEvent
   | PlayerUpdatedEvent;
+
+// Control frames sent by the server outside the event stream
+export interface SubscriptionsFrame {
+  type: "subscriptions";
+  topics: string[];
+}
+
+export interface ResyncRequiredFrame {
+  type: "resync_required";
+  topics: string[];
+}
+
+export interface ErrorFrame {
+  type: "error";
+  detail: string;
+}
+
+export type ServerFrame =
+  | WebSocketEvent
+  | SubscriptionsFrame
+  | ResyncRequiredFrame
+  | ErrorFrame;
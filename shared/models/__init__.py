@@ -9,6 +9,7 @@ from .match import Match
 from .leaderboard import Leaderboard, LeaderboardEntry
 from .admin_log import AdminLog
 from .preferences import UserPreferences
+from .bot_message import BotMessage
 
 __all__ = [
     "Player",
@@ -19,4 +20,5 @@ __all__ = [
     "LeaderboardEntry",
     "AdminLog",
     "UserPreferences",
+    "BotMessage",
 ]
@@ -6,6 +6,7 @@ from datetime import datetime, timezone
 class AdminLog(BaseModel):
     action: Literal[
         "ban",
+        "unban",
         "cancel_match",
         "revert_match",
         "timeout",